@@ -0,0 +1,157 @@
+"""Process-wide image cache.
+
+Each image file is decoded once, on first use, and converted to the display
+format when a display mode is set.  Scaled copies are cached by size, so
+asking for a new size scales the decoded original instead of going back to
+disk.  Files that fail to load are remembered too, and raise again without
+another disk read.
+
+``TEXT`` caches rendered text the same way, keeping the most recently used
+surfaces up to a fixed count.  Cached surfaces are shared, so only blit them.
+
+Usage:
+    python assets.py            # load the piece images and print timings
+"""
+
+import sys
+import time
+from collections import OrderedDict
+
+import pygame
+
+
+class AssetCache:
+    def __init__(self):
+        self.images = {}
+        self.scaled_images = {}
+        self.surfaces = {}
+        self.failures = {}
+        # (kind, key) -> seconds spent decoding, scaling or building
+        self.load_times = {}
+        self.hits = 0
+        self.misses = 0
+
+    def image(self, path, alpha=True):
+        """The decoded image at ``path``, in display format if a display is set."""
+        # Converted with or without per-pixel alpha, so each is cached separately
+        key = (path, alpha)
+        if key in self.images:
+            self.hits += 1
+            return self.images[key]
+        if path in self.failures:
+            raise self.failures[path]
+        self.misses += 1
+        start = time.perf_counter()
+        try:
+            image = pygame.image.load(path)
+        except (pygame.error, OSError) as error:
+            self.failures[path] = error
+            raise
+        if pygame.display.get_surface() is not None:
+            image = image.convert_alpha() if alpha else image.convert()
+        self.load_times[("load", key)] = time.perf_counter() - start
+        self.images[key] = image
+        return image
+
+    def scaled(self, path, size, alpha=True):
+        """The image at ``path`` scaled to ``size``, scaled once per size."""
+        key = (path, tuple(size), alpha)
+        if key in self.scaled_images:
+            self.hits += 1
+            return self.scaled_images[key]
+        image = self.image(path, alpha)
+        self.misses += 1
+        start = time.perf_counter()
+        surface = pygame.transform.scale(image, key[1])
+        self.load_times[("scale", key)] = time.perf_counter() - start
+        self.scaled_images[key] = surface
+        return surface
+
+    def surface(self, key, build):
+        """A surface made by ``build()``, built once per ``key``."""
+        if key in self.surfaces:
+            self.hits += 1
+            return self.surfaces[key]
+        self.misses += 1
+        start = time.perf_counter()
+        surface = build()
+        self.load_times[("build", key)] = time.perf_counter() - start
+        self.surfaces[key] = surface
+        return surface
+
+    def clear(self):
+        self.images.clear()
+        self.scaled_images.clear()
+        self.surfaces.clear()
+        self.failures.clear()
+        self.load_times.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def total_time(self):
+        return sum(self.load_times.values())
+
+    def report(self):
+        """Load, scale and build times, slowest first, as printable lines."""
+        lines = [f"{kind:<6} {seconds * 1000:8.2f} ms  {key}"
+                 for (kind, key), seconds in sorted(self.load_times.items(), key=lambda item: -item[1])]
+        lines.append(f"total  {self.total_time() * 1000:8.2f} ms  {len(self.images)} images, "
+                     f"{len(self.scaled_images)} scaled, {len(self.surfaces)} built, "
+                     f"{self.hits} hits, {self.misses} misses")
+        return lines
+
+
+class TextCache:
+    """Rendered text surfaces keyed by font, string, colour and antialiasing."""
+
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color, background=None):
+        """``font.render`` with the result cached; same arguments."""
+        key = (font, text, antialias, tuple(color), background and tuple(background))
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = font.render(text, antialias, color, background)
+        self.entries[key] = surface
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+ASSETS = AssetCache()
+TEXT = TextCache()
+
+
+def main(argv=None):
+    sizes = [int(size) for size in (argv if argv is not None else sys.argv[1:])] or [100, 40]
+    for color in ("white", "black"):
+        for name in ("king", "queen", "rook", "bishop", "knight", "pawn"):
+            for size in sizes:
+                try:
+                    ASSETS.scaled(f"img/{color}-{name}.png", (size, size))
+                except (pygame.error, OSError) as error:
+                    print(f"could not load img/{color}-{name}.png: {error}")
+    for line in ASSETS.report():
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
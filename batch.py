@@ -0,0 +1,144 @@
+"""Analyse many positions offline over a process pool.
+
+Reads one FEN per line from a file or standard input and writes one JSON
+object per line, in input order: legal move count, check / checkmate /
+stalemate, material balance and, with ``--depth``, an engine score.  Only
+the pygame-free ``rules`` and ``engine`` modules are used, so no window is
+opened.
+
+Lines are sent to the workers in chunks.  At most ``--max-pending`` chunks
+are in flight at once, so input is only read as fast as results are
+written, and memory stays flat however long the input is.  Progress and
+positions/sec go to standard error.
+
+Usage:
+    python batch.py positions.fen > results.jsonl
+    python batch.py --depth 3 --workers 8 < positions.fen
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from itertools import islice
+
+from engine import Engine, PIECE_VALUES
+from rules import Position, TYPE_MASK, WHITE
+
+_engine = None
+
+
+def material(position):
+    """White's material minus black's, in centipawns."""
+    balance = 0
+    for sq, code in enumerate(position.squares):
+        if code:
+            value = PIECE_VALUES[code & TYPE_MASK]
+            balance += value if code & WHITE else -value
+    return balance
+
+
+def analyse(fen, depth=0):
+    """Result dict for one FEN; a bad FEN gives a dict with an ``error``."""
+    global _engine
+    try:
+        position = Position(fen)
+    except ValueError as error:
+        return {"fen": fen, "error": str(error)}
+    result = {
+        "fen": fen,
+        "moves": len(position.legal_moves()),
+        "check": position.check,
+        "checkmate": position.checkmate,
+        "stalemate": position.stalemate,
+        "material": material(position),
+    }
+    if depth:
+        if _engine is None:
+            _engine = Engine(table_entries=1 << 16)
+        # A table left over from earlier positions would make scores depend on the chunk layout
+        _engine.table.clear()
+        move, score = _engine.search(position, depth)
+        result["score"] = score
+        result["best"] = move and [list(move[0]), list(move[1])]
+    return result
+
+
+def analyse_chunk(fens, depth=0):
+    return [analyse(fen, depth) for fen in fens]
+
+
+def chunks(lines, size):
+    """Lists of up to ``size`` FENs, skipping blank and ``#`` comment lines."""
+    fens = (line.strip() for line in lines)
+    fens = (fen for fen in fens if fen and not fen.startswith("#"))
+    while True:
+        chunk = list(islice(fens, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run(lines, out, workers=None, chunk_size=64, max_pending=None, depth=0, progress=sys.stderr):
+    """Analyse every FEN in ``lines``, writing JSONL to ``out``; return the count."""
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    done = 0
+    start = last_report = time.perf_counter()
+
+    def write(results):
+        nonlocal done, last_report
+        for result in results:
+            out.write(json.dumps(result) + "\n")
+        done += len(results)
+        now = time.perf_counter()
+        if progress and now - last_report >= 1.0:
+            last_report = now
+            print(f"\r{done} positions, {done / (now - start):.0f}/s", end="", file=progress, flush=True)
+
+    if workers == 1:
+        for chunk in chunks(lines, chunk_size):
+            write(analyse_chunk(chunk, depth))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            pending = deque()
+            for chunk in chunks(lines, chunk_size):
+                # Wait for the oldest chunk before reading more input
+                if len(pending) >= max_pending:
+                    write(pending.popleft().get())
+                pending.append(pool.apply_async(analyse_chunk, (chunk, depth)))
+            while pending:
+                write(pending.popleft().get())
+
+    seconds = time.perf_counter() - start
+    if progress:
+        rate = f"{done / seconds:.0f}" if seconds > 0 else "-"
+        print(f"\r{done} positions in {seconds:.2f}s, {rate} positions/sec", file=progress)
+    return done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse FEN positions and write JSON lines in input order.")
+    parser.add_argument("input", nargs="?", default="-", help="file with one FEN per line ('-' for standard input)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="positions sent to a worker at a time")
+    parser.add_argument("--max-pending", type=int, help="chunks in flight at once (default: twice the workers)")
+    parser.add_argument("--depth", type=int, default=0, help="also search each position to this depth")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    args = parser.parse_args(argv)
+
+    lines = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        run(lines, sys.stdout, args.workers, args.chunk_size, args.max_pending, args.depth,
+            progress=None if args.quiet else sys.stderr)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""Memory-mapped opening book.
+
+The file is a sorted array of 16-byte big-endian entries laid out like
+Polyglot's: key (8 bytes), move (2), weight (2), learn (4).  It is not a
+Polyglot book, though: the key is ``Position.key``, our own Zobrist key, and
+a move is ``from_sq | to_sq << 6`` with square 0 on a8.  Lookups binary
+search the mapped file, so nothing is read into memory up front.
+
+Usage:
+    python book.py build games.pgn book.bin --max-ply 20
+    python book.py probe book.bin --fen "<FEN>"
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+from notation import parse_san, read_pgn
+from rules import Position, START_FEN, SQUARE_POS, square_name
+
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+BOOK_PATH = "book.bin"
+
+
+def encode_move(move):
+    (start_row, start_col), (end_row, end_col) = move
+    return (start_row * 8 + start_col) | (end_row * 8 + end_col) << 6
+
+
+def decode_move(move):
+    return SQUARE_POS[move & 63], SQUARE_POS[move >> 6 & 63]
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = size // ENTRY.size
+        # mmap cannot map an empty file
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+
+    def close(self):
+        if self.count:
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def _first(self, key):
+        # Index of the first entry with a key not below ``key``
+        low, high = 0, self.count
+        data = self.data
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lookup(self, key):
+        """``[(move, weight)]`` stored for ``key``, heaviest first."""
+        found = []
+        index = self._first(key)
+        while index < self.count:
+            entry_key, move, weight, _ = ENTRY.unpack_from(self.data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((decode_move(move), weight))
+            index += 1
+        return found
+
+    def choose(self, position, rng=random):
+        """A legal book move for ``position`` picked by weight, or None."""
+        entries = self.lookup(position.key)
+        if not entries:
+            return None
+        legal = position.legal_moves()
+        entries = [(move, weight) for move, weight in entries if move in legal and weight]
+        if not entries:
+            return None
+        return rng.choices([move for move, _ in entries], [weight for _, weight in entries])[0]
+
+
+def load_book(path=BOOK_PATH):
+    """The book at ``path``, or None if there is no such file."""
+    if not os.path.exists(path):
+        return None
+    return OpeningBook(path)
+
+
+def build_book(games, path, max_ply=20, min_games=1):
+    """Write a book of the first ``max_ply`` moves of ``games``.
+
+    A move's weight is the number of games that played it, capped to fit
+    the entry.  Moves seen in fewer than ``min_games`` games are left out.
+    Returns ``(games_read, entries_written)``.
+    """
+    counts = {}
+    games_read = 0
+    for game in games:
+        games_read += 1
+        position = game.start_position()
+        for san in game.moves[:max_ply]:
+            try:
+                move = parse_san(position, san)
+            except ValueError:
+                break
+            key = (position.key, encode_move(move))
+            counts[key] = counts.get(key, 0) + 1
+            position.make_move(*move)
+
+    entries = sorted(((key, move, min(count, 0xFFFF)) for (key, move), count in counts.items() if count >= min_games),
+                     key=lambda entry: (entry[0], -entry[2], entry[1]))
+    with open(path, "wb") as out:
+        for key, move, weight in entries:
+            out.write(ENTRY.pack(key, move, weight, 0))
+    return games_read, len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or probe an opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from a PGN file")
+    build.add_argument("pgn")
+    build.add_argument("book")
+    build.add_argument("--max-ply", type=int, default=20)
+    build.add_argument("--min-games", type=int, default=1)
+    probe = commands.add_parser("probe", help="list the book moves for a position")
+    probe.add_argument("book")
+    probe.add_argument("--fen", default=START_FEN)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        with open(args.pgn, encoding="utf-8", errors="replace") as stream:
+            games, entries = build_book(read_pgn(stream), args.book, args.max_ply, args.min_games)
+        print(f"{games} games, {entries} entries in {time.perf_counter() - start:.2f}s")
+        return 0
+
+    position = Position(args.fen)
+    with OpeningBook(args.book) as book:
+        start = time.perf_counter()
+        for _ in range(1000):
+            entries = book.lookup(position.key)
+        micros = (time.perf_counter() - start) * 1000
+        for move, weight in entries:
+            print(f"{square_name(move[0])}{square_name(move[1])}  {weight}")
+        print(f"{len(entries)} moves, {len(book)} entries, {micros:.1f} us per lookup")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,457 @@
+"""Computer opponent: iterative-deepening alpha-beta search over ``Position``.
+
+The search is a principal variation search with a transposition table,
+check extensions and a captures-only quiescence search.  Moves are ordered
+by the table's best move, then captures by MVV-LVA, then killer moves and
+the history heuristic.  A search stops at a depth, time or node budget.
+
+With ``tablebases`` (see ``tablebase.py``) positions the tables cover are
+scored from them instead of searched, and a covered root position is
+answered straight from the table.
+
+``EngineWorker`` runs the search on a background thread and hands progress
+reports and the chosen move back through a queue, so the GUI loop keeps
+drawing and handling events while the computer thinks.
+
+Usage:
+    python engine.py --time 2
+    python engine.py --fen "<FEN>" --depth 5
+"""
+
+import argparse
+import queue
+import sys
+import threading
+import time
+
+from rules import (Position, START_FEN, TYPE_MASK, WHITE, BLACK,
+                   PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, square_name)
+from tablebase import load_tablebases
+from ttable import TranspositionTable, EXACT, LOWER, UPPER
+
+MATE = 100000
+INFINITY = 1000000
+
+PIECE_VALUES = {PAWN: 100, KNIGHT: 320, BISHOP: 330, ROOK: 500, QUEEN: 900, KING: 0}
+
+# Piece-square tables from white's side, a8 first (the order of
+# Position.squares); black reads them mirrored.
+PIECE_SQUARE_TABLES = {
+    PAWN: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ],
+    KNIGHT: [
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ],
+    BISHOP: [
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ],
+    ROOK: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ],
+    QUEEN: [
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ],
+    KING: [
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ],
+}
+
+# SQUARE_VALUES[code][sq]: material plus placement, positive for white
+SQUARE_VALUES = [[0] * 64 for _ in range(32)]
+for _type, _table in PIECE_SQUARE_TABLES.items():
+    for _sq in range(64):
+        SQUARE_VALUES[WHITE | _type][_sq] = PIECE_VALUES[_type] + _table[_sq]
+        SQUARE_VALUES[BLACK | _type][_sq] = -(PIECE_VALUES[_type] + _table[_sq ^ 56])
+
+MAX_PLY = 128
+
+
+class SearchStopped(Exception):
+    pass
+
+
+def evaluate(position):
+    """Static score in centipawns from the side to move's point of view."""
+    score = 0
+    piece_squares = position.piece_squares
+    for code in range(WHITE | PAWN, BLACK | KING + 1):
+        squares = piece_squares[code]
+        if squares:
+            values = SQUARE_VALUES[code]
+            for sq in squares:
+                score += values[sq]
+    return score if position.turn == "white" else -score
+
+
+def move_name(move):
+    return square_name(move[0]) + square_name(move[1])
+
+
+def _to_table(score, ply):
+    # Mate scores are stored relative to the node, not the root
+    if score > MATE - MAX_PLY:
+        return score + ply
+    if score < -MATE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score > MATE - MAX_PLY:
+        return score - ply
+    if score < -MATE + MAX_PLY:
+        return score + ply
+    return score
+
+
+def _tablebase_score(outcome, dtm, ply):
+    if outcome > 0:
+        return MATE - ply - dtm
+    if outcome < 0:
+        return -MATE + ply + dtm
+    return 0
+
+
+class Engine:
+    def __init__(self, table_entries=1 << 18, table=None, tablebases=None):
+        self.tablebases = tablebases
+        # Any object with the TranspositionTable probe/store/new_search methods
+        self.table = table if table is not None else TranspositionTable(table_entries)
+        self.nodes = 0
+
+    def search(self, position, max_depth=64, time_limit=None, node_limit=None,
+               on_info=None, stop_event=None):
+        """Search ``position`` and return ``(best_move, score)``.
+
+        ``position`` is searched in place with make/unmake and left as it
+        was.  ``on_info`` is called with a dict of depth, score, nodes, nps,
+        time and pv after each completed iteration.
+        """
+        moves = position.legal_moves()
+        if not moves:
+            return None, 0
+        self.nodes = 0
+        self.start_time = time.perf_counter()
+        found = self.tablebases and self.tablebases.best_move(position)
+        if found:
+            move, outcome, dtm = found
+            score = _tablebase_score(outcome, dtm, 0)
+            if on_info:
+                on_info({"depth": 0, "score": score, "nodes": 0, "nps": 0,
+                         "time": time.perf_counter() - self.start_time, "pv": [move]})
+            return move, score
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.stop_event = stop_event
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+        self.table.new_search()
+
+        best_move, best_score = moves[0], 0
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self._search(position, depth, -INFINITY, INFINITY, 0)
+            except SearchStopped:
+                break
+            entry = self.table.probe(position.key)
+            if entry is not None and entry[3] is not None:
+                best_move = entry[3]
+            best_score = score
+            elapsed = time.perf_counter() - self.start_time
+            if on_info:
+                on_info({
+                    "depth": depth,
+                    "score": score,
+                    "nodes": self.nodes,
+                    "nps": int(self.nodes / elapsed) if elapsed > 0 else 0,
+                    "time": elapsed,
+                    "pv": self.principal_variation(position, depth),
+                })
+            if abs(score) > MATE - MAX_PLY:
+                break
+            # The next iteration would take several times as long
+            if time_limit is not None and elapsed > time_limit / 2:
+                break
+        return best_move, best_score
+
+    def principal_variation(self, position, depth):
+        """Best line stored in the table, as ``(start_pos, end_pos)`` moves."""
+        pv = []
+        undos = []
+        seen = set()
+        while len(pv) < depth and position.key not in seen:
+            seen.add(position.key)
+            entry = self.table.probe(position.key)
+            if entry is None or entry[3] not in position.legal_moves():
+                break
+            pv.append(entry[3])
+            undos.append(position.make_move(*entry[3]))
+        for undo in reversed(undos):
+            position.unmake_move(undo)
+        return pv
+
+    def _check_budget(self):
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchStopped
+        if self.time_limit is not None and time.perf_counter() - self.start_time >= self.time_limit:
+            raise SearchStopped
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchStopped
+
+    def _order(self, position, moves, tt_move, ply):
+        squares = position.squares
+        killers = self.killers[ply]
+        history = self.history
+        scored = []
+        for move in moves:
+            start, end = move
+            target = squares[end[0] * 8 + end[1]]
+            if move == tt_move:
+                score = 1 << 30
+            elif target:
+                # MVV-LVA: most valuable victim, then least valuable attacker
+                score = (1 << 20) + PIECE_VALUES[target & TYPE_MASK] * 8 - (squares[start[0] * 8 + start[1]] & TYPE_MASK)
+            elif move == killers[0] or move == killers[1]:
+                score = 1 << 19
+            else:
+                score = history.get(move, 0)
+            scored.append((score, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+
+    def _search(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self._check_budget()
+        if ply and position.key in position.history:
+            return 0
+        if ply and self.tablebases:
+            result = self.tablebases.probe(position)
+            if result is not None:
+                return _tablebase_score(result[0], result[1], ply)
+
+        moves, in_check = position.generate_legal_moves()
+        if not moves:
+            return -MATE + ply if in_check else 0
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY - 1:
+            return self._quiesce(position, alpha, beta, ply, moves, in_check)
+
+        key = position.key
+        tt_move = None
+        entry = self.table.probe(key)
+        if entry is not None:
+            entry_depth, value, bound, tt_move = entry
+            if ply and entry_depth >= depth:
+                value = _from_table(value, ply)
+                if (bound == EXACT or (bound == LOWER and value >= beta) or
+                        (bound == UPPER and value <= alpha)):
+                    return value
+
+        original_alpha = alpha
+        best_score = -INFINITY
+        best_move = None
+        squares = position.squares
+        for index, move in enumerate(self._order(position, moves, tt_move, ply)):
+            quiet = not squares[move[1][0] * 8 + move[1][1]]
+            undo = position.make_move(*move)
+            # A stop raises SearchStopped from deep in the tree; every ply is still taken back
+            try:
+                if index == 0:
+                    score = -self._search(position, depth - 1, -beta, -alpha, ply + 1)
+                else:
+                    score = -self._search(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                    if alpha < score < beta:
+                        score = -self._search(position, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                position.unmake_move(undo)
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if quiet:
+                    killers = self.killers[ply]
+                    if killers[0] != move:
+                        killers[1] = killers[0]
+                        killers[0] = move
+                    self.history[move] = self.history.get(move, 0) + depth * depth
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(key, depth, _to_table(best_score, ply), bound, best_move)
+        return best_score
+
+    def _quiesce(self, position, alpha, beta, ply, moves, in_check):
+        """Search captures only (every move when in check) until the position is quiet."""
+        if in_check:
+            candidates = moves
+        else:
+            stand_pat = evaluate(position)
+            if stand_pat >= beta or ply >= MAX_PLY - 1:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            squares = position.squares
+            candidates = [move for move in moves if squares[move[1][0] * 8 + move[1][1]]]
+            if not candidates:
+                return stand_pat
+
+        best_score = -INFINITY if in_check else alpha
+        for move in self._order(position, candidates, None, ply):
+            undo = position.make_move(*move)
+            try:
+                self.nodes += 1
+                if self.nodes & 1023 == 0:
+                    self._check_budget()
+                replies, reply_in_check = position.generate_legal_moves()
+                if not replies:
+                    score = MATE - ply - 1 if reply_in_check else 0
+                else:
+                    score = -self._quiesce(position, -beta, -alpha, ply + 1, replies, reply_in_check)
+            finally:
+                position.unmake_move(undo)
+            if score > best_score:
+                best_score = score
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+        return best_score
+
+
+class EngineWorker:
+    """Runs ``Engine.search`` on a background thread.
+
+    ``poll`` returns the messages posted since the last call: ``("info",
+    info_dict)`` after each iteration and finally ``("bestmove", move)``.
+    ``notify`` is called from the search thread after each message, so an
+    event loop that blocks while idle can be woken up.
+    """
+
+    def __init__(self, time_limit=1.0, node_limit=None, max_depth=64, notify=None, tablebases=None):
+        self.engine = Engine(tablebases=tablebases)
+        self.notify = notify
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        self.messages = queue.Queue()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def start(self, position):
+        """Start thinking about a copy of ``position``."""
+        self.stop()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(position.copy(), self.stop_event), daemon=True)
+        self.thread.start()
+
+    def _run(self, position, stop_event):
+        move, _ = self.engine.search(position, self.max_depth, self.time_limit, self.node_limit,
+                                     on_info=lambda info: self._post("info", info),
+                                     stop_event=stop_event)
+        if not stop_event.is_set():
+            self._post("bestmove", move)
+
+    def _post(self, kind, value):
+        self.messages.put((kind, value))
+        if self.notify:
+            self.notify()
+
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                messages.append(self.messages.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def stop(self):
+        """Abandon the current search; its result is never reported."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.poll()
+
+
+def format_info(info):
+    return (f"depth {info['depth']} score {info['score']} nodes {info['nodes']} "
+            f"nps {info['nps']} time {info['time']:.2f}s pv {' '.join(move_name(move) for move in info['pv'])}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search a position and print the best move.")
+    parser.add_argument("--fen", default=START_FEN, help="position to search (default: start position)")
+    parser.add_argument("--depth", type=int, default=64, help="deepest iteration to run")
+    parser.add_argument("--time", type=float, help="time budget in seconds")
+    parser.add_argument("--nodes", type=int, help="node budget")
+    parser.add_argument("--tb", default="tb", help="endgame table directory (default: tb)")
+    args = parser.parse_args(argv)
+
+    time_limit = args.time
+    if time_limit is None and args.depth == 64 and args.nodes is None:
+        time_limit = 5.0
+    engine = Engine(tablebases=load_tablebases(args.tb))
+    move, score = engine.search(Position(args.fen), args.depth, time_limit, args.nodes,
+                                on_info=lambda info: print(format_info(info)))
+    print(f"bestmove {move_name(move) if move else '(none)'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""Call counters and timers that cost nothing while switched off.
+
+``PROFILER.watch(owner, name)`` registers a function on a class or module.
+Nothing changes until ``enable()``, which replaces each watched attribute
+with a wrapper that counts calls and times them; ``disable()`` puts the
+original functions back, so a disabled profiler leaves no wrapper, flag
+check or extra call on any path.  Times are inclusive: a watched function
+that calls another watched one counts the callee's time in its own.
+
+Probes watched with ``histogram=True`` also sort each call into a
+histogram of millisecond buckets, used for frame times.  ``rows()`` gives
+the numbers as dicts, and ``dump_json`` / ``dump_csv`` write them out.
+
+``watch_rules`` registers the ``rules.Position`` hot paths.  Run as a
+script, it times random games with profiling never enabled, enabled and
+disabled again:
+
+Usage:
+    python instrument.py --games 20 --json profile.json --csv profile.csv
+"""
+
+import argparse
+import csv
+import functools
+import json
+import random
+import sys
+import time
+from bisect import bisect_left
+
+from notation import move_to_san, parse_san
+from rules import Position, opponent
+
+# Upper bounds of the histogram buckets, in milliseconds; the last bucket is open
+HISTOGRAM_BOUNDS = (0.5, 1, 2, 4, 8, 16, 33, 66)
+
+
+class Probe:
+    __slots__ = ("name", "calls", "total", "max", "buckets")
+
+    def __init__(self, name, histogram=False):
+        self.name = name
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1) if histogram else None
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        if self.buckets is not None:
+            self.buckets = [0] * len(self.buckets)
+
+    def add(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if self.buckets is not None:
+            self.buckets[bisect_left(HISTOGRAM_BOUNDS, seconds * 1000)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound in ms of the bucket holding that fraction of calls, or None."""
+        if not self.buckets or not self.calls:
+            return None
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= fraction * self.calls:
+                return HISTOGRAM_BOUNDS[index] if index < len(HISTOGRAM_BOUNDS) else self.max * 1000
+        return self.max * 1000
+
+    def row(self):
+        row = {"name": self.name, "calls": self.calls, "total_ms": round(self.total * 1000, 3),
+               "mean_us": round(self.total / self.calls * 1e6, 2) if self.calls else 0.0,
+               "max_ms": round(self.max * 1000, 3)}
+        if self.buckets is not None:
+            row["histogram"] = dict(zip([f"<={bound}ms" for bound in HISTOGRAM_BOUNDS] + ["more"], self.buckets))
+        return row
+
+
+def _wrap(function, probe):
+    clock = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            probe.add(clock() - start)
+    return wrapper
+
+
+class Profiler:
+    def __init__(self):
+        # (owner, attribute, probe) for everything watched
+        self.targets = []
+        self.probes = {}
+        # (owner, attribute) -> the original, while enabled
+        self.originals = {}
+        self.enabled = False
+
+    def watch(self, owner, attribute, name=None, histogram=False):
+        """Count and time calls to ``owner.attribute`` while enabled.
+
+        Watching the same attribute again returns the probe it already has.
+        """
+        for watched_owner, watched_attribute, watched_probe in self.targets:
+            if watched_owner is owner and watched_attribute == attribute:
+                return watched_probe
+        name = name or attribute
+        probe = self.probes.get(name)
+        if probe is None:
+            probe = self.probes[name] = Probe(name, histogram)
+        self.targets.append((owner, attribute, probe))
+        if self.enabled:
+            self._install(owner, attribute, probe)
+        return probe
+
+    def _install(self, owner, attribute, probe):
+        if (owner, attribute) in self.originals:
+            # Already wrapped: wrapping the wrapper would lose the original
+            return
+        # None for a method a class inherits, so disable() just removes the wrapper
+        own = not isinstance(owner, type) or attribute in vars(owner)
+        original = getattr(owner, attribute)
+        self.originals[owner, attribute] = original if own else None
+        setattr(owner, attribute, _wrap(original, probe))
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            for owner, attribute, probe in self.targets:
+                self._install(owner, attribute, probe)
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            for (owner, attribute), original in self.originals.items():
+                if original is None:
+                    delattr(owner, attribute)
+                else:
+                    setattr(owner, attribute, original)
+            self.originals.clear()
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def reset(self):
+        for probe in self.probes.values():
+            probe.reset()
+
+    def rows(self):
+        return [probe.row() for probe in self.probes.values()]
+
+    def dump_json(self, path):
+        with open(path, "w") as out:
+            json.dump(self.rows(), out, indent=2)
+
+    def dump_csv(self, path):
+        bucket_names = [f"<={bound}ms" for bound in HISTOGRAM_BOUNDS] + ["more"]
+        with open(path, "w", newline="") as out:
+            writer = csv.writer(out)
+            writer.writerow(["name", "calls", "total_ms", "mean_us", "max_ms"] + bucket_names)
+            for row in self.rows():
+                histogram = row.get("histogram", {})
+                writer.writerow([row["name"], row["calls"], row["total_ms"], row["mean_us"], row["max_ms"]] +
+                                [histogram.get(name, "") for name in bucket_names])
+
+    def report(self):
+        """One printable line per probe, most total time first."""
+        lines = []
+        for probe in sorted(self.probes.values(), key=lambda probe: -probe.total):
+            line = f"{probe.name:<24} {probe.calls:>9} calls {probe.total * 1000:10.2f} ms"
+            if probe.calls:
+                line += f" {probe.total / probe.calls * 1e6:9.2f} us/call"
+            p95 = probe.percentile(0.95)
+            if p95 is not None:
+                line += f"  p95 <= {p95:g} ms"
+            lines.append(line)
+        return lines
+
+
+PROFILER = Profiler()
+
+
+def watch_rules(profiler=PROFILER):
+    """Watch the ``Position`` methods the rules and the GUI lean on."""
+    for attribute in ("get_raw_moves", "would_be_in_check", "is_square_under_attack", "has_king_escape",
+                      "generate_legal_moves", "make_move"):
+        profiler.watch(Position, attribute)
+    profiler.watch(Position, "copy", "board copies")
+
+
+def _play(games, seed):
+    # Random games that go through every watched path on each ply, roughly
+    # as the GUI and the PGN code do
+    rng = random.Random(seed)
+    for _ in range(games):
+        position = Position()
+        for _ in range(100):
+            moves = position.legal_moves()
+            if not moves or not position.has_king_escape():
+                break
+            move = rng.choice(moves)
+            start, end = move
+            position.get_valid_moves(position.board[start[0]][start[1]], start)
+            position.is_square_under_attack(end[0], end[1], opponent(position.turn))
+            parse_san(position, move_to_san(position, move))
+            position.copy()
+            position.play_move(start, end)
+            if position.repetition:
+                break
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the rules on random games and report the overhead.")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each case; the fastest counts")
+    parser.add_argument("--json", help="write the counters to this JSON file")
+    parser.add_argument("--csv", help="write the counters to this CSV file")
+    args = parser.parse_args(argv)
+
+    def best_time():
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            _play(args.games, args.seed)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    baseline = best_time()
+    watch_rules()
+    PROFILER.enable()
+    enabled = best_time()
+    PROFILER.disable()
+    disabled = best_time()
+
+    # Counts from the last enabled run only
+    PROFILER.reset()
+    PROFILER.enable()
+    _play(args.games, args.seed)
+    PROFILER.disable()
+    for line in PROFILER.report():
+        print(line)
+    if args.json:
+        PROFILER.dump_json(args.json)
+    if args.csv:
+        PROFILER.dump_csv(args.csv)
+    for label, seconds in (("never enabled", baseline), ("enabled", enabled), ("disabled again", disabled)):
+        print(f"{label:<15} {seconds:7.3f}s  {seconds / baseline:5.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,712 +1,790 @@
-import pygame
-import sys
-import os
-
-# Initialize Pygame
-pygame.init()
-
-# Constants
-BOARD_SIZE = 800  # Keep the board fully square and large enough
-SIDEBAR_WIDTH = 200  # Reduce sidebar width to make more room for board
-WIDTH, HEIGHT = BOARD_SIZE + SIDEBAR_WIDTH, BOARD_SIZE  # Adjust height to fit
-ROWS, COLS = 8, 8
-SQUARE_SIZE = BOARD_SIZE // COLS  # Ensure square tiles
-
-
-
-# Colors
-WHITE = (255, 255, 255)
-BLACK = (0, 0, 0)
-BUTTON_COLOR = (70, 130, 180)
-TEXT_COLOR = (255, 255, 255)
-BOARD_WHITE = (238, 238, 210)
-BOARD_BLACK = (118, 150, 86)
-HIGHLIGHT_COLOR = (186, 202, 68, 150)
-CHECK_COLOR = (255, 255, 0, 150)
-CHECKMATE_COLOR = (255, 0, 0)
-CASTLING_COLOR = (0, 255, 255, 150)
-SIDEBAR_COLOR = (240, 240, 240)
-CAPTURED_PIECE_SIZE = 40
-
-# Create window
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Chess Game")
-pygame.display.update()
-
-# Fonts
-font_large = pygame.font.Font(None, 72)
-font_medium = pygame.font.Font(None, 50)
-font_small = pygame.font.Font(None, 36)
-
-class Button:
-    def __init__(self, text, x, y, width, height, action=None):
-        self.text = text
-        self.rect = pygame.Rect(x, y, width, height)
-        self.action = action
-        self.hover = False
-
-    def draw(self):
-        color = (BUTTON_COLOR[0] + 30, BUTTON_COLOR[1] + 30, BUTTON_COLOR[2] + 30) if self.hover else BUTTON_COLOR
-        pygame.draw.rect(screen, color, self.rect, border_radius=10)
-        pygame.draw.rect(screen, (0, 0, 0), self.rect, 2, border_radius=10)
-        
-        text_surf = font_medium.render(self.text, True, TEXT_COLOR)
-        text_rect = text_surf.get_rect(center=self.rect.center)
-        screen.blit(text_surf, text_rect)
-
-    def check_hover(self, pos):
-        self.hover = self.rect.collidepoint(pos)
-
-    def check_click(self, pos):
-        if self.rect.collidepoint(pos) and self.action:
-            self.action()
-
-def home_screen():
-    title_text = font_large.render("CHESS", True, (0, 0, 0))
-    title_rect = title_text.get_rect(center=(WIDTH//2, HEIGHT//3))
-
-    # Load and scale background once
-    background = pygame.image.load('C:/Users/elwin/Desktop/Code/chess/chess_logo.jpg')
-    background = pygame.transform.scale(background, (WIDTH, HEIGHT))
-
-    start_button = Button("Start Game", WIDTH//2 - 100, HEIGHT//2, 200, 60, start_game)
-    quit_button = Button("Quit", WIDTH//2 - 100, HEIGHT//2 + 100, 200, 60, quit_game)
-
-    running = True
-    while running:
-        mouse_pos = pygame.mouse.get_pos()
-
-        # Draw background first
-        screen.blit(background, (0, 0))
-
-        # Then draw title and buttons
-        screen.blit(title_text, title_rect)
-
-        start_button.check_hover(mouse_pos)
-        quit_button.check_hover(mouse_pos)
-
-        start_button.draw()
-        quit_button.draw()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                quit_game()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                start_button.check_click(mouse_pos)
-                quit_button.check_click(mouse_pos)
-
-        pygame.display.flip()
-
-def quit_game():
-    pygame.quit()
-    sys.exit()
-
-def load_pieces():
-    pieces = {}
-    piece_names = ['king', 'queen', 'rook', 'bishop', 'knight', 'pawn']
-    colors = ['white', 'black']
-    
-    for color in colors:
-        for name in piece_names:
-            try:
-                image = pygame.image.load(f'img/{color}-{name}.png')
-                pieces[f'{color}_{name}'] = pygame.transform.scale(image, (SQUARE_SIZE, SQUARE_SIZE))
-                # Create smaller version for captured pieces display
-                pieces[f'small_{color}_{name}'] = pygame.transform.scale(image, (CAPTURED_PIECE_SIZE, CAPTURED_PIECE_SIZE))
-            except:
-                # Fallback: create simple colored rectangles
-                surf = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                col = (255, 255, 255) if color == "white" else (50, 50, 50)
-                pygame.draw.rect(surf, col, (5, 5, SQUARE_SIZE-10, SQUARE_SIZE-10), border_radius=5)
-                text = font_small.render(name[0].upper(), True, (255, 0, 0) if color == "white" else (0, 255, 0))
-                surf.blit(text, (SQUARE_SIZE//2 - text.get_width()//2, SQUARE_SIZE//2 - text.get_height()//2))
-                pieces[f'{color}_{name}'] = surf
-                # Create small version
-                small_surf = pygame.Surface((CAPTURED_PIECE_SIZE, CAPTURED_PIECE_SIZE), pygame.SRCALPHA)
-                pygame.draw.rect(small_surf, col, (2, 2, CAPTURED_PIECE_SIZE-4, CAPTURED_PIECE_SIZE-4), border_radius=3)
-                small_text = font_small.render(name[0].upper(), True, (255, 0, 0) if color == "white" else (0, 255, 0))
-                small_surf.blit(small_text, (CAPTURED_PIECE_SIZE//2 - small_text.get_width()//2, 
-                                           CAPTURED_PIECE_SIZE//2 - small_text.get_height()//2))
-                pieces[f'small_{color}_{name}'] = small_surf
-                print(f"Could not load image for {color}_{name}, using fallback")
-    
-    return pieces
-
-def initialize_board():
-    return [
-        ["black_rook", "black_knight", "black_bishop", "black_queen", "black_king", "black_bishop", "black_knight", "black_rook"],
-        ["black_pawn"] * 8,
-        [None] * 8,
-        [None] * 8,
-        [None] * 8,
-        [None] * 8,
-        ["white_pawn"] * 8,
-        ["white_rook", "white_knight", "white_bishop", "white_queen", "white_king", "white_bishop", "white_knight", "white_rook"]
-    ]
-
-def promote_pawn(board, row, col, color):
-    """Prompts the user to choose a promotion piece when a pawn reaches the last rank."""
-    if (color == "white" and row == 0) or (color == "black" and row == 7):
-        pieces = ["queen", "rook", "bishop", "knight"]
-
-        # Create a Pygame popup window to choose the piece
-        running = True
-        while running:
-            screen.fill((200, 200, 200))  # Light gray background
-            font = pygame.font.Font(None, 50)
-            prompt_text = font.render(f"Promote {color} pawn to:", True, (0, 0, 0))
-            screen.blit(prompt_text, (WIDTH//2 - 150, HEIGHT//3 - 50))
-
-            buttons = []
-            for i, piece in enumerate(pieces):
-                button_rect = pygame.Rect(WIDTH//2 - 100, HEIGHT//3 + i * 70, 200, 50)
-                pygame.draw.rect(screen, (255, 255, 255), button_rect)  # White button
-                pygame.draw.rect(screen, (0, 0, 0), button_rect, 2)  # Black border
-                text_surf = font.render(piece.capitalize(), True, (0, 0, 0))
-                text_rect = text_surf.get_rect(center=button_rect.center)
-                screen.blit(text_surf, text_rect)
-                buttons.append((button_rect, piece))
-
-            pygame.display.flip()
-
-            # Handle user click
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    exit()
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    mouse_pos = pygame.mouse.get_pos()
-                    for button_rect, chosen_piece in buttons:
-                        if button_rect.collidepoint(mouse_pos):
-                            board[row][col] = f"{color}_{chosen_piece}"  # Update board with chosen piece
-                            running = False  # Exit loop
-
-
-
-class ChessGame:
-    def __init__(self):
-        self.reset_game()
-        
-    def reset_game(self):
-        self.pieces = load_pieces()
-        self.board = initialize_board()
-        self.selected_piece = None
-        self.selected_pos = None
-        self.valid_moves = []
-        self.turn = "white"
-        self.checkmate = False
-        self.check = False
-        self.white_captured = []
-        self.black_captured = []
-        self.is_moving = False
-        self.move_start_pos = None
-        self.move_end_pos = None
-        self.move_progress = 0
-        self.ANIMATION_SPEED = 15
-        self.show_checkmate_dialog = False
-        self.dialog_new_game_button = Button("New Game", WIDTH//2 - 100, HEIGHT//2 + 50, 200, 60, self.reset_game)
-        self.dialog_quit_button = Button("Quit", WIDTH//2 - 100, HEIGHT//2 + 130, 200, 60, home_screen)
-        self.white_king_moved = False
-        self.white_rook_left_moved = False
-        self.white_rook_right_moved = False
-        self.black_king_moved = False
-        self.black_rook_left_moved = False
-        self.black_rook_right_moved = False
-
-    def handle_click(self, pos):
-        if self.is_moving or self.show_checkmate_dialog:
-            return
-            
-        # Only handle clicks on the board area
-        if pos[0] >= BOARD_SIZE:
-            return
-
-        col, row = pos[0] // SQUARE_SIZE, pos[1] // SQUARE_SIZE
-        clicked_piece = self.board[row][col]
-        
-        if self.selected_piece:
-            if (row, col) in self.valid_moves:
-                self.move_start_pos = self.selected_pos
-                self.move_end_pos = (row, col)
-                self.is_moving = True
-                self.move_progress = 0
-            self.selected_piece = None
-            self.valid_moves = []
-        else:
-            if clicked_piece and clicked_piece.startswith(self.turn):
-                self.selected_piece = clicked_piece
-                self.selected_pos = (row, col)
-                self.valid_moves = self.get_valid_moves(clicked_piece, (row, col))
-                # Filter out moves that would leave king in check
-                self.valid_moves = [move for move in self.valid_moves if not self.would_be_in_check((row, col), move)]
-
-    def would_be_in_check(self, start_pos, end_pos):
-        # Simulate the move
-        temp_board = [row[:] for row in self.board]
-        piece = temp_board[start_pos[0]][start_pos[1]]
-        temp_board[end_pos[0]][end_pos[1]] = piece
-        temp_board[start_pos[0]][start_pos[1]] = None
-        
-        # Find king position
-        king_pos = None
-        for row in range(ROWS):
-            for col in range(COLS):
-                p = temp_board[row][col]
-                if p and p.startswith(self.turn) and p.endswith('king'):
-                    king_pos = (row, col)
-                    break
-            if king_pos:
-                break
-        
-        # Check if king is under attack
-        enemy_color = "black" if self.turn == "white" else "white"
-        enemy_moves = []
-        for row in range(ROWS):
-            for col in range(COLS):
-                p = temp_board[row][col]
-                if p and p.startswith(enemy_color):
-                    enemy_moves.extend(self.get_raw_moves(p, (row, col), temp_board))
-        
-        return king_pos in enemy_moves if king_pos else False
-
-    def get_raw_moves(self, piece, pos, board):
-        moves = []
-        row, col = pos
-        piece_type = piece.split('_')[1]
-        color = piece.split('_')[0]
-
-        if piece_type == "pawn":
-            direction = -1 if color == "white" else 1
-            start_row = 6 if color == "white" else 1
-
-            if 0 <= row + direction < 8 and board[row + direction][col] is None:
-                moves.append((row + direction, col))
-                if row == start_row and board[row + 2 * direction][col] is None:
-                    moves.append((row + 2 * direction, col))
-            
-            for dc in [-1, 1]:
-                if 0 <= col + dc < 8 and 0 <= row + direction < 8:
-                    target = board[row + direction][col + dc]
-                    if target and not target.startswith(color):
-                        moves.append((row + direction, col + dc))
-
-        elif piece_type == "rook":
-            moves.extend(self.get_directional_moves([(1, 0), (-1, 0), (0, 1), (0, -1)], row, col, board, color))
-
-        elif piece_type == "bishop":
-            moves.extend(self.get_directional_moves([(1, 1), (-1, -1), (1, -1), (-1, 1)], row, col, board, color))
-
-        elif piece_type == "queen":
-            moves.extend(self.get_directional_moves([(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1)], row, col, board, color))
-
-        elif piece_type == "knight":
-            knight_moves = [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)]
-            for move in knight_moves:
-                r, c = row + move[0], col + move[1]
-                if 0 <= r < 8 and 0 <= c < 8:
-                    target = board[r][c]
-                    if not target or not target.startswith(color):
-                        moves.append((r, c))
-
-        elif piece_type == "king":
-            king_moves = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
-            for move in king_moves:
-                r, c = row + move[0], col + move[1]
-                if 0 <= r < 8 and 0 <= c < 8:
-                    target = board[r][c]
-                    if not target or not target.startswith(color):
-                        moves.append((r, c))
-
-        return moves
-
-    def get_valid_moves(self, piece, pos):
-        moves = []
-        row, col = pos
-        piece_type = piece.split('_')[1]
-        color = piece.split('_')[0]
-
-        if piece_type == "pawn":
-            direction = -1 if color == "white" else 1
-            start_row = 6 if color == "white" else 1
-
-            if 0 <= row + direction < 8 and self.board[row + direction][col] is None:
-                moves.append((row + direction, col))
-                if row == start_row and self.board[row + 2 * direction][col] is None:
-                    moves.append((row + 2 * direction, col))
-            
-            for dc in [-1, 1]:
-                if 0 <= col + dc < 8 and 0 <= row + direction < 8:
-                    target = self.board[row + direction][col + dc]
-                    if target and not target.startswith(color):
-                        moves.append((row + direction, col + dc))
-
-        elif piece_type == "rook":
-            moves.extend(self.get_directional_moves([(1, 0), (-1, 0), (0, 1), (0, -1)], row, col, self.board, color))
-
-        elif piece_type == "bishop":
-            moves.extend(self.get_directional_moves([(1, 1), (-1, -1), (1, -1), (-1, 1)], row, col, self.board, color))
-
-        elif piece_type == "queen":
-            moves.extend(self.get_directional_moves([(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1)], row, col, self.board, color))
-
-        elif piece_type == "knight":
-            knight_moves = [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)]
-            for move in knight_moves:
-                r, c = row + move[0], col + move[1]
-                if 0 <= r < 8 and 0 <= c < 8:
-                    target = self.board[r][c]
-                    if not target or not target.startswith(color):
-                        moves.append((r, c))
-
-        elif piece_type == "king":
-            king_moves = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
-            for move in king_moves:
-                r, c = row + move[0], col + move[1]
-                if 0 <= r < 8 and 0 <= c < 8:
-                    target = self.board[r][c]
-                    if not target or not target.startswith(color):
-                        moves.append((r, c))
-            
-            # Castling
-            if not self.is_in_check(color):
-                if color == "white" and not self.white_king_moved:
-                    # Kingside castling
-                    if (not self.white_rook_right_moved and 
-                        self.board[7][5] is None and 
-                        self.board[7][6] is None and
-                        not self.is_square_under_attack(7, 5, "black") and
-                        not self.is_square_under_attack(7, 6, "black")):
-                        moves.append((7, 6))  # Castling kingside
-                    # Queenside castling
-                    if (not self.white_rook_left_moved and 
-                        self.board[7][3] is None and 
-                        self.board[7][2] is None and 
-                        self.board[7][1] is None and
-                        not self.is_square_under_attack(7, 3, "black") and
-                        not self.is_square_under_attack(7, 2, "black")):
-                        moves.append((7, 2))  # Castling queenside
-                elif color == "black" and not self.black_king_moved:
-                    # Kingside castling
-                    if (not self.black_rook_right_moved and 
-                        self.board[0][5] is None and 
-                        self.board[0][6] is None and
-                        not self.is_square_under_attack(0, 5, "white") and
-                        not self.is_square_under_attack(0, 6, "white")):
-                        moves.append((0, 6))  # Castling kingside
-                    # Queenside castling
-                    if (not self.black_rook_left_moved and 
-                        self.board[0][3] is None and 
-                        self.board[0][2] is None and 
-                        self.board[0][1] is None and
-                        not self.is_square_under_attack(0, 3, "white") and
-                        not self.is_square_under_attack(0, 2, "white")):
-                        moves.append((0, 2))  # Castling queenside
-
-        return moves
-
-    def is_square_under_attack(self, row, col, by_color):
-        for r in range(ROWS):
-            for c in range(COLS):
-                piece = self.board[r][c]
-                if piece and piece.startswith(by_color):
-                    moves = self.get_raw_moves(piece, (r, c), self.board)
-                    if (row, col) in moves:
-                        return True
-        return False
-
-    def get_directional_moves(self, directions, row, col, board, color):
-        moves = []
-        for direction in directions:
-            for i in range(1, 8):
-                r, c = row + direction[0] * i, col + direction[1] * i
-                if 0 <= r < 8 and 0 <= c < 8:
-                    target = board[r][c]
-                    if not target:
-                        moves.append((r, c))
-                    elif not target.startswith(color):
-                        moves.append((r, c))
-                        break
-                    else:
-                        break
-        return moves
-
-    def update_board(self):
-        piece = self.board[self.move_start_pos[0]][self.move_start_pos[1]]
-        target = self.board[self.move_end_pos[0]][self.move_end_pos[1]]
-        piece_type = piece.split('_')[1]
-        color = piece.split('_')[0]
-
-        # Handle castling
-        if piece_type == "king" and abs(self.move_start_pos[1] - self.move_end_pos[1]) == 2:
-            # Kingside castling
-            if self.move_end_pos[1] == 6:
-                if color == "white":
-                    # Move rook
-                    self.board[7][5] = self.board[7][7]
-                    self.board[7][7] = None
-                    self.white_rook_right_moved = True
-                else:
-                    self.board[0][5] = self.board[0][7]
-                    self.board[0][7] = None
-                    self.black_rook_right_moved = True
-            # Queenside castling
-            elif self.move_end_pos[1] == 2:
-                if color == "white":
-                    # Move rook
-                    self.board[7][3] = self.board[7][0]
-                    self.board[7][0] = None
-                    self.white_rook_left_moved = True
-                else:
-                    self.board[0][3] = self.board[0][0]
-                    self.board[0][0] = None
-                    self.black_rook_left_moved = True
-
-        # Update king/rook moved status
-        if piece_type == "king":
-            if color == "white":
-                self.white_king_moved = True
-            else:
-                self.black_king_moved = True
-        elif piece_type == "rook":
-            if color == "white":
-                if self.move_start_pos == (7, 0):
-                    self.white_rook_left_moved = True
-                elif self.move_start_pos == (7, 7):
-                    self.white_rook_right_moved = True
-            else:
-                if self.move_start_pos == (0, 0):
-                    self.black_rook_left_moved = True
-                elif self.move_start_pos == (0, 7):
-                    self.black_rook_right_moved = True
-
-        if target:
-            if target.startswith('white'):
-                self.white_captured.append(target)
-            else:
-                self.black_captured.append(target)
-
-        self.board[self.move_end_pos[0]][self.move_end_pos[1]] = piece
-        self.board[self.move_start_pos[0]][self.move_start_pos[1]] = None
-
-    def draw_sidebar(self):
-        # Draw sidebar background
-        pygame.draw.rect(screen, SIDEBAR_COLOR, (BOARD_SIZE, 0, SIDEBAR_WIDTH, HEIGHT))
-        
-        # Draw captured pieces title
-        captured_title = font_medium.render("Captured:", True, BLACK)
-        screen.blit(captured_title, (BOARD_SIZE + 20, 20))
-        
-        # Draw white captured pieces
-        white_title = font_small.render("White took:", True, BLACK)
-        screen.blit(white_title, (BOARD_SIZE + 20, 70))
-        for i, piece in enumerate(self.black_captured):
-            x = BOARD_SIZE + 20 + (i % 4) * (CAPTURED_PIECE_SIZE + 5)
-            y = 110 + (i // 4) * (CAPTURED_PIECE_SIZE + 5)
-            screen.blit(self.pieces[f'small_{piece}'], (x, y))
-        
-        # Draw black captured pieces
-        black_title = font_small.render("Black took:", True, BLACK)
-        screen.blit(black_title, (BOARD_SIZE + 20, HEIGHT//2 + 20))
-        for i, piece in enumerate(self.white_captured):
-            x = BOARD_SIZE + 20 + (i % 4) * (CAPTURED_PIECE_SIZE + 5)
-            y = HEIGHT//2 + 60 + (i // 4) * (CAPTURED_PIECE_SIZE + 5)
-            screen.blit(self.pieces[f'small_{piece}'], (x, y))
-        
-        # Draw current turn indicator
-        turn_text = font_medium.render(f"{self.turn.capitalize()}'s turn", True, 
-                                     (0, 0, 0) if self.turn == "white" else (255, 255, 255))
-        turn_bg = (255, 255, 255) if self.turn == "white" else (0, 0, 0)
-        pygame.draw.rect(screen, turn_bg, (BOARD_SIZE + 20, HEIGHT - 100, SIDEBAR_WIDTH - 40, 60))
-        screen.blit(turn_text, (BOARD_SIZE + (SIDEBAR_WIDTH - turn_text.get_width())//2, HEIGHT - 80))
-
-    def draw_board(self):
-        for row in range(ROWS):
-            for col in range(COLS):
-                color = BOARD_WHITE if (row + col) % 2 == 0 else BOARD_BLACK
-                pygame.draw.rect(screen, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-
-    def draw_pieces(self):
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.board[row][col]
-                if piece and (not self.is_moving or (row, col) != self.move_start_pos):
-                    screen.blit(self.pieces[piece], (col * SQUARE_SIZE, row * SQUARE_SIZE))
-
-    def animate_move(self):
-        row1, col1 = self.move_start_pos
-        row2, col2 = self.move_end_pos
-        piece = self.board[row1][col1]
-        
-        move_x = (col2 - col1) * self.move_progress / SQUARE_SIZE * SQUARE_SIZE
-        move_y = (row2 - row1) * self.move_progress / SQUARE_SIZE * SQUARE_SIZE
-        screen.blit(self.pieces[piece], (col1 * SQUARE_SIZE + move_x, row1 * SQUARE_SIZE + move_y))
-
-    def draw_valid_moves(self):
-        for move in self.valid_moves:
-            row, col = move
-            # Check if this is a castling move
-            if (self.selected_piece and self.selected_piece.endswith("king") and 
-                abs(self.selected_pos[1] - col) == 2):
-                color = CASTLING_COLOR
-            else:
-                color = HIGHLIGHT_COLOR
-            
-            highlight_surface = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-            highlight_surface.fill(color)
-            screen.blit(highlight_surface, (col * SQUARE_SIZE, row * SQUARE_SIZE))
-
-    def draw_selected_tile(self):
-        if self.selected_pos:
-            row, col = self.selected_pos
-            pygame.draw.rect(screen, (0, 255, 0), (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE), 4)
-
-    def display_checkmate_dialog(self):
-        # Darken background
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        screen.blit(overlay, (0, 0))
-        
-        # Dialog box
-        pygame.draw.rect(screen, WHITE, (WIDTH//2 - 150, HEIGHT//2 - 100, 300, 300), border_radius=15)
-        
-        # Checkmate text
-        text = font_large.render("CHECKMATE!", True, CHECKMATE_COLOR)
-        screen.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//2 - 70))
-        
-        # Winner text
-        winner = "White" if self.turn == "black" else "Black"
-        winner_text = font_medium.render(f"{winner} wins!", True, BLACK)
-        screen.blit(winner_text, (WIDTH//2 - winner_text.get_width()//2, HEIGHT//2 - 20))
-        
-        # Draw dialog buttons
-        mouse_pos = pygame.mouse.get_pos()
-        self.dialog_new_game_button.check_hover(mouse_pos)
-        self.dialog_quit_button.check_hover(mouse_pos)
-        self.dialog_new_game_button.draw()
-        self.dialog_quit_button.draw()
-
-    def is_in_check(self, color):
-        king_pos = None
-        enemy_moves = []
-        enemy_color = "black" if color == "white" else "white"
-
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.board[row][col]
-                if piece and piece.startswith(color) and piece.endswith('king'):
-                    king_pos = (row, col)
-                    break
-            if king_pos:
-                break
-        
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.board[row][col]
-                if piece and piece.startswith(enemy_color):
-                    enemy_moves.extend(self.get_raw_moves(piece, (row, col), self.board))
-
-        return king_pos in enemy_moves if king_pos else False
-
-    def has_king_escape(self):
-        color = self.turn
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.board[row][col]
-                if piece and piece.startswith(color) and piece.endswith("king"):
-                    valid_moves = self.get_valid_moves(piece, (row, col))
-                    for move in valid_moves:
-                        if not self.would_be_in_check((row, col), move):
-                            return True
-        
-        # Check if any other piece can block or capture
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.board[row][col]
-                if piece and piece.startswith(color) and not piece.endswith("king"):
-                    valid_moves = self.get_valid_moves(piece, (row, col))
-                    for move in valid_moves:
-                        temp_board = [r[:] for r in self.board]
-                        temp_board[move[0]][move[1]] = piece
-                        temp_board[row][col] = None
-                        
-                        temp_game = ChessGame()
-                        temp_game.board = temp_board
-                        temp_game.turn = color
-                        
-                        if not temp_game.is_in_check(color):
-                            return True
-        return False
-
-    def update(self):
-        if self.is_moving:
-            self.move_progress += self.ANIMATION_SPEED
-            if self.move_progress >= SQUARE_SIZE:
-                self.is_moving = False
-                self.move_progress = 0
-                self.update_board()
-                self.turn = "black" if self.turn == "white" else "white"
-                self.check = self.is_in_check(self.turn)
-                if self.check and not self.has_king_escape():
-                    self.checkmate = True
-                    self.show_checkmate_dialog = True
-
-    def draw(self):
-        self.draw_board()
-        
-        # Highlight check first (behind pieces)
-        if self.check and not self.checkmate:
-            king_pos = None
-            for row in range(ROWS):
-                for col in range(COLS):
-                    piece = self.board[row][col]
-                    if piece and piece.startswith(self.turn) and piece.endswith('king'):
-                        king_pos = (row, col)
-                        break
-                if king_pos:
-                    break
-            
-            if king_pos:
-                s = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
-                s.fill(CHECK_COLOR)
-                screen.blit(s, (king_pos[1] * SQUARE_SIZE, king_pos[0] * SQUARE_SIZE))
-        
-        # Draw pieces and animations
-        if self.is_moving:
-            self.draw_pieces()
-            self.animate_move()
-        else:
-            self.draw_pieces()
-        
-        # Draw highlights on top of pieces
-        self.draw_valid_moves()
-        self.draw_selected_tile()
-        
-        # Draw sidebar
-        self.draw_sidebar()
-        
-        if self.show_checkmate_dialog:
-            self.display_checkmate_dialog()
-
-def start_game():
-    game = ChessGame()
-    
-    running = True
-    while running:
-        mouse_pos = pygame.mouse.get_pos()
-        
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                game.handle_click(mouse_pos)
-        
-        game.update()
-        
-        screen.fill(BLACK)
-        game.draw()
-        
-        pygame.display.flip()
-
-if __name__ == "__main__":
+import pygame
+import sys
+import os
+
+from assets import ASSETS, TEXT
+from book import load_book
+from engine import EngineWorker, move_name
+from instrument import PROFILER, watch_rules
+from movelog import MoveLog, move_text
+from rules import Position
+from tablebase import load_tablebases
+from ttable import TranspositionTable
+
+# Initialize Pygame
+pygame.init()
+
+# Constants
+BOARD_SIZE = 800  # Keep the board fully square and large enough
+SIDEBAR_WIDTH = 200  # Reduce sidebar width to make more room for board
+WIDTH, HEIGHT = BOARD_SIZE + SIDEBAR_WIDTH, BOARD_SIZE  # Adjust height to fit
+ROWS, COLS = 8, 8
+SQUARE_SIZE = BOARD_SIZE // COLS  # Ensure square tiles
+
+
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+BUTTON_COLOR = (70, 130, 180)
+TEXT_COLOR = (255, 255, 255)
+BOARD_WHITE = (238, 238, 210)
+BOARD_BLACK = (118, 150, 86)
+HIGHLIGHT_COLOR = (186, 202, 68, 150)
+CHECK_COLOR = (255, 255, 0, 150)
+CHECKMATE_COLOR = (255, 0, 0)
+CASTLING_COLOR = (0, 255, 255, 150)
+SIDEBAR_COLOR = (240, 240, 240)
+CAPTURED_PIECE_SIZE = 40
+FPS_CAP = 60
+# Home screen background, scaled to the window
+LOGO_PATH = 'img/chess_logo.jpg'
+# Posted by the engine thread so an idle event wait wakes up for its reports
+ENGINE_EVENT = pygame.USEREVENT + 1
+# Posted every PROFILE_REFRESH ms while profiling, to redraw the overlay
+PROFILE_EVENT = pygame.USEREVENT + 2
+PROFILE_REFRESH = 500
+PROFILE_KEY = pygame.K_F3
+PROFILE_DUMP_KEY = pygame.K_F4
+MOVE_LIST_KEY = pygame.K_m
+MOVE_LIST_ROW = 20
+
+# Create window
+screen = pygame.display.set_mode((WIDTH, HEIGHT))
+pygame.display.set_caption("Chess Game")
+pygame.display.update()
+
+# Fonts
+font_large = pygame.font.Font(None, 72)
+font_medium = pygame.font.Font(None, 50)
+font_small = pygame.font.Font(None, 36)
+font_tiny = pygame.font.Font(None, 24)
+
+DIALOG_RECT = pygame.Rect(WIDTH//2 - 150, HEIGHT//2 - 100, 300, 300)
+# Sidebar regions, each redrawn on its own when what it shows changes
+WHITE_TOOK_RECT = pygame.Rect(BOARD_SIZE, 0, SIDEBAR_WIDTH, HEIGHT//2)
+BLACK_TOOK_RECT = pygame.Rect(BOARD_SIZE, HEIGHT//2, SIDEBAR_WIDTH, HEIGHT//2 - 160)
+ENGINE_INFO_RECT = pygame.Rect(BOARD_SIZE, HEIGHT - 160, SIDEBAR_WIDTH, 55)
+TURN_RECT = pygame.Rect(BOARD_SIZE, HEIGHT - 105, SIDEBAR_WIDTH, 105)
+# Where the profile overlay or the move list replaces the captured pieces
+PANEL_RECT = WHITE_TOOK_RECT.union(BLACK_TOOK_RECT)
+PROMOTION_RECT = pygame.Rect(WIDTH//2 - 160, HEIGHT//3 - 60, 320, 340)
+
+# Book, tablebases and engine, loaded by the first game that needs them
+RESOURCES = {}
+
+class Button:
+    def __init__(self, text, x, y, width, height, action=None):
+        self.text = text
+        self.rect = pygame.Rect(x, y, width, height)
+        self.action = action
+        self.hover = False
+
+    def draw(self):
+        color = (BUTTON_COLOR[0] + 30, BUTTON_COLOR[1] + 30, BUTTON_COLOR[2] + 30) if self.hover else BUTTON_COLOR
+        pygame.draw.rect(screen, color, self.rect, border_radius=10)
+        pygame.draw.rect(screen, (0, 0, 0), self.rect, 2, border_radius=10)
+        
+        text_surf = TEXT.render(font_medium, self.text, True, TEXT_COLOR)
+        text_rect = text_surf.get_rect(center=self.rect.center)
+        screen.blit(text_surf, text_rect)
+
+    def check_hover(self, pos):
+        self.hover = self.rect.collidepoint(pos)
+
+    def check_click(self, pos):
+        if self.rect.collidepoint(pos) and self.action:
+            self.action()
+
+class FrameScheduler:
+    """Paces a loop: at most ``fps`` frames a second while something is
+    animating, and blocked in ``pygame.event.wait`` while nothing is."""
+
+    def __init__(self, fps=FPS_CAP):
+        self.fps = fps
+        self.clock = pygame.time.Clock()
+
+    def tick(self):
+        return self.clock.tick(self.fps)
+
+    def events(self, busy):
+        if busy:
+            return pygame.event.get()
+        return [pygame.event.wait()] + pygame.event.get()
+
+def load_pieces(size=SQUARE_SIZE, small_size=CAPTURED_PIECE_SIZE):
+    """Piece sprites by name, plus ``small_`` versions for the captured lists.
+
+    Images come from the shared asset cache, so only the first call for a
+    size reads and scales anything.
+    """
+    pieces = {}
+    piece_names = ['king', 'queen', 'rook', 'bishop', 'knight', 'pawn']
+    colors = ['white', 'black']
+    
+    for color in colors:
+        for name in piece_names:
+            path = f'img/{color}-{name}.png'
+            try:
+                pieces[f'{color}_{name}'] = ASSETS.scaled(path, (size, size))
+                # Smaller version for captured pieces display
+                pieces[f'small_{color}_{name}'] = ASSETS.scaled(path, (small_size, small_size))
+            except (pygame.error, OSError):
+                pieces[f'{color}_{name}'] = ASSETS.surface(
+                    ("fallback", color, name, size), lambda: fallback_piece(color, name, size, 5, 5))
+                pieces[f'small_{color}_{name}'] = ASSETS.surface(
+                    ("fallback", color, name, small_size), lambda: fallback_piece(color, name, small_size, 2, 3))
+    
+    return pieces
+
+def fallback_piece(color, name, size, margin, radius):
+    """A simple coloured tile with the piece's initial, for missing images."""
+    surf = pygame.Surface((size, size), pygame.SRCALPHA)
+    col = (255, 255, 255) if color == "white" else (50, 50, 50)
+    pygame.draw.rect(surf, col, (margin, margin, size - 2 * margin, size - 2 * margin), border_radius=radius)
+    text = TEXT.render(font_small, name[0].upper(), True, (255, 0, 0) if color == "white" else (0, 255, 0))
+    surf.blit(text, (size//2 - text.get_width()//2, size//2 - text.get_height()//2))
+    print(f"Could not load image for {color}_{name}, using fallback")
+    return surf
+
+def plain_background():
+    """The home screen background when the logo cannot be loaded."""
+    background = pygame.Surface((WIDTH, HEIGHT))
+    background.fill(BOARD_WHITE)
+    print(f"Could not load {LOGO_PATH}, using a plain background")
+    return background
+
+def render_board_background():
+    """The empty board, drawn once and blitted from then on."""
+    background = pygame.Surface((BOARD_SIZE, BOARD_SIZE))
+    for row in range(ROWS):
+        for col in range(COLS):
+            color = BOARD_WHITE if (row + col) % 2 == 0 else BOARD_BLACK
+            pygame.draw.rect(background, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+    return background
+
+def square_overlay(color):
+    overlay = pygame.Surface((SQUARE_SIZE, SQUARE_SIZE), pygame.SRCALPHA)
+    overlay.fill(color)
+    return overlay
+
+def shared(name, load):
+    """``load()``'s result for ``name``, loaded on the first call and reused after."""
+    if name not in RESOURCES:
+        RESOURCES[name] = load()
+    return RESOURCES[name]
+
+def new_engine():
+    return EngineWorker(time_limit=1.0, notify=lambda: pygame.event.post(pygame.event.Event(ENGINE_EVENT)),
+                        tablebases=shared("tablebases", load_tablebases))
+
+class ChessGame(Position):
+    def __init__(self, computer=None):
+        self.move_cache = TranspositionTable(1 << 12)
+        # Colour the computer plays, or None for two humans
+        self.computer = computer
+        self.show_move_list = False
+        # First move list row drawn, for mapping clicks back to plies
+        self.move_list_top = 0
+        # Endgame tables for the computer, if any were built into tb/
+        self.tablebases = shared("tablebases", load_tablebases) if computer else None
+        self.engine = shared("engine", new_engine) if computer else None
+        # Opening book for the computer, if book.bin is present
+        self.book = shared("book", load_book) if computer else None
+        self.board_background = ASSETS.surface(("board", BOARD_SIZE), render_board_background)
+        self.overlays = {color: ASSETS.surface(("overlay", color, SQUARE_SIZE), lambda color=color: square_overlay(color))
+                         for color in (HIGHLIGHT_COLOR, CASTLING_COLOR, CHECK_COLOR)}
+        self.reset_game()
+        
+    def reset_game(self):
+        if self.engine:
+            self.engine.stop()
+        self.engine_info = None
+        self.pieces = load_pieces()
+        self.reset_position()
+        self.move_log = MoveLog(self)
+        self.selected_piece = None
+        self.selected_pos = None
+        self.valid_moves = []
+        self.is_moving = False
+        self.move_start_pos = None
+        self.move_end_pos = None
+        self.move_progress = 0
+        self.move_started = 0
+        # Pixels per millisecond, so a move takes the same time at any frame rate
+        self.ANIMATION_SPEED = 0.9
+        self.show_checkmate_dialog = False
+        self.invalidate()
+
+    def handle_click(self, pos):
+        if self.is_moving or self.show_checkmate_dialog:
+            return
+        if self.show_move_list and not PROFILER.enabled and PANEL_RECT.collidepoint(pos):
+            self.seek(self.move_list_ply(pos))
+            return
+        if self.turn == self.computer:
+            return
+            
+        # Only handle clicks on the board area
+        if pos[0] >= BOARD_SIZE:
+            return
+
+        col, row = pos[0] // SQUARE_SIZE, pos[1] // SQUARE_SIZE
+        clicked_piece = self.board[row][col]
+        
+        if self.selected_piece:
+            if (row, col) in self.valid_moves:
+                self.start_animation(self.selected_pos, (row, col))
+            self.selected_piece = None
+            self.valid_moves = []
+        else:
+            if clicked_piece and clicked_piece.startswith(self.turn):
+                self.selected_piece = clicked_piece
+                self.selected_pos = (row, col)
+                self.valid_moves = self.legal_moves_from((row, col))
+
+    def draw_sidebar(self):
+        self.draw_white_took()
+        self.draw_black_took()
+        self.draw_engine_info()
+        self.draw_turn_indicator()
+
+    def draw_white_took(self):
+        pygame.draw.rect(screen, SIDEBAR_COLOR, WHITE_TOOK_RECT)
+
+        # Draw captured pieces title
+        captured_title = TEXT.render(font_medium, "Captured:", True, BLACK)
+        screen.blit(captured_title, (BOARD_SIZE + 20, 20))
+        
+        # Draw white captured pieces
+        white_title = TEXT.render(font_small, "White took:", True, BLACK)
+        screen.blit(white_title, (BOARD_SIZE + 20, 70))
+        for i, piece in enumerate(self.black_captured):
+            x = BOARD_SIZE + 20 + (i % 4) * (CAPTURED_PIECE_SIZE + 5)
+            y = 110 + (i // 4) * (CAPTURED_PIECE_SIZE + 5)
+            screen.blit(self.pieces[f'small_{piece}'], (x, y))
+
+    def draw_profile(self):
+        pygame.draw.rect(screen, SIDEBAR_COLOR, PANEL_RECT)
+        title = TEXT.render(font_small, "Profile (F3/F4)", True, BLACK)
+        screen.blit(title, (BOARD_SIZE + 10, 10))
+        y = 45
+        for probe in PROFILER.probes.values():
+            if probe.buckets is not None:
+                p50, p95 = probe.percentile(0.5), probe.percentile(0.95)
+                detail = f"{probe.calls}  p50 {p50:g}  p95 {p95:g} ms" if probe.calls else "-"
+            else:
+                detail = f"{probe.calls}  {probe.total / probe.calls * 1e6:.1f} us" if probe.calls else "-"
+            screen.blit(TEXT.render(font_tiny, probe.name, True, BLACK), (BOARD_SIZE + 10, y))
+            screen.blit(TEXT.render(font_tiny, detail, True, (90, 90, 90)), (BOARD_SIZE + 20, y + 17))
+            y += 40
+
+    def draw_move_list(self):
+        pygame.draw.rect(screen, SIDEBAR_COLOR, PANEL_RECT)
+        title = TEXT.render(font_small, "Moves (M)", True, BLACK)
+        screen.blit(title, (BOARD_SIZE + 10, 10))
+        log = self.move_log
+        # Black's first move goes in the right column when black started
+        offset = log.start_turn == "black"
+        rows = (PANEL_RECT.height - 45) // MOVE_LIST_ROW
+        total = (len(log) + offset + 1) // 2
+        current = (log.cursor - 1 + offset) // 2 if log.cursor else 0
+        # Only the rows in view are drawn, with the current move near the middle
+        top = max(0, min(current - rows // 2, total - rows))
+        self.move_list_top = top
+        for row in range(top, min(total, top + rows)):
+            y = PANEL_RECT.top + 45 + (row - top) * MOVE_LIST_ROW
+            screen.blit(TEXT.render(font_tiny, f"{row + 1}.", True, (90, 90, 90)), (BOARD_SIZE + 10, y))
+            for column in (0, 1):
+                ply = row * 2 + column - offset
+                if 0 <= ply < len(log):
+                    x = BOARD_SIZE + 45 + column * 75
+                    if ply == log.cursor - 1:
+                        pygame.draw.rect(screen, HIGHLIGHT_COLOR[:3], (x - 4, y - 3, 72, MOVE_LIST_ROW))
+                    screen.blit(TEXT.render(font_tiny, move_text(log.entries[ply]), True, BLACK), (x, y))
+
+    def move_list_ply(self, pos):
+        """The ply after the move clicked at ``pos`` in the move list."""
+        offset = self.move_log.start_turn == "black"
+        row = self.move_list_top + (pos[1] - PANEL_RECT.top - 45) // MOVE_LIST_ROW
+        column = 1 if pos[0] >= BOARD_SIZE + 120 else 0
+        return row * 2 + column - offset + 1
+
+    def seek(self, ply):
+        """Show the game after ``ply`` moves; a move played from there drops the later ones."""
+        if self.is_moving:
+            return
+        if self.engine:
+            self.engine.stop()
+        self.move_log.seek(ply)
+        self.selected_piece = None
+        self.selected_pos = None
+        self.valid_moves = []
+        finished = self.checkmate or self.stalemate or self.repetition
+        if finished != self.show_checkmate_dialog:
+            self.show_checkmate_dialog = finished
+            # The board under the dialog has to come back
+            self.invalidate()
+
+    def draw_black_took(self):
+        pygame.draw.rect(screen, SIDEBAR_COLOR, BLACK_TOOK_RECT)
+
+        # Draw black captured pieces
+        black_title = TEXT.render(font_small, "Black took:", True, BLACK)
+        screen.blit(black_title, (BOARD_SIZE + 20, HEIGHT//2 + 20))
+        for i, piece in enumerate(self.white_captured):
+            x = BOARD_SIZE + 20 + (i % 4) * (CAPTURED_PIECE_SIZE + 5)
+            y = HEIGHT//2 + 60 + (i // 4) * (CAPTURED_PIECE_SIZE + 5)
+            screen.blit(self.pieces[f'small_{piece}'], (x, y))
+
+    def draw_engine_info(self):
+        pygame.draw.rect(screen, SIDEBAR_COLOR, ENGINE_INFO_RECT)
+
+        # Draw the computer's latest search report
+        if self.engine_info:
+            info = self.engine_info
+            summary = TEXT.render(font_tiny, f"d{info['depth']} {info['nps'] // 1000}k nps {info['score'] / 100:+.2f}", True, BLACK)
+            screen.blit(summary, (BOARD_SIZE + 20, HEIGHT - 150))
+            pv = TEXT.render(font_tiny, " ".join(move_name(move) for move in info['pv'][:4]), True, BLACK)
+            screen.blit(pv, (BOARD_SIZE + 20, HEIGHT - 128))
+
+    def draw_turn_indicator(self):
+        pygame.draw.rect(screen, SIDEBAR_COLOR, TURN_RECT)
+
+        # Draw current turn indicator
+        turn_text = TEXT.render(font_medium, f"{self.turn.capitalize()}'s turn", True, 
+                                     (0, 0, 0) if self.turn == "white" else (255, 255, 255))
+        turn_bg = (255, 255, 255) if self.turn == "white" else (0, 0, 0)
+        pygame.draw.rect(screen, turn_bg, (BOARD_SIZE + 20, HEIGHT - 100, SIDEBAR_WIDTH - 40, 60))
+        screen.blit(turn_text, (BOARD_SIZE + (SIDEBAR_WIDTH - turn_text.get_width())//2, HEIGHT - 80))
+
+    def square_states(self):
+        """What each square shows: ``(piece, highlight, selected, in_check)`` per square."""
+        highlights = {}
+        for move in self.valid_moves:
+            row, col = move
+            # Check if this is a castling move
+            if (self.selected_piece and self.selected_piece.endswith("king") and 
+                abs(self.selected_pos[1] - col) == 2):
+                highlights[move] = CASTLING_COLOR
+            else:
+                highlights[move] = HIGHLIGHT_COLOR
+        check_pos = self.find_king(self.turn) if self.check and not self.checkmate else None
+
+        states = []
+        for row in range(ROWS):
+            for col in range(COLS):
+                pos = (row, col)
+                piece = self.board[row][col]
+                if self.is_moving and pos == self.move_start_pos:
+                    piece = None
+                states.append((piece, highlights.get(pos), pos == self.selected_pos, pos == check_pos))
+        return states
+
+    def draw_square(self, row, col, state):
+        piece, highlight, selected, in_check = state
+        rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+        screen.blit(self.board_background, rect, rect)
+        # Check highlight goes behind the piece, move highlights on top of it
+        if in_check:
+            screen.blit(self.overlays[CHECK_COLOR], rect)
+        if piece:
+            screen.blit(self.pieces[piece], rect)
+        if highlight:
+            screen.blit(self.overlays[highlight], rect)
+        if selected:
+            pygame.draw.rect(screen, (0, 255, 0), rect, 4)
+        return rect
+
+    def moving_piece_rect(self):
+        row1, col1 = self.move_start_pos
+        row2, col2 = self.move_end_pos
+        move_x = (col2 - col1) * self.move_progress
+        move_y = (row2 - row1) * self.move_progress
+        return pygame.Rect(col1 * SQUARE_SIZE + move_x, row1 * SQUARE_SIZE + move_y, SQUARE_SIZE, SQUARE_SIZE)
+
+    def animate_move(self):
+        row1, col1 = self.move_start_pos
+        piece = self.board[row1][col1]
+        screen.blit(self.pieces[piece], self.moving_piece_rect())
+
+    def start_animation(self, start_pos, end_pos):
+        self.move_start_pos = start_pos
+        self.move_end_pos = end_pos
+        self.is_moving = True
+        self.move_progress = 0
+        self.move_started = pygame.time.get_ticks()
+
+    def update(self):
+        if self.is_moving:
+            elapsed = pygame.time.get_ticks() - self.move_started
+            self.move_progress = min(SQUARE_SIZE, int(elapsed * self.ANIMATION_SPEED))
+            if self.move_progress >= SQUARE_SIZE:
+                self.is_moving = False
+                self.move_progress = 0
+                self.move_log.play(self.move_start_pos, self.move_end_pos)
+                if self.checkmate or self.stalemate or self.repetition:
+                    self.show_checkmate_dialog = True
+        # After the animation, so the computer starts on its turn straight away
+        if self.engine:
+            self.update_engine()
+
+    def update_engine(self):
+        """Start the computer thinking on its turn and play its move when it is ready."""
+        for kind, value in self.engine.poll():
+            if kind == "info":
+                self.engine_info = value
+            elif kind == "bestmove" and value:
+                self.start_animation(*value)
+        # Not while looking back through the game, which would cut it off there
+        if (self.turn == self.computer and not self.is_moving and self.move_log.cursor == len(self.move_log) and
+                not self.show_checkmate_dialog and not self.engine.busy()):
+            move = self.book.choose(self) if self.book else None
+            found = not move and self.tablebases and self.tablebases.best_move(self)
+            if found:
+                move = found[0]
+            if move:
+                self.start_animation(*move)
+            else:
+                self.engine.start(self)
+
+    def invalidate(self):
+        """Make the next ``render`` redraw the whole window."""
+        self.drawn_squares = [None] * (ROWS * COLS)
+        self.drawn_sidebar = {}
+        self.drawn_moving_rect = None
+
+    def draw(self):
+        self.invalidate()
+        self.render()
+
+    def render(self):
+        """Redraw only what changed since the last call; return the screen rects touched."""
+        dirty = []
+        # A square is redrawn when what it shows changes or the moving
+        # piece passes over it, in this frame or the last
+        moving_rect = self.moving_piece_rect() if self.is_moving else None
+        passed = [rect for rect in (self.drawn_moving_rect, moving_rect) if rect]
+        for index, state in enumerate(self.square_states()):
+            row, col = divmod(index, COLS)
+            rect = pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+            if state != self.drawn_squares[index] or rect.collidelist(passed) != -1:
+                dirty.append(self.draw_square(row, col, state))
+                self.drawn_squares[index] = state
+        if moving_rect:
+            self.animate_move()
+        self.drawn_moving_rect = moving_rect
+
+        if PROFILER.enabled:
+            # The profile overlay takes the place of the captured pieces
+            regions = [(PANEL_RECT, self.draw_profile, pygame.time.get_ticks() // PROFILE_REFRESH)]
+        elif self.show_move_list:
+            regions = [(PANEL_RECT, self.draw_move_list, (self.move_log.version, self.move_log.cursor))]
+        else:
+            regions = [(WHITE_TOOK_RECT, self.draw_white_took, tuple(self.black_captured)),
+                       (BLACK_TOOK_RECT, self.draw_black_took, tuple(self.white_captured))]
+        regions += [
+            (ENGINE_INFO_RECT, self.draw_engine_info, self.engine_info),
+            (TURN_RECT, self.draw_turn_indicator, self.turn),
+        ]
+        for rect, draw_region, state in regions:
+            if rect.topleft not in self.drawn_sidebar or self.drawn_sidebar[rect.topleft] != state:
+                # Clip so wide text cannot spill onto squares drawn separately
+                screen.set_clip(rect)
+                draw_region()
+                screen.set_clip(None)
+                self.drawn_sidebar[rect.topleft] = state
+                dirty.append(rect)
+        return dirty
+
+# Counted and timed only while the profile overlay is on
+watch_rules()
+PROFILER.watch(pygame.image, "load", "sprite loads")
+PROFILER.watch(sys.modules[__name__], "load_pieces")
+for method in ("update", "draw", "render"):
+    PROFILER.watch(ChessGame, method, f"ChessGame.{method}", histogram=True)
+
+def toggle_profile():
+    """Switch profiling and its sidebar overlay on or off."""
+    PROFILER.toggle()
+    pygame.time.set_timer(PROFILE_EVENT, PROFILE_REFRESH if PROFILER.enabled else 0)
+
+def dump_profile(stem="profile"):
+    PROFILER.dump_json(f"{stem}.json")
+    PROFILER.dump_csv(f"{stem}.csv")
+    print(f"Profile written to {stem}.json and {stem}.csv")
+
+class Scene:
+    """One screen of the app.  ``SceneManager`` runs the scene on top of its
+    stack: ``update`` and ``render`` once a frame, ``handle`` per event."""
+    manager = None
+
+    def enter(self):
+        """Called whenever the scene comes to the top; it must redraw in full."""
+
+    def leave(self):
+        """Called when the scene is popped for good."""
+
+    def busy(self):
+        """True while something moves on its own, so frames must keep coming."""
+        return False
+
+    def update(self):
+        pass
+
+    def render(self):
+        """Draw what changed; return the screen rects touched."""
+        return []
+
+    def handle(self, event):
+        pass
+
+class SceneManager:
+    """A stack of scenes driven by one loop.
+
+    Screens replace each other by pushing and popping scenes instead of
+    calling each other's loops, so the call stack stays one loop deep and a
+    finished game is let go however many are played.
+    """
+
+    def __init__(self, fps=FPS_CAP):
+        self.scheduler = FrameScheduler(fps)
+        self.stack = []
+        # Set when the top scene changed, so the new one is entered before it draws
+        self.changed = False
+
+    def push(self, scene):
+        scene.manager = self
+        self.stack.append(scene)
+        self.changed = True
+
+    def pop(self, count=1):
+        for _ in range(min(count, len(self.stack))):
+            self.stack.pop().leave()
+        self.changed = True
+
+    def clear(self):
+        self.pop(len(self.stack))
+
+    def run(self, *scenes):
+        for scene in scenes:
+            self.push(scene)
+        while self.stack:
+            if self.changed:
+                self.changed = False
+                self.stack[-1].enter()
+            scene = self.stack[-1]
+            scene.update()
+            # update() may push a scene, which draws from the next frame on
+            if self.changed:
+                continue
+            dirty = scene.render()
+            if dirty:
+                pygame.display.update(dirty)
+            self.scheduler.tick()
+
+            for event in self.scheduler.events(busy=scene.busy()):
+                if event.type == pygame.QUIT:
+                    self.clear()
+                if not self.stack:
+                    break
+                self.stack[-1].handle(event)
+        pygame.quit()
+
+class HomeScene(Scene):
+    def __init__(self):
+        self.title_text = TEXT.render(font_large, "CHESS", True, (0, 0, 0))
+        self.title_rect = self.title_text.get_rect(center=(WIDTH//2, HEIGHT//3))
+        # Loaded and scaled once per process; a plain light fill without the logo
+        try:
+            self.background = ASSETS.scaled(LOGO_PATH, (WIDTH, HEIGHT), alpha=False)
+        except (pygame.error, OSError):
+            self.background = ASSETS.surface(("fallback", "logo", WIDTH, HEIGHT), plain_background)
+        self.buttons = [
+            Button("Start Game", WIDTH//2 - 100, HEIGHT//2, 200, 60, lambda: self.manager.push(GameScene())),
+            Button("vs Computer", WIDTH//2 - 120, HEIGHT//2 + 80, 240, 60,
+                   lambda: self.manager.push(GameScene(computer="black"))),
+            Button("Quit", WIDTH//2 - 100, HEIGHT//2 + 160, 200, 60, lambda: self.manager.clear()),
+        ]
+        self.drawn_hover = None
+
+    def enter(self):
+        self.drawn_hover = None
+
+    def render(self):
+        # Nothing on this screen moves, so only a change of hover redraws it
+        mouse_pos = pygame.mouse.get_pos()
+        for button in self.buttons:
+            button.check_hover(mouse_pos)
+        hover = tuple(button.hover for button in self.buttons)
+        if hover == self.drawn_hover:
+            return []
+        self.drawn_hover = hover
+        screen.blit(self.background, (0, 0))
+        screen.blit(self.title_text, self.title_rect)
+        for button in self.buttons:
+            button.draw()
+        return [screen.get_rect()]
+
+    def handle(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            for button in self.buttons:
+                button.check_click(event.pos)
+
+class GameScene(Scene):
+    def __init__(self, computer=None):
+        self.game = ChessGame(computer)
+
+    def enter(self):
+        self.game.invalidate()
+
+    def leave(self):
+        # The engine is shared with later games, so it must not keep thinking about this one
+        if self.game.engine:
+            self.game.engine.stop()
+
+    def busy(self):
+        return self.game.is_moving
+
+    def update(self):
+        self.game.update()
+        if self.game.show_checkmate_dialog:
+            self.manager.push(DialogScene(self.game))
+
+    def render(self):
+        return self.game.render()
+
+    def handle(self, event):
+        game = self.game
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            game.handle_click(event.pos)
+        elif event.type == pygame.KEYDOWN:
+            if event.key == PROFILE_KEY:
+                toggle_profile()
+                game.invalidate()
+            elif event.key == PROFILE_DUMP_KEY:
+                dump_profile()
+            elif event.key == MOVE_LIST_KEY:
+                game.show_move_list = not game.show_move_list
+                game.invalidate()
+            elif event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                game.seek(game.move_log.cursor + (1 if event.key == pygame.K_RIGHT else -1))
+            elif event.key in (pygame.K_HOME, pygame.K_END):
+                game.seek(0 if event.key == pygame.K_HOME else len(game.move_log))
+
+class DialogScene(Scene):
+    """The end of game dialog, drawn over the final position."""
+
+    def __init__(self, game):
+        self.game = game
+        self.new_game_button = Button("New Game", WIDTH//2 - 100, HEIGHT//2 + 50, 200, 60, self.new_game)
+        self.quit_button = Button("Quit", WIDTH//2 - 100, HEIGHT//2 + 130, 200, 60, self.quit)
+        self.drawn_hover = None
+
+    def new_game(self):
+        self.game.reset_game()
+        self.manager.pop()
+
+    def quit(self):
+        # Back to the home screen under the game
+        self.manager.pop(2)
+
+    def enter(self):
+        self.drawn_hover = None
+
+    def render(self):
+        mouse_pos = pygame.mouse.get_pos()
+        self.new_game_button.check_hover(mouse_pos)
+        self.quit_button.check_hover(mouse_pos)
+        hover = (self.new_game_button.hover, self.quit_button.hover)
+        if hover == self.drawn_hover:
+            return []
+        if self.drawn_hover is None:
+            # The final move has not been drawn yet, and the board goes dark behind the dialog
+            self.game.draw()
+            overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+            overlay.fill((0, 0, 0, 180))
+            screen.blit(overlay, (0, 0))
+        self.draw_dialog_box()
+        dirty = [DIALOG_RECT] if self.drawn_hover else [screen.get_rect()]
+        self.drawn_hover = hover
+        return dirty
+
+    def draw_dialog_box(self):
+        game = self.game
+        pygame.draw.rect(screen, WHITE, DIALOG_RECT, border_radius=15)
+
+        if game.checkmate:
+            title = "CHECKMATE!"
+        else:
+            title = "STALEMATE!" if game.stalemate else "REPETITION!"
+        text = TEXT.render(font_large, title, True, CHECKMATE_COLOR)
+        screen.blit(text, (WIDTH//2 - text.get_width()//2, HEIGHT//2 - 70))
+
+        winner = "White" if game.turn == "black" else "Black"
+        winner_text = TEXT.render(font_medium, f"{winner} wins!" if game.checkmate else "Draw!", True, BLACK)
+        screen.blit(winner_text, (WIDTH//2 - winner_text.get_width()//2, HEIGHT//2 - 20))
+
+        self.new_game_button.draw()
+        self.quit_button.draw()
+
+    def handle(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            self.new_game_button.check_click(event.pos)
+            self.quit_button.check_click(event.pos)
+        elif event.type == pygame.KEYDOWN:
+            # Keys go to the game, e.g. to step back through it; the dialog
+            # comes back if the game is still over afterwards
+            scene = self.manager.stack[-2]
+            self.manager.pop()
+            scene.handle(event)
+
+class PromotionScene(Scene):
+    """Asks which piece a pawn promotes to, over the board.
+
+    ``choose`` is called with the piece picked, e.g. ``"white_queen"``.  The
+    house rules have no promotion, so no game pushes this scene yet.
+    """
+    PIECES = ("queen", "rook", "bishop", "knight")
+
+    def __init__(self, color, choose):
+        self.color = color
+        self.choose = choose
+        self.buttons = [(pygame.Rect(WIDTH//2 - 100, HEIGHT//3 + i * 70, 200, 50), piece)
+                        for i, piece in enumerate(self.PIECES)]
+        self.drawn = False
+
+    def enter(self):
+        self.drawn = False
+
+    def render(self):
+        if self.drawn:
+            return []
+        self.drawn = True
+        pygame.draw.rect(screen, SIDEBAR_COLOR, PROMOTION_RECT, border_radius=15)
+        prompt_text = TEXT.render(font_medium, f"Promote {self.color} pawn to:", True, (0, 0, 0))
+        screen.blit(prompt_text, (WIDTH//2 - prompt_text.get_width()//2, HEIGHT//3 - 50))
+        for button_rect, piece in self.buttons:
+            pygame.draw.rect(screen, (255, 255, 255), button_rect)
+            pygame.draw.rect(screen, (0, 0, 0), button_rect, 2)
+            text_surf = TEXT.render(font_medium, piece.capitalize(), True, (0, 0, 0))
+            screen.blit(text_surf, text_surf.get_rect(center=button_rect.center))
+        return [PROMOTION_RECT]
+
+    def handle(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            for button_rect, piece in self.buttons:
+                if button_rect.collidepoint(event.pos):
+                    self.manager.pop()
+                    self.choose(f"{self.color}_{piece}")
+                    return
+
+def home_screen(fps=FPS_CAP):
+    SceneManager(fps).run(HomeScene())
+
+def start_game(computer=None, fps=FPS_CAP):
+    # Home stays underneath, for the dialog's Quit button
+    SceneManager(fps).run(HomeScene(), GameScene(computer))
+
+if __name__ == "__main__":
     home_screen()
\ No newline at end of file
@@ -0,0 +1,232 @@
+"""Compact move history with takeback, redo and seeking to any ply.
+
+Each move is one 32-bit ``array("I")`` entry holding everything
+``Position.unmake_move`` needs:
+
+    bits  0-5   from square        bits 12-16  moving piece code
+    bits  6-11  to square          bits 17-21  captured piece code (0: none)
+    bits 22-27  castling flags before the move, in ``CASTLING_FLAGS`` order
+
+A castling rook move follows from the king moving two files, so it needs
+no bits.  The house rules have no promotion, so no field is spent on one;
+bits 28-31 are free for it.  Next to the entries an ``array("Q")`` keeps
+the key before each move, which is what ``Position.history`` holds for
+repetitions.
+
+Takeback and redo are a single ``unmake_move`` / ``make_move``.  Every
+``SNAPSHOT_INTERVAL`` plies the board is saved, so ``seek`` reaches a
+distant ply by rebuilding from the nearest snapshot at or before it and
+stepping forward, whichever of that and stepping from the current ply is
+shorter.
+
+Usage:
+    python movelog.py --plies 400
+"""
+
+import argparse
+import random
+import sys
+import time
+from array import array
+
+from rules import Position, CASTLING_FLAGS, COLOR_MASK, KING, ROOK, TYPE_MASK, SQUARE_POS, opponent, square_name
+
+SNAPSHOT_INTERVAL = 32
+# A rebuild from a snapshot costs about as much as this many steps
+SNAPSHOT_COST = 4
+PIECE_LETTERS = ("", "", "N", "B", "R", "Q", "K")
+
+
+def pack(undo):
+    """The log entry for the undo record ``make_move`` returned."""
+    start, end, piece, target, flags, _ = undo
+    bits = 0
+    for index, flag in enumerate(flags):
+        if flag:
+            bits |= 1 << index
+    return start | end << 6 | piece << 12 | target << 17 | bits << 22
+
+
+def unpack(entry):
+    """The ``make_move`` undo record a log entry was packed from."""
+    start, end, piece, target = entry & 63, entry >> 6 & 63, entry >> 12 & 31, entry >> 17 & 31
+    flags = tuple(bool(entry >> 22 + index & 1) for index in range(len(CASTLING_FLAGS)))
+    rook = None
+    if piece & TYPE_MASK == KING and abs((start & 7) - (end & 7)) == 2:
+        back_row = start & 56
+        # (from, to, rook code, what the rook's square held): always empty
+        if end & 7 == 6:
+            rook = (back_row + 7, back_row + 5, piece & COLOR_MASK | ROOK, 0)
+        else:
+            rook = (back_row, back_row + 3, piece & COLOR_MASK | ROOK, 0)
+    return start, end, piece, target, flags, rook
+
+
+def move_text(entry):
+    """Long algebraic text for a log entry, e.g. ``Ng1-f3``, ``e4xd5`` or ``O-O``."""
+    start, end, piece, target = entry & 63, entry >> 6 & 63, entry >> 12 & 31, entry >> 17 & 31
+    if piece & TYPE_MASK == KING and abs((start & 7) - (end & 7)) == 2:
+        return "O-O" if end & 7 == 6 else "O-O-O"
+    return (PIECE_LETTERS[piece & TYPE_MASK] + square_name(SQUARE_POS[start]) + ("x" if target else "-") +
+            square_name(SQUARE_POS[end]))
+
+
+class MoveLog:
+    """The moves played from ``position``'s current state, kept in step with it."""
+
+    def __init__(self, position):
+        self.position = position
+        self.entries = array("I")
+        self.keys = array("Q")
+        # Number of entries currently played on the position
+        self.cursor = 0
+        # Bumped whenever the entries change, for redraws
+        self.version = 0
+        self.start_turn = position.turn
+        self.start_history = position.history[:]
+        # snapshots[i]: the position at ply i * SNAPSHOT_INTERVAL
+        self.snapshots = [self._snapshot()]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _snapshot(self):
+        position = self.position
+        return (bytes(position.squares), position.castling_flags(),
+                tuple(position.white_captured), tuple(position.black_captured))
+
+    def _restore(self, index):
+        squares, flags, white_captured, black_captured = self.snapshots[index]
+        ply = index * SNAPSHOT_INTERVAL
+        position = self.position
+        position.squares = bytearray(squares)
+        for name, flag in zip(CASTLING_FLAGS, flags):
+            setattr(position, name, flag)
+        position.white_captured = list(white_captured)
+        position.black_captured = list(black_captured)
+        position.turn = self.start_turn if ply % 2 == 0 else opponent(self.start_turn)
+        position.history = self.start_history + self.keys[:ply].tolist()
+        position.build_indexes()
+        self.cursor = ply
+
+    def play(self, start_pos, end_pos):
+        """Play a move at the cursor, dropping any moves that were taken back."""
+        if self.cursor < len(self.entries):
+            del self.entries[self.cursor:]
+            del self.keys[self.cursor:]
+            del self.snapshots[self.cursor // SNAPSHOT_INTERVAL + 1:]
+        position = self.position
+        self.keys.append(position.key)
+        self.entries.append(pack(position.make_move(start_pos, end_pos)))
+        self.cursor += 1
+        self.version += 1
+        if self.cursor % SNAPSHOT_INTERVAL == 0:
+            self.snapshots.append(self._snapshot())
+        position.update_status()
+
+    def _back(self):
+        self.cursor -= 1
+        self.position.unmake_move(unpack(self.entries[self.cursor]))
+
+    def _forward(self):
+        entry = self.entries[self.cursor]
+        self.position.make_move(SQUARE_POS[entry & 63], SQUARE_POS[entry >> 6 & 63])
+        self.cursor += 1
+
+    def undo(self):
+        """Take back one move; False if there is none."""
+        if not self.cursor:
+            return False
+        self._back()
+        self.position.update_status()
+        return True
+
+    def redo(self):
+        """Replay the next taken-back move; False if there is none."""
+        if self.cursor == len(self.entries):
+            return False
+        self._forward()
+        self.position.update_status()
+        return True
+
+    def seek(self, ply):
+        """Put the position at ``ply`` moves from the start of the log."""
+        ply = max(0, min(ply, len(self.entries)))
+        if ply == self.cursor:
+            return
+        index = ply // SNAPSHOT_INTERVAL
+        if ply - index * SNAPSHOT_INTERVAL + SNAPSHOT_COST < abs(ply - self.cursor):
+            self._restore(index)
+        while self.cursor < ply:
+            self._forward()
+        while self.cursor > ply:
+            self._back()
+        self.position.update_status()
+
+    def moves(self):
+        """The logged moves as ``(start_pos, end_pos)`` pairs."""
+        return [(SQUARE_POS[entry & 63], SQUARE_POS[entry >> 6 & 63]) for entry in self.entries]
+
+    def nbytes(self):
+        """Bytes held by the entry and key arrays."""
+        return len(self.entries) * self.entries.itemsize + len(self.keys) * self.keys.itemsize
+
+
+def _random_log(plies, seed):
+    # A log of random legal moves, restarting a game that ends early
+    rng = random.Random(seed)
+    while True:
+        log = MoveLog(Position())
+        while len(log) < plies:
+            moves = log.position.legal_moves()
+            if not moves or log.position.repetition:
+                break
+            log.play(*rng.choice(moves))
+        if len(log) == plies:
+            return log
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time takeback, redo and seeking on a random game.")
+    parser.add_argument("--plies", type=int, default=400)
+    parser.add_argument("--seeks", type=int, default=1000, help="random plies to jump to")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    log = _random_log(args.plies, args.seed)
+    moves = log.moves()
+    print(f"{len(log)} plies in {log.nbytes()} bytes ({log.nbytes() / len(log):.0f} per move), "
+          f"{len(log.snapshots)} snapshots")
+
+    start = time.perf_counter()
+    while log.undo():
+        pass
+    undo_time = time.perf_counter() - start
+    start = time.perf_counter()
+    while log.redo():
+        pass
+    redo_time = time.perf_counter() - start
+    print(f"undo: {undo_time / len(log) * 1e6:.1f} us/move, redo: {redo_time / len(log) * 1e6:.1f} us/move")
+
+    rng = random.Random(args.seed)
+    targets = [rng.randrange(len(log) + 1) for _ in range(args.seeks)]
+    start = time.perf_counter()
+    for ply in targets:
+        log.seek(ply)
+    seek_time = time.perf_counter() - start
+
+    # What seeking cost before: replaying from the initial position
+    start = time.perf_counter()
+    for ply in targets[:max(1, args.seeks // 10)]:
+        position = Position()
+        for move in moves[:ply]:
+            position.make_move(*move)
+        position.update_status()
+    replay_time = (time.perf_counter() - start) / max(1, args.seeks // 10)
+    print(f"seek: {seek_time / args.seeks * 1e6:.0f} us, replay from the start: {replay_time * 1e6:.0f} us, "
+          f"{replay_time * args.seeks / seek_time:.0f}x faster")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""SAN moves and PGN games on top of ``rules.Position``.
+
+``read_pgn`` streams games out of a PGN file one at a time and keeps only
+the game being read, so archives of any size replay in constant memory.
+``replay`` plays a game's SAN moves through the normal move rules.
+
+The rules have no en passant and no promotion, so games using either stop
+replaying at that move with a ``ValueError``; ``main`` counts them
+separately from the games that replay in full.
+
+Usage:
+    python notation.py games.pgn
+    python notation.py games.pgn --limit 1000
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from rules import Position, START_FEN, COLOR_BITS, KING, PAWN, SQUARE_POS, TYPE_MASK, square_name
+
+SAN_PIECES = {'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': KING}
+PIECE_LETTERS = {code: letter for letter, code in SAN_PIECES.items()}
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?(x)?([a-h][1-8])(=?[NBRQ])?[+#]?[!?]*$")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+HEADER_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+
+
+def parse_square(name):
+    return 8 - int(name[1]), ord(name[0]) - ord('a')
+
+
+def parse_san(position, san):
+    """The ``(start_pos, end_pos)`` legal move ``san`` names in ``position``."""
+    squares = position.squares
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        end_col = 6 if len(text) == 3 else 2
+        for start, end in position.legal_moves():
+            if squares[start[0] * 8 + start[1]] & TYPE_MASK == KING and start[1] == 4 and end[1] == end_col:
+                return start, end
+        raise ValueError(f"Illegal move {san!r}")
+
+    match = SAN_PATTERN.match(san)
+    if not match:
+        raise ValueError(f"Invalid SAN {san!r}")
+    letter, from_file, from_rank, capture, target, promotion = match.groups()
+    if promotion:
+        raise ValueError(f"Promotion is not supported: {san!r}")
+    piece_type = SAN_PIECES[letter] if letter else PAWN
+    end = parse_square(target)
+    end_sq = end[0] * 8 + end[1]
+    color = COLOR_BITS[position.turn]
+    # The text says whether the move captures; the board has to agree.
+    # With no en passant, a capture always lands on an enemy piece
+    if squares[end_sq] & color or bool(capture) != (squares[end_sq] != 0):
+        raise ValueError(f"Illegal move {san!r}")
+    if capture and piece_type == PAWN and not from_file:
+        raise ValueError(f"Invalid SAN {san!r}")
+    # Look back from the target square instead of generating every move
+    found = []
+    for sq in position.attackers(end_sq, color, occupied=bool(capture)):
+        start = SQUARE_POS[sq]
+        if (squares[sq] & TYPE_MASK == piece_type
+                and (not from_file or start[1] == ord(from_file) - ord('a'))
+                and (not from_rank or start[0] == 8 - int(from_rank))
+                and not position.would_be_in_check(start, end)):
+            found.append((start, end))
+    if len(found) != 1:
+        raise ValueError(f"{'Ambiguous' if found else 'Illegal'} move {san!r}")
+    return found[0]
+
+
+def move_to_san(position, move, moves=None):
+    """SAN for the legal ``move`` in ``position``, check and mate marks included."""
+    moves = position.legal_moves() if moves is None else moves
+    start, end = move
+    squares = position.squares
+    piece_type = squares[start[0] * 8 + start[1]] & TYPE_MASK
+    capture = squares[end[0] * 8 + end[1]] != 0
+    if piece_type == KING and abs(start[1] - end[1]) == 2:
+        san = "O-O" if end[1] == 6 else "O-O-O"
+    elif piece_type == PAWN:
+        san = (square_name(start)[0] + "x" if capture else "") + square_name(end)
+    else:
+        rivals = [other for other, to in moves
+                  if to == end and other != start and squares[other[0] * 8 + other[1]] & TYPE_MASK == piece_type]
+        prefix = ""
+        if rivals:
+            if all(other[1] != start[1] for other in rivals):
+                prefix = square_name(start)[0]
+            elif all(other[0] != start[0] for other in rivals):
+                prefix = square_name(start)[1]
+            else:
+                prefix = square_name(start)
+        san = PIECE_LETTERS[piece_type] + prefix + ("x" if capture else "") + square_name(end)
+
+    undo = position.make_move(start, end)
+    replies, in_check = position.generate_legal_moves()
+    position.unmake_move(undo)
+    if in_check:
+        san += "+" if replies else "#"
+    return san
+
+
+class PgnGame:
+    def __init__(self, headers, moves, result):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+
+    def start_position(self):
+        return Position(self.headers.get("FEN", START_FEN))
+
+
+def _tokens(line, state):
+    """Movetext tokens of one line; ``state`` carries open comments and variations."""
+    tokens = []
+    token = ""
+    for char in line:
+        if state["comment"]:
+            if char == "}":
+                state["comment"] = False
+            continue
+        if char == "{":
+            state["comment"] = True
+        elif char == "(":
+            state["variation"] += 1
+        elif char == ")":
+            state["variation"] = max(state["variation"] - 1, 0)
+        elif char == ";":
+            break
+        elif state["variation"]:
+            continue
+        elif char.isspace():
+            if token:
+                tokens.append(token)
+            token = ""
+            continue
+        else:
+            token += char
+            continue
+        if token:
+            tokens.append(token)
+        token = ""
+    if token and not state["comment"] and not state["variation"]:
+        tokens.append(token)
+    return tokens
+
+
+def read_pgn(stream):
+    """Yield a ``PgnGame`` for each game in a text stream, one at a time."""
+    headers = {}
+    moves = []
+    state = {"comment": False, "variation": 0}
+    for line in stream:
+        if not state["comment"] and not state["variation"]:
+            stripped = line.strip()
+            if stripped.startswith("%"):
+                continue
+            header = HEADER_PATTERN.match(stripped)
+            if header:
+                if moves:
+                    # A new tag section without a result token ends the last game
+                    yield PgnGame(headers, moves, headers.get("Result", "*"))
+                    headers, moves = {}, []
+                headers[header.group(1)] = header.group(2)
+                continue
+        for token in _tokens(line, state):
+            if token in RESULTS:
+                yield PgnGame(headers, moves, token)
+                headers, moves = {}, []
+                continue
+            token = MOVE_NUMBER.sub("", token)
+            if token and not token.startswith("$"):
+                moves.append(token)
+    if moves or headers:
+        yield PgnGame(headers, moves, headers.get("Result", "*"))
+
+
+def replay(game, position=None):
+    """Play ``game`` from its start position; return the final position.
+
+    Raises ValueError at the first move the rules cannot play.
+    """
+    position = position or game.start_position()
+    for ply, san in enumerate(game.moves):
+        try:
+            position.make_move(*parse_san(position, san))
+        except ValueError as error:
+            raise ValueError(f"ply {ply + 1}: {error}") from None
+    position.update_status()
+    return position
+
+
+def format_pgn(moves, headers=None, result="*", position=None):
+    """PGN text for ``(start_pos, end_pos)`` moves played from ``position``."""
+    position = (position or Position()).copy()
+    headers = dict(headers or {})
+    headers.setdefault("Result", result)
+    start_fen = position.to_fen()
+    if start_fen != START_FEN:
+        headers.setdefault("SetUp", "1")
+        headers.setdefault("FEN", start_fen)
+    lines = [f'[{name} "{value}"]' for name, value in headers.items()]
+    lines.append("")
+
+    ply = position.start_ply
+    words = []
+    for move in moves:
+        number = ply // 2 + 1
+        if ply % 2 == 0:
+            words.append(f"{number}.")
+        elif not words:
+            words.append(f"{number}...")
+        words.append(move_to_san(position, move))
+        position.make_move(*move)
+        ply += 1
+    words.append(result)
+
+    line = ""
+    for word in words:
+        if line and len(line) + 1 + len(word) > 79:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the games of a PGN file and report throughput.")
+    parser.add_argument("pgn", help="PGN file to read ('-' for standard input)")
+    parser.add_argument("--limit", type=int, help="stop after this many games")
+    args = parser.parse_args(argv)
+
+    stream = sys.stdin if args.pgn == "-" else open(args.pgn, encoding="utf-8", errors="replace")
+    games = moves = failed = 0
+    start = time.perf_counter()
+    try:
+        for game in read_pgn(stream):
+            games += 1
+            try:
+                replay(game)
+                moves += len(game.moves)
+            except ValueError as error:
+                failed += 1
+                print(f"game {games}: {error}", file=sys.stderr)
+            if args.limit and games >= args.limit:
+                break
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    seconds = time.perf_counter() - start
+    rate = (lambda count: f"{count / seconds:.0f}") if seconds > 0 else (lambda count: "-")
+    print(f"games: {games} ({failed} stopped early)")
+    print(f"moves: {moves}")
+    print(f"time: {seconds:.3f}s")
+    print(f"games/sec: {rate(games)}")
+    print(f"moves/sec: {rate(moves)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
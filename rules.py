@@ -0,0 +1,815 @@
+"""Chess rules with no pygame dependency.
+
+The board is a flat ``bytearray`` of 64 small integer piece codes, indexed
+``row * 8 + col`` with row 0 being black's back rank and row 7 white's.  The
+low three bits of a code give the piece type and one of two colour bits gives
+the colour, so both are read with a single bit test; 0 is an empty square.
+
+The public API keeps the GUI's conventions: squares are ``(row, col)``
+tuples and pieces are names such as ``"white_knight"``.  ``Position.board``
+translates the codes back to names, so ``position.board[row][col]`` still
+works wherever the old list-of-lists board was used.
+
+``Position.key`` is a 64-bit Zobrist key of the pieces, side to move and
+castling flags, updated with every board change.  The rules have no en
+passant, so there is no en passant term.
+"""
+
+import random
+
+ROWS, COLS = 8, 8
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+TYPE_MASK = 7
+WHITE, BLACK = 8, 16
+COLOR_MASK = WHITE | BLACK
+COLOR_BITS = {"white": WHITE, "black": BLACK}
+COLOR_NAMES = {WHITE: "white", BLACK: "black"}
+
+PIECE_TYPES = ("pawn", "knight", "bishop", "rook", "queen", "king")
+# Piece name -> code, and code -> piece name (None for empty or unused codes)
+PIECE_CODES = {f"{color}_{piece_type}": bit | index + 1
+               for color, bit in COLOR_BITS.items()
+               for index, piece_type in enumerate(PIECE_TYPES)}
+PIECE_NAMES = [None] * 32
+for _name, _code in PIECE_CODES.items():
+    PIECE_NAMES[_code] = _name
+
+FEN_PIECES = {'p': PAWN, 'n': KNIGHT, 'b': BISHOP, 'r': ROOK, 'q': QUEEN, 'k': KING}
+
+KNIGHT_OFFSETS = [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)]
+KING_OFFSETS = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)]
+ROOK_DIRECTIONS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+BISHOP_DIRECTIONS = [(1, 1), (-1, -1), (1, -1), (-1, 1)]
+
+CASTLING_FLAGS = (
+    "white_king_moved", "white_rook_left_moved", "white_rook_right_moved",
+    "black_king_moved", "black_rook_left_moved", "black_rook_right_moved",
+)
+
+# Zobrist keys come from a fixed seed so every process agrees on them
+_zobrist = random.Random(20240601)
+ZOBRIST_PIECES = [[_zobrist.getrandbits(64) for _ in range(64)] for _ in range(32)]
+ZOBRIST_BLACK = _zobrist.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist.getrandbits(64) for _ in CASTLING_FLAGS]
+
+# (row, col) tuple for each square index
+SQUARE_POS = [divmod(sq, 8) for sq in range(64)]
+
+
+def _offset_targets(offsets):
+    table = []
+    for row, col in SQUARE_POS:
+        table.append([(row + dr) * 8 + col + dc for dr, dc in offsets
+                      if 0 <= row + dr < 8 and 0 <= col + dc < 8])
+    return table
+
+
+def _rays(directions):
+    table = []
+    for row, col in SQUARE_POS:
+        rays = []
+        for dr, dc in directions:
+            ray = []
+            r, c = row + dr, col + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                ray.append(r * 8 + c)
+                r += dr
+                c += dc
+            rays.append(ray)
+        table.append(rays)
+    return table
+
+
+KNIGHT_TARGETS = _offset_targets(KNIGHT_OFFSETS)
+KING_TARGETS = _offset_targets(KING_OFFSETS)
+# Four rook rays then four bishop rays, nearest square first
+QUEEN_RAYS = _rays(ROOK_DIRECTIONS + BISHOP_DIRECTIONS)
+SLIDER_RAYS = {
+    ROOK: [rays[:4] for rays in QUEEN_RAYS],
+    BISHOP: [rays[4:] for rays in QUEEN_RAYS],
+    QUEEN: QUEEN_RAYS,
+}
+# White pawns move towards row 0, black pawns towards row 7
+PAWN_STEP = {WHITE: -8, BLACK: 8}
+PAWN_START_ROW = {WHITE: 6, BLACK: 1}
+PAWN_CAPTURES = {WHITE: _offset_targets([(-1, -1), (-1, 1)]), BLACK: _offset_targets([(1, -1), (1, 1)])}
+
+
+def initialize_board():
+    return [
+        ["black_rook", "black_knight", "black_bishop", "black_queen", "black_king", "black_bishop", "black_knight", "black_rook"],
+        ["black_pawn"] * 8,
+        [None] * 8,
+        [None] * 8,
+        [None] * 8,
+        [None] * 8,
+        ["white_pawn"] * 8,
+        ["white_rook", "white_knight", "white_bishop", "white_queen", "white_king", "white_bishop", "white_knight", "white_rook"]
+    ]
+
+
+def encode_board(board):
+    """Pack a list-of-lists board of piece names into 64 piece codes."""
+    return bytearray(PIECE_CODES[piece] if piece else 0 for row in board for piece in row)
+
+
+def castling_key(flags):
+    """Zobrist term for a tuple of the six ``CASTLING_FLAGS`` values."""
+    key = 0
+    for flag, flag_key in zip(flags, ZOBRIST_CASTLING):
+        if flag:
+            key ^= flag_key
+    return key
+
+
+def opponent(color):
+    return "black" if color == "white" else "white"
+
+
+def square_name(pos):
+    """Algebraic name of a ``(row, col)`` square, e.g. ``(6, 4)`` -> ``"e2"``."""
+    return "abcdefgh"[pos[1]] + str(ROWS - pos[0])
+
+
+class BoardRow:
+    def __init__(self, position, row):
+        self.position = position
+        self.row = row
+
+    def __getitem__(self, col):
+        if not 0 <= col < COLS:
+            raise IndexError(col)
+        return PIECE_NAMES[self.position.squares[self.row * 8 + col]]
+
+    def __setitem__(self, col, piece):
+        self.position.set_squares([(self.row * 8 + col, PIECE_CODES[piece] if piece else 0)])
+
+    def __len__(self):
+        return COLS
+
+
+class BoardView:
+    """``board[row][col]`` access to a position's squares by piece name."""
+
+    def __init__(self, position):
+        self.position = position
+
+    def __getitem__(self, row):
+        if not 0 <= row < ROWS:
+            raise IndexError(row)
+        return BoardRow(self.position, row)
+
+    def __len__(self):
+        return ROWS
+
+    def tolist(self):
+        return [[PIECE_NAMES[code] for code in self.position.squares[row * 8:row * 8 + 8]] for row in range(ROWS)]
+
+
+class Position:
+    """Board, side to move and castling state, plus the move rules.
+
+    Each colour also has two 64-square attack maps, kept up to date by every
+    move.  ``reach_counts`` counts the pieces whose raw moves land on a square
+    (the ``is_square_under_attack`` notion: pawns reach empty squares by
+    pushing).  ``control_counts`` counts ordinary attacks, including attacks
+    on a colour's own pieces, which is what king safety needs.  Both are
+    keyed by colour bit.
+
+    ``piece_squares[code]`` is the set of squares holding that piece and
+    ``king_squares`` gives each colour's king square.
+
+    Change the board through ``make_move`` / ``unmake_move`` or
+    ``set_squares`` so all of these stay in sync.
+
+    ``history`` holds the key before each move made, which is how threefold
+    repetition is found.  Setting ``move_cache`` to a
+    ``ttable.TranspositionTable`` caches legal-move lists by key; the cached
+    lists are shared, so callers must not modify them.
+    """
+
+    move_cache = None
+
+    def __init__(self, fen=None):
+        self.reset_position()
+        if fen:
+            self.load_fen(fen)
+
+    @property
+    def board(self):
+        return BoardView(self)
+
+    def reset_position(self):
+        self.squares = encode_board(initialize_board())
+        self.turn = "white"
+        self.check = False
+        self.checkmate = False
+        self.stalemate = False
+        self.repetition = False
+        self.history = []
+        # Plies played before this position was set up, for FEN move numbers
+        self.start_ply = 0
+        self.white_captured = []
+        self.black_captured = []
+        self.white_king_moved = False
+        self.white_rook_left_moved = False
+        self.white_rook_right_moved = False
+        self.black_king_moved = False
+        self.black_rook_left_moved = False
+        self.black_rook_right_moved = False
+        self.build_indexes()
+
+    def copy(self):
+        """A plain ``Position`` with a copy of this one's rules state."""
+        position = Position.__new__(Position)
+        position.squares = bytearray(self.squares)
+        position.turn = self.turn
+        position.check = self.check
+        position.checkmate = self.checkmate
+        position.stalemate = self.stalemate
+        position.repetition = self.repetition
+        position.history = self.history[:]
+        position.start_ply = self.start_ply
+        position.white_captured = self.white_captured[:]
+        position.black_captured = self.black_captured[:]
+        for name in CASTLING_FLAGS:
+            setattr(position, name, getattr(self, name))
+        position.build_indexes()
+        return position
+
+    def load_fen(self, fen):
+        """Set up the position from a FEN string.
+
+        Only piece placement, side to move and castling rights are used; the
+        rules have no en passant, so that field and the move clocks are ignored.
+        """
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        ranks = fields[0].split('/')
+        if len(ranks) != ROWS:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+
+        squares = bytearray()
+        for rank in ranks:
+            row = bytearray()
+            for char in rank:
+                if char.isdigit():
+                    row.extend(bytes(int(char)))
+                elif char.lower() in FEN_PIECES:
+                    row.append((WHITE if char.isupper() else BLACK) | FEN_PIECES[char.lower()])
+                else:
+                    raise ValueError(f"Invalid FEN: {fen!r}")
+            if len(row) != COLS:
+                raise ValueError(f"Invalid FEN: {fen!r}")
+            squares.extend(row)
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError(f"Invalid FEN: {fen!r}")
+        castling = fields[2] if len(fields) > 2 else "-"
+        fullmove = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+
+        self.reset_position()
+        self.squares = squares
+        self.turn = "white" if fields[1] == "w" else "black"
+        self.start_ply = (max(fullmove, 1) - 1) * 2 + (self.turn == "black")
+        # A castling right only counts with the king and rook on their home
+        # squares, so a king that has not "moved" is always on e1/e8.
+        self.white_rook_right_moved = not ("K" in castling and squares[63] == WHITE | ROOK)
+        self.white_rook_left_moved = not ("Q" in castling and squares[56] == WHITE | ROOK)
+        self.white_king_moved = (squares[60] != WHITE | KING or
+                                 (self.white_rook_right_moved and self.white_rook_left_moved))
+        self.black_rook_right_moved = not ("k" in castling and squares[7] == BLACK | ROOK)
+        self.black_rook_left_moved = not ("q" in castling and squares[0] == BLACK | ROOK)
+        self.black_king_moved = (squares[4] != BLACK | KING or
+                                 (self.black_rook_right_moved and self.black_rook_left_moved))
+        self.build_indexes()
+        self.update_status()
+
+    def to_fen(self):
+        """FEN of the position.
+
+        There is no en passant square and the halfmove clock is not
+        tracked, so those fields are always ``-`` and ``0``.
+        """
+        ranks = []
+        for row in range(ROWS):
+            rank = ""
+            empty = 0
+            for code in self.squares[row * 8:row * 8 + 8]:
+                if not code:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                letter = "pnbrqk"[(code & TYPE_MASK) - 1]
+                rank += letter.upper() if code & WHITE else letter
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+
+        castling = ""
+        if not self.white_king_moved:
+            castling += "K" if not self.white_rook_right_moved else ""
+            castling += "Q" if not self.white_rook_left_moved else ""
+        if not self.black_king_moved:
+            castling += "k" if not self.black_rook_right_moved else ""
+            castling += "q" if not self.black_rook_left_moved else ""
+        fullmove = (self.start_ply + len(self.history)) // 2 + 1
+        return f"{'/'.join(ranks)} {self.turn[0]} {castling or '-'} - 0 {fullmove}"
+
+    def build_indexes(self):
+        """Rebuild the piece lists, king squares and attack maps from the squares."""
+        self.piece_squares = [set() for _ in range(32)]
+        self.king_squares = {WHITE: None, BLACK: None}
+        for sq, code in enumerate(self.squares):
+            if code:
+                self.piece_squares[code].add(sq)
+                if code & TYPE_MASK == KING:
+                    self.king_squares[code & COLOR_MASK] = sq
+
+        self.reach_counts = {WHITE: [0] * 64, BLACK: [0] * 64}
+        self.control_counts = {WHITE: [0] * 64, BLACK: [0] * 64}
+        # watchers[sq]: squares of the pieces whose scan looked at sq
+        self.watchers = [set() for _ in range(64)]
+        self.scans = [None] * 64
+        for sq, code in enumerate(self.squares):
+            if code:
+                self._add_scan(sq)
+        self.key = self.compute_key()
+
+    def castling_flags(self):
+        return (self.white_king_moved, self.white_rook_left_moved, self.white_rook_right_moved,
+                self.black_king_moved, self.black_rook_left_moved, self.black_rook_right_moved)
+
+    def compute_key(self):
+        """Zobrist key of the position, computed from scratch."""
+        key = ZOBRIST_BLACK if self.turn == "black" else 0
+        for sq, code in enumerate(self.squares):
+            if code:
+                key ^= ZOBRIST_PIECES[code][sq]
+        return key ^ castling_key(self.castling_flags())
+
+    def scan_piece(self, code, sq):
+        """Return ``(reach, control, seen)`` square lists for one piece.
+
+        ``reach`` is where its raw moves go, ``control`` what it attacks and
+        ``seen`` every square whose contents the result depends on.
+        """
+        squares = self.squares
+        color = code & COLOR_MASK
+        piece_type = code & TYPE_MASK
+        reach = []
+
+        if piece_type == PAWN:
+            seen = []
+            control = PAWN_CAPTURES[color][sq]
+            step = PAWN_STEP[color]
+            to = sq + step
+            if 0 <= to < 64:
+                seen.append(to)
+                if not squares[to]:
+                    reach.append(to)
+                    if sq >> 3 == PAWN_START_ROW[color]:
+                        seen.append(to + step)
+                        if not squares[to + step]:
+                            reach.append(to + step)
+                for to in control:
+                    seen.append(to)
+                    target = squares[to]
+                    if target and not target & color:
+                        reach.append(to)
+            return reach, control, seen
+
+        if piece_type == KNIGHT or piece_type == KING:
+            seen = KNIGHT_TARGETS[sq] if piece_type == KNIGHT else KING_TARGETS[sq]
+            for to in seen:
+                if not squares[to] & color:
+                    reach.append(to)
+            return reach, seen, seen
+
+        seen = []
+        for ray in SLIDER_RAYS[piece_type][sq]:
+            for to in ray:
+                seen.append(to)
+                target = squares[to]
+                if not target:
+                    reach.append(to)
+                else:
+                    if not target & color:
+                        reach.append(to)
+                    break
+        return reach, seen, seen
+
+    def _add_scan(self, sq):
+        code = self.squares[sq]
+        color = code & COLOR_MASK
+        reach, control, seen = self.scan_piece(code, sq)
+        reach_counts = self.reach_counts[color]
+        control_counts = self.control_counts[color]
+        for target in reach:
+            reach_counts[target] += 1
+        for target in control:
+            control_counts[target] += 1
+        watchers = self.watchers
+        for target in seen:
+            watchers[target].add(sq)
+        self.scans[sq] = (color, reach, control, seen)
+
+    def _drop_scan(self, sq):
+        color, reach, control, seen = self.scans[sq]
+        reach_counts = self.reach_counts[color]
+        control_counts = self.control_counts[color]
+        for target in reach:
+            reach_counts[target] -= 1
+        for target in control:
+            control_counts[target] -= 1
+        watchers = self.watchers
+        for target in seen:
+            watchers[target].discard(sq)
+        self.scans[sq] = None
+
+    def set_squares(self, changes):
+        """Put ``(sq, code)`` changes on the board.
+
+        Only the pieces on the changed squares, and those whose moves looked at
+        them, are rescanned for the attack maps.
+        """
+        squares = self.squares
+        scans = self.scans
+        affected = set()
+        for sq, _ in changes:
+            affected.update(self.watchers[sq])
+            affected.add(sq)
+        for sq in affected:
+            if scans[sq]:
+                self._drop_scan(sq)
+
+        piece_squares = self.piece_squares
+        king_squares = self.king_squares
+        key = self.key
+        for sq, code in changes:
+            old = squares[sq]
+            if old:
+                key ^= ZOBRIST_PIECES[old][sq]
+                piece_squares[old].discard(sq)
+                if old & TYPE_MASK == KING and king_squares[old & COLOR_MASK] == sq:
+                    king_squares[old & COLOR_MASK] = None
+            if code:
+                key ^= ZOBRIST_PIECES[code][sq]
+                piece_squares[code].add(sq)
+                if code & TYPE_MASK == KING:
+                    king_squares[code & COLOR_MASK] = sq
+            squares[sq] = code
+        self.key = key
+
+        for sq in affected:
+            if squares[sq]:
+                self._add_scan(sq)
+
+    def get_raw_moves(self, piece, pos):
+        """Squares ``piece`` on ``pos`` could move to, before castling and king safety."""
+        code = PIECE_CODES[piece]
+        sq = pos[0] * 8 + pos[1]
+        if self.squares[sq] == code:
+            reach = self.scans[sq][1]
+        else:
+            reach = self.scan_piece(code, sq)[0]
+        return [SQUARE_POS[to] for to in reach]
+
+    def get_valid_moves(self, piece, pos):
+        """Moves of ``piece`` on ``pos``, castling included, before the king-safety filter."""
+        moves = self.get_raw_moves(piece, pos)
+        color = piece.split('_')[0]
+        if piece.endswith("king") and not self.is_in_check(color):
+            moves.extend(self.get_castling_moves(color))
+        return moves
+
+    def get_castling_moves(self, color):
+        return [SQUARE_POS[to] for to in self.castling_targets(COLOR_BITS[color])]
+
+    def castling_targets(self, color):
+        """King destination squares for castling, assuming ``color`` is not in check."""
+        squares = self.squares
+        targets = []
+        reach = self.reach_counts[color ^ COLOR_MASK]
+        if color == WHITE and not self.white_king_moved:
+            # Kingside castling
+            if (not self.white_rook_right_moved and
+                not squares[61] and not squares[62] and
+                not reach[61] and not reach[62]):
+                targets.append(62)
+            # Queenside castling
+            if (not self.white_rook_left_moved and
+                not squares[59] and not squares[58] and not squares[57] and
+                not reach[59] and not reach[58]):
+                targets.append(58)
+        elif color == BLACK and not self.black_king_moved:
+            # Kingside castling
+            if (not self.black_rook_right_moved and
+                not squares[5] and not squares[6] and
+                not reach[5] and not reach[6]):
+                targets.append(6)
+            # Queenside castling
+            if (not self.black_rook_left_moved and
+                not squares[3] and not squares[2] and not squares[1] and
+                not reach[3] and not reach[2]):
+                targets.append(2)
+        return targets
+
+    def attackers(self, sq, by_color, ignore=-1, occupied=True):
+        """Squares of the ``by_color`` pieces whose raw moves reach ``sq``.
+
+        With ``occupied`` the square is taken to hold an enemy piece, so pawns
+        reach it diagonally; otherwise they reach it by pushing.  ``ignore`` is
+        a square treated as empty, such as the square a king is leaving.
+        """
+        squares = self.squares
+        found = []
+        pawn = by_color | PAWN
+        if occupied:
+            # A pawn attacks sq from where an opposite pawn on sq would capture
+            for origin in PAWN_CAPTURES[by_color ^ COLOR_MASK][sq]:
+                if squares[origin] == pawn:
+                    found.append(origin)
+        else:
+            origin = sq - PAWN_STEP[by_color]
+            if 0 <= origin < 64:
+                if squares[origin] == pawn:
+                    found.append(origin)
+                elif not squares[origin]:
+                    origin -= PAWN_STEP[by_color]
+                    if origin >> 3 == PAWN_START_ROW[by_color] and squares[origin] == pawn:
+                        found.append(origin)
+
+        knight = by_color | KNIGHT
+        for origin in KNIGHT_TARGETS[sq]:
+            if squares[origin] == knight:
+                found.append(origin)
+        king = by_color | KING
+        for origin in KING_TARGETS[sq]:
+            if squares[origin] == king:
+                found.append(origin)
+
+        queen = by_color | QUEEN
+        for index, ray in enumerate(QUEEN_RAYS[sq]):
+            slider = by_color | (ROOK if index < 4 else BISHOP)
+            for origin in ray:
+                piece = squares[origin]
+                if piece and origin != ignore:
+                    if piece == slider or piece == queen:
+                        found.append(origin)
+                    break
+        return found
+
+    def is_square_under_attack(self, row, col, by_color):
+        return self.reach_counts[COLOR_BITS[by_color]][row * 8 + col] > 0
+
+    def would_be_in_check(self, start_pos, end_pos):
+        # Try the move on the squares themselves and put them back afterwards
+        squares = self.squares
+        start = start_pos[0] * 8 + start_pos[1]
+        end = end_pos[0] * 8 + end_pos[1]
+        piece = squares[start]
+        target = squares[end]
+        squares[end] = piece
+        squares[start] = 0
+        try:
+            # The attack maps do not see this trial move, so look outward
+            # from the king instead
+            color = COLOR_BITS[self.turn]
+            king_sq = end if piece == color | KING else self.king_squares[color]
+            return king_sq is not None and bool(self.attackers(king_sq, color ^ COLOR_MASK))
+        finally:
+            squares[start] = piece
+            squares[end] = target
+
+    def find_king(self, color):
+        sq = self.king_squares[COLOR_BITS[color]]
+        return None if sq is None else SQUARE_POS[sq]
+
+    def is_in_check(self, color):
+        color = COLOR_BITS[color]
+        king_sq = self.king_squares[color]
+        if king_sq is None:
+            return False
+        return self.control_counts[color ^ COLOR_MASK][king_sq] > 0
+
+    def get_pins(self, king_sq, color):
+        """Map each pinned ``color`` piece's square to the squares it may still move to."""
+        squares = self.squares
+        enemy_color = color ^ COLOR_MASK
+        queen = enemy_color | QUEEN
+        pins = {}
+        for index, ray in enumerate(QUEEN_RAYS[king_sq]):
+            slider = enemy_color | (ROOK if index < 4 else BISHOP)
+            pinned = -1
+            for distance, sq in enumerate(ray):
+                piece = squares[sq]
+                if piece:
+                    if pinned < 0 and piece & color:
+                        pinned = sq
+                    else:
+                        if pinned >= 0 and (piece == slider or piece == queen):
+                            pins[pinned] = ray[:distance + 1]
+                        break
+        return pins
+
+    def check_blocks(self, king_sq, checker):
+        """Squares that capture or block a single checker."""
+        if self.squares[checker] & TYPE_MASK in (PAWN, KNIGHT, KING):
+            return [checker]
+        for ray in QUEEN_RAYS[king_sq]:
+            if checker in ray:
+                return ray[:ray.index(checker) + 1]
+        return [checker]
+
+    def generate_legal_moves(self):
+        """Return ``(moves, in_check)`` for the side to move.
+
+        Checkers and pins are found once, so every move comes out legal
+        without trying it on the board.
+        """
+        cache = self.move_cache
+        if cache is not None:
+            entry = cache.probe(self.key)
+            if entry is not None:
+                return entry[1]
+            result = self._generate_legal_moves()
+            cache.store(self.key, 0, result)
+            return result
+        return self._generate_legal_moves()
+
+    def _generate_legal_moves(self):
+        color = COLOR_BITS[self.turn]
+        enemy_color = color ^ COLOR_MASK
+        squares = self.squares
+        scans = self.scans
+        piece_squares = self.piece_squares
+        moves = []
+        king_sq = self.king_squares[color]
+        if king_sq is None:
+            for piece_type in range(PAWN, KING + 1):
+                for sq in piece_squares[color | piece_type]:
+                    moves.extend((SQUARE_POS[sq], SQUARE_POS[to]) for to in scans[sq][1])
+            return moves, False
+
+        control = self.control_counts[enemy_color]
+        checkers = []
+        blocks = None
+        # Squares behind the king on a slider's check line, which the king's
+        # own body hides from the control map
+        xrays = []
+        if control[king_sq]:
+            checkers = self.attackers(king_sq, enemy_color)
+            if len(checkers) == 1:
+                blocks = self.check_blocks(king_sq, checkers[0])
+            for checker in checkers:
+                if squares[checker] & TYPE_MASK not in (PAWN, KNIGHT, KING):
+                    dr = (king_sq >> 3 > checker >> 3) - (king_sq >> 3 < checker >> 3)
+                    dc = ((king_sq & 7) > (checker & 7)) - ((king_sq & 7) < (checker & 7))
+                    if 0 <= (king_sq >> 3) + dr < 8 and 0 <= (king_sq & 7) + dc < 8:
+                        xrays.append(king_sq + dr * 8 + dc)
+        pins = self.get_pins(king_sq, color)
+
+        for piece_type in range(PAWN, KING + 1):
+            for sq in piece_squares[color | piece_type]:
+                start = SQUARE_POS[sq]
+                if sq == king_sq:
+                    for to in scans[sq][1]:
+                        if not control[to] and to not in xrays:
+                            moves.append((start, SQUARE_POS[to]))
+                    if not checkers:
+                        for to in self.castling_targets(color):
+                            if not control[to]:
+                                moves.append((start, SQUARE_POS[to]))
+                elif len(checkers) < 2:
+                    ray = pins.get(sq)
+                    for to in scans[sq][1]:
+                        if (blocks is None or to in blocks) and (ray is None or to in ray):
+                            moves.append((start, SQUARE_POS[to]))
+        return moves, bool(checkers)
+
+    def has_king_escape(self):
+        """Return True if the side to move has any legal move."""
+        return bool(self.generate_legal_moves()[0])
+
+    def legal_moves_from(self, pos):
+        """Legal destination squares for the side-to-move piece on ``pos``."""
+        return [end for start, end in self.generate_legal_moves()[0] if start == pos]
+
+    def legal_moves(self):
+        """All legal moves for the side to move as ``(start_pos, end_pos)`` pairs."""
+        return self.generate_legal_moves()[0]
+
+    def make_move(self, start_pos, end_pos):
+        """Play a move in place and pass the turn.
+
+        Nothing is validated.  Returns a small undo record that
+        ``unmake_move`` uses to restore the board, captures and castling flags.
+        """
+        squares = self.squares
+        start = start_pos[0] * 8 + start_pos[1]
+        end = end_pos[0] * 8 + end_pos[1]
+        piece = squares[start]
+        target = squares[end]
+        piece_type = piece & TYPE_MASK
+        color = piece & COLOR_MASK
+        flags = self.castling_flags()
+        rook = None
+        self.history.append(self.key)
+
+        # Handle castling
+        if piece_type == KING and abs((start & 7) - (end & 7)) == 2:
+            back_row = 56 if color == WHITE else 0
+            # Kingside castling
+            if end & 7 == 6:
+                rook = (back_row + 7, back_row + 5, squares[back_row + 7], squares[back_row + 5])
+                if color == WHITE:
+                    self.white_rook_right_moved = True
+                else:
+                    self.black_rook_right_moved = True
+            # Queenside castling
+            elif end & 7 == 2:
+                rook = (back_row, back_row + 3, squares[back_row], squares[back_row + 3])
+                if color == WHITE:
+                    self.white_rook_left_moved = True
+                else:
+                    self.black_rook_left_moved = True
+
+        # Update king/rook moved status
+        if piece_type == KING:
+            if color == WHITE:
+                self.white_king_moved = True
+            else:
+                self.black_king_moved = True
+        elif piece_type == ROOK:
+            if color == WHITE:
+                if start == 56:
+                    self.white_rook_left_moved = True
+                elif start == 63:
+                    self.white_rook_right_moved = True
+            else:
+                if start == 0:
+                    self.black_rook_left_moved = True
+                elif start == 7:
+                    self.black_rook_right_moved = True
+
+        if target:
+            if target & WHITE:
+                self.white_captured.append(PIECE_NAMES[target])
+            else:
+                self.black_captured.append(PIECE_NAMES[target])
+
+        changes = [(end, piece), (start, 0)]
+        if rook:
+            # Move rook
+            changes.append((rook[1], rook[2]))
+            changes.append((rook[0], 0))
+        self.set_squares(changes)
+        new_flags = self.castling_flags()
+        if new_flags != flags:
+            self.key ^= castling_key(flags) ^ castling_key(new_flags)
+        self.key ^= ZOBRIST_BLACK
+        self.turn = opponent(self.turn)
+        return (start, end, piece, target, flags, rook)
+
+    def unmake_move(self, undo):
+        """Take back the move ``make_move`` returned ``undo`` for."""
+        start, end, piece, target, flags, rook = undo
+        changes = [(start, piece), (end, target)]
+        if rook:
+            changes.append((rook[1], rook[3]))
+            changes.append((rook[0], rook[2]))
+        self.set_squares(changes)
+        if target:
+            if target & WHITE:
+                self.white_captured.pop()
+            else:
+                self.black_captured.pop()
+        (self.white_king_moved, self.white_rook_left_moved, self.white_rook_right_moved,
+         self.black_king_moved, self.black_rook_left_moved, self.black_rook_right_moved) = flags
+        self.turn = opponent(self.turn)
+        self.key = self.history.pop()
+
+    def update_status(self):
+        moves, self.check = self.generate_legal_moves()
+        self.checkmate = self.check and not moves
+        self.stalemate = not self.check and not moves
+        self.repetition = self.is_repetition()
+
+    def is_repetition(self, count=3):
+        """True if the current position has occurred ``count`` times."""
+        return self.history.count(self.key) + 1 >= count
+
+    def play_move(self, start_pos, end_pos):
+        """Make a move, pass the turn and refresh the check/mate/stalemate flags.
+
+        The move is not validated; use ``legal_moves`` or ``legal_moves_from``.
+        """
+        self.make_move(start_pos, end_pos)
+        self.update_status()
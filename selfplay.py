@@ -0,0 +1,315 @@
+"""Headless self-play matches between two players over a process pool.
+
+A player is given as a spec:
+
+    random          any legal move
+    greedy          the most valuable capture (cheapest capturer first), else random
+    depth:N         ``engine.Engine`` searched to depth N
+    nodes:N         ``engine.Engine`` stopped after N nodes
+
+Games come in pairs: both games of a pair start from the same seeded
+random opening, with colours swapped.  Every game's randomness comes from
+``--seed`` and its index alone, so a match gives the same games whatever
+the worker count.  Only ``rules``, ``engine`` and ``tablebase`` are used;
+no window, sprites or pygame.
+
+A game ends by the rules (checkmate, stalemate, threefold repetition) or
+is adjudicated:
+
+* a draw after ``--max-plies`` plies, 100 plies without a capture or pawn
+  move, or with too little material to mate (bare kings, a single minor);
+* the tablebase result once few enough pieces are left, if ``--tb`` has
+  tables;
+* a win for a side that has been ``--resign-margin`` centipawns of
+  material ahead for ``--resign-plies`` plies running.
+
+Usage:
+    python selfplay.py greedy random --games 1000
+    python selfplay.py depth:2 nodes:2000 --games 200 --workers 8 --pgn games.pgn
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+from engine import Engine, PIECE_VALUES
+from notation import format_pgn
+from rules import Position, BISHOP, KING, KNIGHT, PAWN, TYPE_MASK, WHITE
+from tablebase import TB_PATH, load_tablebases
+
+RESULTS = {1: "1-0", 0: "1/2-1/2", -1: "0-1"}
+# Per-process state set up by _init_worker
+_players = None
+_tablebases = None
+
+
+class RandomPlayer:
+    def __init__(self):
+        self.name = "random"
+
+    def new_game(self):
+        pass
+
+    def choose(self, position, moves, rng):
+        return rng.choice(moves)
+
+
+class GreedyPlayer:
+    def __init__(self):
+        self.name = "greedy"
+
+    def new_game(self):
+        pass
+
+    def choose(self, position, moves, rng):
+        squares = position.squares
+        best, best_rank = [], 0
+        for move in moves:
+            (start_row, start_col), (end_row, end_col) = move
+            target = squares[end_row * 8 + end_col]
+            if not target:
+                continue
+            rank = PIECE_VALUES[target & TYPE_MASK] * 16 - PIECE_VALUES[squares[start_row * 8 + start_col] & TYPE_MASK]
+            if rank > best_rank or not best:
+                best, best_rank = [move], rank
+            elif rank == best_rank:
+                best.append(move)
+        return rng.choice(best or moves)
+
+
+class SearchPlayer:
+    def __init__(self, depth=None, nodes=None):
+        self.depth = depth
+        self.nodes = nodes
+        self.name = f"depth:{depth}" if depth else f"nodes:{nodes}"
+        self.engine = Engine(table_entries=1 << 16)
+
+    def new_game(self):
+        # A fresh table per game keeps its moves independent of earlier games
+        self.engine.table.clear()
+
+    def choose(self, position, moves, rng):
+        move, _ = self.engine.search(position, self.depth or 64, node_limit=self.nodes)
+        return move
+
+
+def parse_player(spec):
+    """A player for a spec such as ``random``, ``greedy``, ``depth:3`` or ``nodes:5000``."""
+    kind, _, amount = spec.partition(":")
+    if kind == "random" and not amount:
+        return RandomPlayer()
+    if kind == "greedy" and not amount:
+        return GreedyPlayer()
+    if kind in ("depth", "nodes") and amount.isdigit() and int(amount) > 0:
+        return SearchPlayer(**{kind: int(amount)})
+    raise ValueError(f"unknown player {spec!r}; use random, greedy, depth:N or nodes:N")
+
+
+def material(position):
+    balance = 0
+    for sq, code in enumerate(position.squares):
+        if code:
+            value = PIECE_VALUES[code & TYPE_MASK]
+            balance += value if code & WHITE else -value
+    return balance
+
+
+def insufficient_material(position):
+    """Bare kings, or kings and one knight or bishop."""
+    minors = 0
+    for code in position.squares:
+        piece_type = code & TYPE_MASK
+        if piece_type in (KNIGHT, BISHOP):
+            minors += 1
+        elif code and piece_type != KING:
+            return False
+    return minors <= 1
+
+
+def play_game(players, opening_plies, seed, max_plies=400, resign_margin=1000, resign_plies=10, tablebases=None):
+    """Play one game; return ``(result, reason, moves)``.
+
+    ``players`` is ``(white, black)`` and ``result`` is 1, 0 or -1 from
+    white's side.
+    """
+    rng = random.Random(seed)
+    position = Position()
+    moves = []
+    for player in players:
+        player.new_game()
+    quiet = 0
+    # Side a resign_margin ahead in material (1 white, -1 black) and for how many plies
+    leader = 0
+    lead_plies = 0
+
+    while True:
+        legal = position.legal_moves()
+        sign = 1 if position.turn == "white" else -1
+        if not legal:
+            return (-sign, "checkmate", moves) if position.check else (0, "stalemate", moves)
+        if position.repetition:
+            return 0, "repetition", moves
+        if len(moves) >= max_plies:
+            return 0, "max plies", moves
+        if quiet >= 100:
+            return 0, "50 moves", moves
+        if insufficient_material(position):
+            return 0, "insufficient material", moves
+        if tablebases and len(moves) >= opening_plies:
+            found = tablebases.probe(position)
+            if found is not None:
+                return found[0] * sign, "tablebase", moves
+        balance = material(position)
+        lead = 0 if abs(balance) < resign_margin else (1 if balance > 0 else -1)
+        lead_plies = lead_plies + 1 if lead and lead == leader else abs(lead)
+        leader = lead
+        if lead_plies >= resign_plies:
+            return leader, "material", moves
+
+        if len(moves) < opening_plies:
+            move = rng.choice(legal)
+        else:
+            move = players[0 if sign == 1 else 1].choose(position, legal, rng)
+        (start_row, start_col), (end_row, end_col) = move
+        squares = position.squares
+        if squares[end_row * 8 + end_col] or squares[start_row * 8 + start_col] & TYPE_MASK == PAWN:
+            quiet = 0
+        else:
+            quiet += 1
+        position.play_move(*move)
+        moves.append(move)
+
+
+def _init_worker(specs, tb_path):
+    global _players, _tablebases
+    _players = [parse_player(spec) for spec in specs]
+    _tablebases = load_tablebases(tb_path) if tb_path else None
+
+
+def _play(task):
+    # One game of the match: player A has white in even games of each pair
+    index, seed, opening_plies, max_plies, resign_margin, resign_plies = task
+    a_white = index % 2 == 0
+    players = _players if a_white else _players[::-1]
+    # Both games of a pair share a seed, so their random openings match
+    opening = random.Random(seed * 1000003 + index // 2).getrandbits(64)
+    result, reason, moves = play_game(players, opening_plies, opening, max_plies, resign_margin, resign_plies,
+                                      _tablebases)
+    return index, a_white, result, reason, moves
+
+
+def elo_difference(score):
+    """Elo difference for a score fraction; infinite at 0 or 1."""
+    if score <= 0 or score >= 1:
+        return math.inf if score >= 1 else -math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+def run(specs, games, workers=None, seed=1, opening_plies=4, max_plies=400, resign_margin=1000, resign_plies=10,
+        tb_path=TB_PATH, on_game=None, progress=sys.stderr):
+    """Play the match; return a summary dict.  ``on_game`` gets each finished game."""
+    workers = workers or os.cpu_count() or 1
+    tasks = [(index, seed, opening_plies, max_plies, resign_margin, resign_plies) for index in range(games)]
+    scores = []
+    results = Counter()
+    reasons = Counter()
+    plies = 0
+    start = last_report = time.perf_counter()
+
+    def record(game):
+        nonlocal plies, last_report
+        index, a_white, result, reason, moves = game
+        score = (result if a_white else -result) / 2 + 0.5
+        scores.append(score)
+        results[{1: "win", 0.5: "draw", 0: "loss"}[score]] += 1
+        reasons[reason] += 1
+        plies += len(moves)
+        if on_game:
+            on_game(game)
+        now = time.perf_counter()
+        if progress and now - last_report >= 1.0:
+            last_report = now
+            print(f"\r{len(scores)}/{games} games, {len(scores) / (now - start):.1f}/s", end="", file=progress,
+                  flush=True)
+
+    if workers == 1:
+        _init_worker(specs, tb_path)
+        for task in tasks:
+            record(_play(task))
+    else:
+        chunk_size = max(1, min(16, games // (workers * 8)))
+        with multiprocessing.Pool(workers, _init_worker, (specs, tb_path)) as pool:
+            for game in pool.imap(_play, tasks, chunk_size):
+                record(game)
+    seconds = time.perf_counter() - start
+    if progress:
+        print("\r", end="", file=progress)
+
+    count = len(scores)
+    mean = sum(scores) / count if count else 0.5
+    # 95% interval from the spread of the per-game scores
+    margin = 1.96 * math.sqrt(sum((score - mean) ** 2 for score in scores) / count / count) if count else 0
+    return {
+        "players": specs, "games": count, "plies": plies, "seconds": seconds,
+        "results": dict(results), "reasons": dict(reasons), "score": mean,
+        "elo": elo_difference(mean),
+        "elo_low": elo_difference(max(mean - margin, 0)), "elo_high": elo_difference(min(mean + margin, 1)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a headless match between two players.")
+    parser.add_argument("player_a", help="random, greedy, depth:N or nodes:N")
+    parser.add_argument("player_b")
+    parser.add_argument("--games", type=int, default=100, help="games to play, half with each colour")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--opening-plies", type=int, default=4, help="random plies at the start of each pair")
+    parser.add_argument("--max-plies", type=int, default=400, help="adjudicate a draw after this many plies")
+    parser.add_argument("--resign-margin", type=int, default=1000, help="material lead, in centipawns, that wins")
+    parser.add_argument("--resign-plies", type=int, default=10, help="plies the lead must last")
+    parser.add_argument("--tb", default=TB_PATH, help="endgame table directory for adjudication (default: tb)")
+    parser.add_argument("--pgn", help="write every game to this PGN file")
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    args = parser.parse_args(argv)
+
+    specs = [args.player_a, args.player_b]
+    try:
+        for spec in specs:
+            parse_player(spec)
+    except ValueError as error:
+        parser.error(str(error))
+
+    games = {}
+    summary = run(specs, args.games, args.workers, args.seed, args.opening_plies, args.max_plies,
+                  args.resign_margin, args.resign_plies, args.tb,
+                  on_game=(lambda game: games.__setitem__(game[0], game)) if args.pgn else None,
+                  progress=None if args.quiet else sys.stderr)
+    if args.pgn:
+        with open(args.pgn, "w", encoding="utf-8") as out:
+            for index in sorted(games):
+                _, a_white, result, reason, moves = games[index]
+                white, black = specs if a_white else specs[::-1]
+                headers = {"Event": "selfplay", "Round": str(index + 1), "White": white, "Black": black,
+                           "Termination": reason}
+                out.write(format_pgn(moves, headers, RESULTS[result]) + "\n")
+
+    seconds = summary["seconds"]
+    results = summary["results"]
+    print(f"{summary['players'][0]} vs {summary['players'][1]}: {summary['games']} games in {seconds:.2f}s, "
+          f"{summary['games'] / seconds:.1f} games/s, {summary['plies'] / seconds:.0f} moves/s")
+    print(f"+{results.get('win', 0)} ={results.get('draw', 0)} -{results.get('loss', 0)}, "
+          f"score {summary['score'] * 100:.1f}%, Elo {summary['elo']:+.0f} "
+          f"({summary['elo_low']:+.0f} to {summary['elo_high']:+.0f})")
+    print("ended by " + ", ".join(f"{reason} {count}" for reason, count in sorted(summary["reasons"].items(),
+                                                                              key=lambda item: -item[1])))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
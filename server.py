@@ -0,0 +1,456 @@
+"""Asyncio game server speaking JSON lines over TCP.
+
+Each request and reply is one JSON object per line:
+
+    {"op": "new"}                               -> {"ok": true, "game": 1, "color": "white", ...}
+    {"op": "join", "game": 1}                   -> {"ok": true, "game": 1, "color": "black", ...}
+    {"op": "watch", "game": 1}                  -> {"ok": true, "game": 1, ...}
+    {"op": "move", "game": 1, "move": "e2e4"}   -> {"ok": true, "game": 1, ...}
+    {"op": "state", "game": 1}                  -> {"ok": true, "game": 1, ...}
+
+Game replies carry ``fen``, ``turn`` and ``status``.  A played move is also
+sent to both players and every spectator as ``{"event": "move", "game": 1,
+"move": "e2e4", "turn": "black", "status": "playing"}``.  Errors come back
+as ``{"ok": false, "error": "..."}``.
+
+A game is kept as a ``GameState``: the 64 squares, turn, castling flags,
+captures and the keys needed for repetition, a few hundred bytes plus 8 a
+move.  Moves are checked with ``rules.Position``, but a ``Position`` and its
+attack maps (some 50 KB) are only kept for the most recently moved games.
+A client that stops reading is dropped once ``MAX_BUFFER`` bytes queue up.
+A game is forgotten as soon as it is over, its last move event carrying the
+final status, or once its players and spectators have all disconnected.
+
+Usage:
+    python server.py --port 8765
+    python server.py --bench --games 1000 --spectators 1
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from notation import parse_square
+from rules import Position, CASTLING_FLAGS, PIECE_NAMES, WHITE, square_name
+from ttable import TranspositionTable
+
+# New games start from a copy of this
+START = Position()
+# Bytes queued for one client before it is disconnected
+MAX_BUFFER = 1 << 20
+
+
+class GameState:
+    """One game in compact form; ``load`` turns it back into a ``Position``."""
+
+    __slots__ = ("squares", "turn", "flags", "captured", "keys", "status")
+
+    def __init__(self, position=None):
+        position = position or START
+        self.squares = bytes(position.squares)
+        self.turn = position.turn
+        self.flags = sum(1 << index for index, flag in enumerate(position.castling_flags()) if flag)
+        self.captured = b""
+        # Position.history: the key before each move, for repetitions
+        self.keys = array("Q", position.history)
+        self.status = "playing"
+
+    def load(self, position):
+        """Set ``position`` to this game and rebuild its indexes."""
+        position.squares = bytearray(self.squares)
+        position.turn = self.turn
+        for index, name in enumerate(CASTLING_FLAGS):
+            setattr(position, name, bool(self.flags >> index & 1))
+        position.white_captured = [PIECE_NAMES[code] for code in self.captured if code & WHITE]
+        position.black_captured = [PIECE_NAMES[code] for code in self.captured if not code & WHITE]
+        position.history = self.keys.tolist()
+        position.check = self.status in ("check", "checkmate")
+        position.checkmate = self.status == "checkmate"
+        position.stalemate = self.status == "stalemate"
+        position.repetition = self.status == "repetition"
+        position.build_indexes()
+        return position
+
+    def record(self, position, captured):
+        """Take over ``position`` after a move that took ``captured`` (0 for none)."""
+        self.squares = bytes(position.squares)
+        self.turn = position.turn
+        self.flags = sum(1 << index for index, flag in enumerate(position.castling_flags()) if flag)
+        if captured:
+            self.captured += bytes((captured,))
+        self.keys.append(position.history[-1])
+        if position.checkmate:
+            self.status = "checkmate"
+        elif position.stalemate:
+            self.status = "stalemate"
+        elif position.repetition:
+            self.status = "repetition"
+        else:
+            self.status = "check" if position.check else "playing"
+
+    def finished(self):
+        return self.status in ("checkmate", "stalemate", "repetition")
+
+
+class Game:
+    __slots__ = ("id", "state", "white", "black", "spectators")
+
+    def __init__(self, game_id):
+        self.id = game_id
+        self.state = GameState()
+        self.white = None
+        self.black = None
+        # Created on the first watcher
+        self.spectators = None
+
+    def audience(self):
+        clients = [client for client in (self.white, self.black) if client is not None]
+        if self.spectators:
+            clients.extend(self.spectators)
+        return clients
+
+
+class GameServer:
+    def __init__(self, hot_games=512, cache_entries=1 << 12):
+        self.games = {}
+        self.next_id = 1
+        # game id -> Position for the games moved most recently
+        self.hot = OrderedDict()
+        self.hot_games = max(hot_games, 1)
+        # Legal moves by key, shared by every game: the list update_status
+        # builds after a move is the one the next move is checked against
+        self.move_cache = TranspositionTable(cache_entries)
+        self.moves = 0
+        # Ids of games whose Position went to another game
+        self.evicted = set()
+        # Positions rebuilt from a GameState for games that had been evicted
+        self.rebuilds = 0
+
+    def create(self):
+        game = Game(self.next_id)
+        self.games[game.id] = game
+        self.next_id += 1
+        return game
+
+    def remove(self, game):
+        """Forget ``game``, which is over or has nobody left in it."""
+        self.games.pop(game.id, None)
+        self.hot.pop(game.id, None)
+        self.evicted.discard(game.id)
+        for client in game.audience():
+            client.games.discard(game)
+
+    def position(self, game):
+        """A ``Position`` for ``game``, reused while the game stays hot."""
+        position = self.hot.pop(game.id, None)
+        if position is None:
+            if len(self.hot) >= self.hot_games:
+                evicted, position = self.hot.popitem(last=False)
+                self.evicted.add(evicted)
+            else:
+                position = Position.__new__(Position)
+                position.start_ply = 0
+                position.move_cache = self.move_cache
+            game.state.load(position)
+            if game.id in self.evicted:
+                self.evicted.discard(game.id)
+                self.rebuilds += 1
+        self.hot[game.id] = position
+        return position
+
+    def play(self, game, text):
+        """Validate and play a coordinate move such as ``"e2e4"``."""
+        if game.state.finished():
+            raise ValueError("game is over")
+        try:
+            start, end = parse_square(text[:2]), parse_square(text[2:])
+        except (IndexError, ValueError, TypeError):
+            raise ValueError(f"invalid move {text!r}") from None
+        if len(text) != 4 or not all(0 <= value < 8 for value in start + end):
+            raise ValueError(f"invalid move {text!r}")
+        position = self.position(game)
+        if (start, end) not in position.legal_moves():
+            raise ValueError(f"illegal move {text!r}")
+        captured = position.squares[end[0] * 8 + end[1]]
+        position.play_move(start, end)
+        game.state.record(position, captured)
+        self.moves += 1
+
+    def describe(self, game):
+        state = game.state
+        return {"game": game.id, "fen": self.position(game).to_fen(), "turn": state.turn, "status": state.status}
+
+    def handle(self, client, request):
+        """Reply dict for one request from ``client``."""
+        op = request.get("op")
+        if op == "new":
+            game = self.create()
+            game.white = client
+            client.games.add(game)
+            return dict(self.describe(game), ok=True, color="white")
+        game = self.games.get(request.get("game"))
+        if game is None:
+            raise ValueError("no such game")
+        if op == "join":
+            if game.black is not None:
+                raise ValueError("game is full")
+            game.black = client
+            client.games.add(game)
+            return dict(self.describe(game), ok=True, color="black")
+        if op == "watch":
+            if game.spectators is None:
+                game.spectators = set()
+            game.spectators.add(client)
+            client.games.add(game)
+            return dict(self.describe(game), ok=True)
+        if op == "state":
+            return dict(self.describe(game), ok=True)
+        if op == "move":
+            if (game.white if game.state.turn == "white" else game.black) is not client:
+                raise ValueError("not your turn")
+            text = request.get("move")
+            self.play(game, text if isinstance(text, str) else "")
+            state = game.state
+            line = encode({"event": "move", "game": game.id, "move": text, "turn": state.turn, "status": state.status})
+            for other in game.audience():
+                other.send_line(line)
+            if state.finished():
+                self.remove(game)
+            return {"ok": True, "game": game.id}
+        raise ValueError(f"unknown op {op!r}")
+
+    def disconnect(self, client):
+        for game in client.games:
+            if game.white is client:
+                game.white = None
+            if game.black is client:
+                game.black = None
+            if game.spectators:
+                game.spectators.discard(client)
+            if game.white is None and game.black is None and not game.spectators:
+                self.remove(game)
+        client.games.clear()
+
+    async def serve_client(self, reader, writer):
+        client = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("expected a JSON object")
+                    reply = self.handle(client, request)
+                except (TypeError, ValueError) as error:
+                    reply = {"ok": False, "error": str(error)}
+                client.send_line(encode(reply))
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            # ValueError: a line longer than the reader's limit
+            pass
+        finally:
+            self.disconnect(client)
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self.serve_client, host, port, limit=1 << 16)
+
+
+class Connection:
+    __slots__ = ("writer", "games")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.games = set()
+
+    def send_line(self, line):
+        writer = self.writer
+        if writer.is_closing():
+            return
+        writer.write(line)
+        if writer.transport.get_write_buffer_size() > MAX_BUFFER:
+            writer.close()
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+def scripted_games(count, max_moves, seed=1):
+    """Coordinate move lists of random legal games, for simulated clients.
+
+    A script stops where the server will call the game over.
+    """
+    rng = random.Random(seed)
+    scripts = []
+    for _ in range(count):
+        position = Position()
+        moves = []
+        while len(moves) < max_moves:
+            legal = position.legal_moves()
+            if not legal:
+                break
+            start, end = rng.choice(legal)
+            position.make_move(start, end)
+            moves.append(square_name(start) + square_name(end))
+            if position.is_repetition():
+                break
+        scripts.append(moves)
+    return scripts
+
+
+async def _connect(host, port, message):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(encode(message))
+    reply = json.loads(await reader.readline())
+    if not reply["ok"]:
+        raise RuntimeError(reply["error"])
+    return reader, writer, reply
+
+
+async def _client(reader, writer, script, color=None, game_id=None):
+    # Reads one event per move; a player answers the events that give it the turn
+    step = 0 if color == "white" else 1
+    if color == "white":
+        writer.write(encode({"op": "move", "game": game_id, "move": script[0]}))
+        step = 2
+    seen = 0
+    while seen < len(script):
+        message = json.loads(await reader.readline())
+        if "event" not in message:
+            if not message["ok"]:
+                raise RuntimeError(message["error"])
+            continue
+        seen += 1
+        if message["turn"] == color and step < len(script):
+            writer.write(encode({"op": "move", "game": game_id, "move": script[step]}))
+            step += 2
+    writer.close()
+
+
+async def _bench(args, scripts):
+    server = GameServer(args.hot_games)
+    listener = await server.start("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+
+    start = time.perf_counter()
+    clients = []
+    for first in range(0, len(scripts), 100):
+        # Connect in batches so the listen backlog never overflows
+        async def seat(script):
+            white = await _connect("127.0.0.1", port, {"op": "new"})
+            game_id = white[2]["game"]
+            black = await _connect("127.0.0.1", port, {"op": "join", "game": game_id})
+            seats = [(white[0], white[1], script, "white", game_id), (black[0], black[1], script, "black", game_id)]
+            for _ in range(args.spectators):
+                watcher = await _connect("127.0.0.1", port, {"op": "watch", "game": game_id})
+                seats.append((watcher[0], watcher[1], script))
+            return seats
+        for seats in await asyncio.gather(*(seat(script) for script in scripts[first:first + 100])):
+            clients.extend(seats)
+    setup = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(*seat) for seat in clients))
+    elapsed = time.perf_counter() - start
+    listener.close()
+    await listener.wait_closed()
+    return len(clients), setup, server, elapsed
+
+
+def _traced(build):
+    # Bytes still allocated by build() and what it returns
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    # A full collection also empties the free lists that hold freed tuples
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def _state_memory(scripts):
+    def states():
+        server = GameServer(hot_games=0)
+        for script in scripts:
+            game = server.create()
+            for move in script:
+                server.play(game, move)
+        # Only the games themselves count
+        server.hot.clear()
+        server.move_cache.clear()
+        return server
+
+    def positions():
+        found = []
+        for script in scripts:
+            position = Position()
+            for move in script:
+                position.play_move(parse_square(move[:2]), parse_square(move[2:]))
+            found.append(position)
+        return found
+
+    return _traced(states) / len(scripts), _traced(positions) / len(scripts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve games over JSON lines, or benchmark the server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--hot-games", type=int, default=512, help="games kept as full positions")
+    parser.add_argument("--bench", action="store_true", help="play simulated local clients instead of serving")
+    parser.add_argument("--games", type=int, default=1000, help="benchmark games played at once")
+    parser.add_argument("--spectators", type=int, default=1, help="watchers per benchmark game")
+    parser.add_argument("--moves", type=int, default=60, help="longest benchmark game in plies")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if not args.bench:
+        async def serve():
+            listener = await GameServer(args.hot_games).start(args.host, args.port)
+            print(f"serving on {args.host}:{args.port}")
+            async with listener:
+                await listener.serve_forever()
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    scripts = scripted_games(args.games, args.moves, args.seed)
+    plies = sum(map(len, scripts))
+    state, full = _state_memory(scripts[:200])
+    print(f"memory per game: {state:.0f} bytes as GameState, {full:.0f} bytes as Position")
+
+    clients, setup, server, elapsed = asyncio.run(_bench(args, scripts))
+    moves = server.moves
+    if moves != plies:
+        print(f"expected {plies} moves, the server played {moves}")
+        return 1
+    events = moves * (2 + args.spectators)
+    print(f"{args.games} games, {clients} clients connected in {setup:.2f}s")
+    print(f"{moves} moves in {elapsed:.2f}s: {moves / elapsed:.0f} moves/s, {events / elapsed:.0f} events/s delivered")
+    print(f"{server.rebuilds} positions rebuilt for games evicted from the {server.hot_games} hot ones")
+    if resource is not None:
+        print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,610 @@
+"""Endgame tablebases built by retrograde analysis.
+
+A table covers one material signature such as ``KQK`` or ``KQKR`` (white's
+pieces, then black's) with up to four pieces and no castling rights.  It
+holds one byte per index: 0 for a draw (or an illegal index), otherwise
+``dtm + 1`` where ``dtm`` is the distance to mate in plies with best play.
+An even ``dtm`` means the side to move is mated, an odd one that it mates.
+
+The index is ``(side_to_move, white_king_slot, other squares...)``.  Tables
+without pawns use the eight board symmetries, so the white king only needs
+the ten squares of the a1-d1-d4 triangle; with pawns only the left-right
+mirror applies and the white king stays on files a-d.
+
+Moves follow the house rules of ``rules.Position``: pawns never promote, so
+a pawn on the last rank just stands there, and there is no en passant.
+KPK is therefore drawn throughout.  Generation reuses the rules' move
+tables on a small array of pieces rather than a full ``Position`` per
+entry, which would be far too slow; three-piece tables take seconds, four-
+piece ones tens of minutes.
+
+Tables are written to ``tb/<signature>.tb`` and memory-mapped for probing,
+which is a handful of table lookups per position.
+
+Usage:
+    python tablebase.py build KQK KRK KPK KQKR
+    python tablebase.py probe --fen "8/8/8/8/8/2k5/8/KQ6 w - - 0 1"
+"""
+
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from rules import (Position, COLOR_MASK, TYPE_MASK, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING,
+                   KING_TARGETS, KNIGHT_TARGETS, QUEEN_RAYS, SLIDER_RAYS, PAWN_CAPTURES, PAWN_STEP,
+                   PAWN_START_ROW, square_name)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+TB_PATH = "tb"
+MAX_PIECES = 4
+LETTER_TYPES = {'Q': QUEEN, 'R': ROOK, 'B': BISHOP, 'N': KNIGHT, 'P': PAWN}
+TYPE_LETTERS = {piece_type: letter for letter, piece_type in LETTER_TYPES.items()}
+# Signature order of the non-king pieces, and their weight for picking
+# which side is written first
+SIGNATURE_ORDER = "QRBNP"
+MATERIAL = {QUEEN: 9, ROOK: 5, BISHOP: 3, KNIGHT: 3, PAWN: 1}
+
+
+def _transform(transpose, flip):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        if transpose:
+            row, col = col, row
+        table.append((row * 8 + col) ^ flip)
+    return table
+
+
+# The eight board symmetries, and the mirror that is all pawns allow
+ALL_TRANSFORMS = [_transform(transpose, flip) for transpose in (False, True) for flip in (0, 7, 56, 63)]
+PAWN_TRANSFORMS = [_transform(False, 0), _transform(False, 7)]
+# White king squares allowed in an index: the a1-d1-d4 triangle, or files a-d
+TRIANGLE = [sq for sq in range(64) if (sq & 7) <= 3 and 7 - (sq >> 3) <= (sq & 7)]
+LEFT_HALF = [sq for sq in range(64) if (sq & 7) <= 3]
+
+
+def parse_signature(signature):
+    """``"KQKR"`` -> ``([QUEEN], [ROOK])``."""
+    signature = signature.upper()
+    second = signature.find("K", 1)
+    if not signature.startswith("K") or second < 0:
+        raise ValueError(f"Invalid signature {signature!r}")
+    sides = []
+    for letters in (signature[1:second], signature[second + 1:]):
+        if any(letter not in LETTER_TYPES for letter in letters):
+            raise ValueError(f"Invalid signature {signature!r}")
+        sides.append(sorted((LETTER_TYPES[letter] for letter in letters),
+                            key=lambda piece_type: SIGNATURE_ORDER.index(TYPE_LETTERS[piece_type])))
+    if len(sides[0]) + len(sides[1]) + 2 > MAX_PIECES:
+        raise ValueError(f"Tables have at most {MAX_PIECES} pieces: {signature!r}")
+    return sides[0], sides[1]
+
+
+def make_signature(white, black):
+    order = lambda piece_type: SIGNATURE_ORDER.index(TYPE_LETTERS[piece_type])
+    return ("K" + "".join(TYPE_LETTERS[t] for t in sorted(white, key=order)) +
+            "K" + "".join(TYPE_LETTERS[t] for t in sorted(black, key=order)))
+
+
+def canonical_signature(white, black):
+    """``(signature, flipped)``: tables are stored with the stronger side as white."""
+    weight = lambda side: (sum(MATERIAL[t] for t in side), len(side), make_signature(side, []))
+    if weight(black) > weight(white):
+        return make_signature(black, white), True
+    return make_signature(white, black), False
+
+
+def encode(dtm):
+    return dtm + 1
+
+
+def decode(value):
+    """``(outcome, dtm)`` for a stored byte; outcome is 1, 0 or -1 for the side to move."""
+    if not value:
+        return 0, None
+    dtm = value - 1
+    return (1 if dtm & 1 else -1), dtm
+
+
+def _lines():
+    # LINES[piece_type][origin][sq]: squares a slider crosses between the two, or None
+    lines = {piece_type: [[None] * 64 for _ in range(64)] for piece_type in (ROOK, BISHOP, QUEEN)}
+    for origin in range(64):
+        for index, ray in enumerate(QUEEN_RAYS[origin]):
+            for k, sq in enumerate(ray):
+                lines[ROOK if index < 4 else BISHOP][origin][sq] = ray[:k]
+                lines[QUEEN][origin][sq] = ray[:k]
+    return lines
+
+
+LINES = _lines()
+LEAPS = {KNIGHT: [set(targets) for targets in KNIGHT_TARGETS], KING: [set(targets) for targets in KING_TARGETS]}
+PAWN_ATTACKS = {color: [set(targets) for targets in PAWN_CAPTURES[color]] for color in (WHITE, BLACK)}
+
+
+def attacks(board, code, origin, sq):
+    """True if the piece ``code`` on ``origin`` attacks ``sq`` (``is_in_check`` rules)."""
+    piece_type = code & TYPE_MASK
+    if piece_type == PAWN:
+        return sq in PAWN_ATTACKS[code & COLOR_MASK][origin]
+    if piece_type == KNIGHT or piece_type == KING:
+        return sq in LEAPS[piece_type][origin]
+    line = LINES[piece_type][origin][sq]
+    if line is None:
+        return False
+    for between in line:
+        if board[between]:
+            return False
+    return True
+
+
+def targets(board, code, sq):
+    """Where the piece can move: the rules' raw moves."""
+    color = code & COLOR_MASK
+    piece_type = code & TYPE_MASK
+    if piece_type == PAWN:
+        found = []
+        step = PAWN_STEP[color]
+        to = sq + step
+        if 0 <= to < 64:
+            if not board[to]:
+                found.append(to)
+                if sq >> 3 == PAWN_START_ROW[color] and not board[to + step]:
+                    found.append(to + step)
+            for to in PAWN_CAPTURES[color][sq]:
+                target = board[to]
+                if target and not target & color:
+                    found.append(to)
+        return found
+    if piece_type == KNIGHT or piece_type == KING:
+        return [to for to in (KNIGHT_TARGETS if piece_type == KNIGHT else KING_TARGETS)[sq] if not board[to] & color]
+    found = []
+    for ray in SLIDER_RAYS[piece_type][sq]:
+        for to in ray:
+            target = board[to]
+            if target:
+                if not target & color:
+                    found.append(to)
+                break
+            found.append(to)
+    return found
+
+
+def origins(board, code, sq):
+    """Empty squares the piece could have come from without capturing."""
+    piece_type = code & TYPE_MASK
+    if piece_type == PAWN:
+        color = code & COLOR_MASK
+        step = PAWN_STEP[color]
+        found = []
+        back = sq - step
+        # A pawn never stands on its own first rank
+        if 0 <= back < 64 and not board[back] and back >> 3 != PAWN_START_ROW[color] - step // 8:
+            found.append(back)
+            if sq >> 3 == PAWN_START_ROW[color] + 2 * (step // 8) and not board[back - step]:
+                found.append(back - step)
+        return found
+    if piece_type == KNIGHT or piece_type == KING:
+        return [origin for origin in (KNIGHT_TARGETS if piece_type == KNIGHT else KING_TARGETS)[sq] if not board[origin]]
+    found = []
+    for ray in SLIDER_RAYS[piece_type][sq]:
+        for origin in ray:
+            if board[origin]:
+                break
+            found.append(origin)
+    return found
+
+
+class Layout:
+    """Index arithmetic for one signature.
+
+    ``codes`` lists the pieces in index order: white king, black king, then
+    white's and black's other pieces.  A position is a list of their squares
+    plus the side to move (0 white, 1 black).
+    """
+
+    def __init__(self, signature):
+        white, black = parse_signature(signature)
+        self.signature = make_signature(white, black)
+        self.codes = [WHITE | KING, BLACK | KING] + [WHITE | t for t in white] + [BLACK | t for t in black]
+        has_pawns = PAWN in white or PAWN in black
+        self.transforms = PAWN_TRANSFORMS if has_pawns else ALL_TRANSFORMS
+        self.king_squares = LEFT_HALF if has_pawns else TRIANGLE
+        self.king_slots = [-1] * 64
+        for slot, sq in enumerate(self.king_squares):
+            self.king_slots[sq] = slot
+        # The symmetries that bring a white king square into the index
+        self.king_transforms = [[transform for transform in self.transforms if self.king_slots[transform[sq]] >= 0]
+                                for sq in range(64)]
+        self.others = len(self.codes) - 1
+        self.size = 2 * len(self.king_squares) * 64 ** self.others
+        # Runs of identical pieces, whose squares are kept sorted
+        self.groups = [(start, end) for start, end in self._runs() if end - start > 1]
+
+    def _runs(self):
+        start = 1
+        for index in range(2, len(self.codes) + 1):
+            if index == len(self.codes) or self.codes[index] != self.codes[start]:
+                yield start, index
+                start = index
+
+    def index(self, squares, stm):
+        transforms = self.king_transforms[squares[0]]
+        best = None
+        for transform in transforms:
+            rest = [transform[sq] for sq in squares[1:]]
+            for start, end in self.groups:
+                rest[start - 1:end - 1] = sorted(rest[start - 1:end - 1])
+            # A king on the diagonal has two symmetric placements; take the lower
+            if best is None or rest < best:
+                best = rest
+        index = stm * len(self.king_squares) + self.king_slots[transforms[0][squares[0]]]
+        for sq in best:
+            index = index * 64 + sq
+        return index
+
+    def position(self, index):
+        """``(squares, stm)`` for an index."""
+        rest = []
+        for _ in range(self.others):
+            index, sq = divmod(index, 64)
+            rest.append(sq)
+        stm, slot = divmod(index, len(self.king_squares))
+        rest.reverse()
+        return [self.king_squares[slot]] + rest, stm
+
+    def board(self, squares):
+        board = bytearray(64)
+        for code, sq in zip(self.codes, squares):
+            board[sq] = code
+        return board
+
+    def attacked(self, board, squares, sq, by_color, skip=-1):
+        for i, code in enumerate(self.codes):
+            if code & by_color and i != skip and attacks(board, code, squares[i], sq):
+                return True
+        return False
+
+    def is_legal(self, squares, stm):
+        if len(set(squares)) != len(squares):
+            return False
+        for code, sq in zip(self.codes, squares):
+            if code & TYPE_MASK == PAWN and sq >> 3 == PAWN_START_ROW[code & COLOR_MASK] - PAWN_STEP[code & COLOR_MASK] // 8:
+                return False
+        # The side that just moved cannot be left in check
+        waiting = BLACK if stm == 0 else WHITE
+        return not self.attacked(self.board(squares), squares, squares[1 if stm == 0 else 0], waiting ^ COLOR_MASK)
+
+    def children(self, squares, stm):
+        """``(moves, in_check)``; each move is ``(squares, None)`` inside the
+        table or ``(None, pieces)`` after a capture, ``pieces`` being
+        ``(code, sq)`` pairs."""
+        codes = self.codes
+        color = WHITE if stm == 0 else BLACK
+        enemy = color ^ COLOR_MASK
+        board = self.board(squares)
+        king = 0 if stm == 0 else 1
+        moves = []
+        for i, code in enumerate(codes):
+            if not code & color:
+                continue
+            sq = squares[i]
+            for to in targets(board, code, sq):
+                captured = board[to]
+                taken = squares.index(to) if captured else -1
+                moved = list(squares)
+                moved[i] = to
+                board[sq] = 0
+                board[to] = code
+                legal = not self.attacked(board, moved, moved[king], enemy, taken)
+                board[to] = captured
+                board[sq] = code
+                if not legal:
+                    continue
+                if captured:
+                    moves.append((None, [(c, s) for k, (c, s) in enumerate(zip(codes, moved)) if k != taken]))
+                else:
+                    moves.append((moved, None))
+        return moves, self.attacked(board, squares, squares[king], enemy)
+
+    def parents(self, squares, stm):
+        """Indexes of the positions one non-capturing move before this one."""
+        mover = WHITE if stm == 1 else BLACK
+        board = self.board(squares)
+        waiting_king = squares[0 if stm == 0 else 1]
+        found = []
+        for i, code in enumerate(self.codes):
+            if code & COLOR_MASK != mover:
+                continue
+            sq = squares[i]
+            for origin in origins(board, code, sq):
+                moved = list(squares)
+                moved[i] = origin
+                board[sq] = 0
+                board[origin] = code
+                legal = not self.attacked(board, moved, waiting_king, mover)
+                board[origin] = 0
+                board[sq] = code
+                if legal:
+                    found.append(self.index(moved, 1 - stm))
+        return found
+
+
+class Tablebases:
+    """The tables found in a directory, memory-mapped as they are first used."""
+
+    def __init__(self, directory=TB_PATH):
+        self.directory = directory
+        self.tables = {}
+        # Sorted piece codes -> (signature, flipped)
+        self.materials = {}
+
+    def path(self, signature):
+        return os.path.join(self.directory, signature + ".tb")
+
+    def table(self, signature):
+        if signature not in self.tables:
+            layout = Layout(signature)
+            path = self.path(signature)
+            data = None
+            if os.path.exists(path) and os.path.getsize(path) == layout.size:
+                with open(path, "rb") as file:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.tables[signature] = (layout, data)
+        return self.tables[signature]
+
+    def available(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.directory) if name.endswith(".tb"))
+
+    def probe_pieces(self, pieces, stm):
+        """Stored byte for ``(code, sq)`` pieces, or None without a table.
+
+        Positions with bare kings are draws and need no table.
+        """
+        material = tuple(sorted(code for code, _ in pieces))
+        found = self.materials.get(material)
+        if found is None:
+            white = [code & TYPE_MASK for code in material if code & WHITE and code & TYPE_MASK != KING]
+            black = [code & TYPE_MASK for code in material if code & BLACK and code & TYPE_MASK != KING]
+            found = self.materials[material] = canonical_signature(white, black) if white or black else (None, False)
+        signature, flipped = found
+        if signature is None:
+            return 0
+        if flipped:
+            # Mirror the board top to bottom and swap the colours
+            pieces = [(code ^ COLOR_MASK, sq ^ 56) for code, sq in pieces]
+            stm = 1 - stm
+        layout, data = self.table(signature)
+        if data is None:
+            return None
+        remaining = list(pieces)
+        squares = []
+        for code in layout.codes:
+            for k, (piece, sq) in enumerate(remaining):
+                if piece == code:
+                    squares.append(sq)
+                    del remaining[k]
+                    break
+        return data[layout.index(squares, stm)]
+
+    def probe(self, position):
+        """``(outcome, dtm)`` for the side to move, or None if no table applies.
+
+        ``outcome`` is 1 for a win, 0 for a draw and -1 for a loss.
+        """
+        if 64 - position.squares.count(0) > MAX_PIECES:
+            return None
+        if (not position.white_king_moved and not (position.white_rook_left_moved and position.white_rook_right_moved) or
+                not position.black_king_moved and not (position.black_rook_left_moved and position.black_rook_right_moved)):
+            return None
+        pieces = [(code, sq) for code, squares in enumerate(position.piece_squares) for sq in squares]
+        value = self.probe_pieces(pieces, 0 if position.turn == "white" else 1)
+        if value is None:
+            return None
+        return decode(value)
+
+    def best_move(self, position):
+        """``(move, outcome, dtm)`` playing the table perfectly, or None.
+
+        Wins take the fastest mate, losses the slowest, and a draw keeps the
+        draw.
+        """
+        if self.probe(position) is None:
+            return None
+        best = None
+        for move in position.legal_moves():
+            undo = position.make_move(*move)
+            result = self.probe(position)
+            position.unmake_move(undo)
+            if result is None:
+                return None
+            outcome, dtm = -result[0], result[1]
+            # Fastest win, then a draw, then the slowest loss
+            rank = (2, -dtm) if outcome > 0 else (0, dtm) if outcome < 0 else (1, 0)
+            if best is None or rank > best[0]:
+                best = (rank, move, outcome, None if dtm is None else dtm + 1)
+        if best is None:
+            return None
+        return best[1], best[2], best[3]
+
+
+def load_tablebases(directory=TB_PATH):
+    """Tablebases in ``directory``, or None if it has none."""
+    tablebases = Tablebases(directory)
+    return tablebases if tablebases.available() else None
+
+
+def dependencies(signature):
+    """Signatures reached by one capture."""
+    white, black = parse_signature(signature)
+    found = set()
+    for index in range(len(white)):
+        rest = white[:index] + white[index + 1:]
+        if rest or black:
+            found.add(canonical_signature(rest, black)[0])
+    for index in range(len(black)):
+        rest = black[:index] + black[index + 1:]
+        if white or rest:
+            found.add(canonical_signature(white, rest)[0])
+    return sorted(found)
+
+
+def generate(signature, tablebases, out=sys.stdout):
+    """Build one table (its capture targets must exist) and write it out."""
+    layout = Layout(signature)
+    size = layout.size
+    values = bytearray(size)
+    # Best value found so far for positions waiting in a bucket
+    scheduled = bytearray(size)
+    buckets = {}
+    start = time.perf_counter()
+    legal = 0
+
+    def evaluate(squares, stm):
+        moves, in_check = layout.children(squares, stm)
+        if not moves:
+            return encode(0) if in_check else None
+        fastest_win = None
+        slowest_loss = 0
+        all_lost = True
+        for moved, pieces in moves:
+            if moved is not None:
+                value = values[layout.index(moved, 1 - stm)]
+            else:
+                value = tablebases.probe_pieces(pieces, 1 - stm) or 0
+            if not value:
+                all_lost = False
+                continue
+            dtm = value - 1
+            if dtm & 1:
+                slowest_loss = max(slowest_loss, dtm + 1)
+            elif fastest_win is None or dtm + 1 < fastest_win:
+                fastest_win = dtm + 1
+        if fastest_win is not None:
+            return encode(fastest_win)
+        if all_lost:
+            return encode(slowest_loss)
+        return None
+
+    def schedule(index, value):
+        old = scheduled[index]
+        if old and (old - 1) & 1 == 0:
+            return
+        if old and old <= value:
+            return
+        scheduled[index] = value
+        buckets.setdefault(value - 1, []).append(index)
+
+    for index in range(size):
+        squares, stm = layout.position(index)
+        if not layout.is_legal(squares, stm) or layout.index(squares, stm) != index:
+            continue
+        legal += 1
+        value = evaluate(squares, stm)
+        if value:
+            schedule(index, value)
+
+    depth = 0
+    while buckets:
+        layer = buckets.pop(depth, [])
+        resolved = []
+        for index in layer:
+            if not values[index] and scheduled[index] == encode(depth):
+                values[index] = encode(depth)
+                resolved.append(index)
+        for index in resolved:
+            squares, stm = layout.position(index)
+            for parent in layout.parents(squares, stm):
+                if values[parent]:
+                    continue
+                old = scheduled[parent]
+                # A scheduled loss is final, and so is a win this fast
+                if old and ((old - 1) & 1 == 0 or old <= encode(depth + 1)):
+                    continue
+                if depth & 1 == 0:
+                    # Moving into a lost position wins
+                    schedule(parent, encode(depth + 1))
+                    continue
+                value = evaluate(*layout.position(parent))
+                if value:
+                    schedule(parent, value)
+        depth += 1
+
+    os.makedirs(tablebases.directory, exist_ok=True)
+    with open(tablebases.path(layout.signature), "wb") as file:
+        file.write(values)
+    tablebases.tables.pop(layout.signature, None)
+
+    seconds = time.perf_counter() - start
+    wins = sum(1 for value in values if value and (value - 1) & 1)
+    losses = sum(1 for value in values if value and not (value - 1) & 1)
+    longest = max(values) - 1 if any(values) else 0
+    peak = ""
+    if resource is not None:
+        peak = f", peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024} MiB"
+    print(f"{layout.signature}: {size} indexes, {legal} legal, {wins} wins, {losses} losses, "
+          f"{legal - wins - losses} draws, longest mate {longest} plies; "
+          f"{seconds:.1f}s, table {size // 1024} KiB + {size // 1024} KiB work{peak}", file=out)
+    return values
+
+
+def build(signatures, directory=TB_PATH, out=sys.stdout):
+    """Generate ``signatures`` and whatever they capture into, smallest first."""
+    tablebases = Tablebases(directory)
+    done = set()
+
+    def visit(signature):
+        signature = canonical_signature(*parse_signature(signature))[0]
+        if signature in done:
+            return
+        for dependency in dependencies(signature):
+            visit(dependency)
+        if os.path.exists(tablebases.path(signature)):
+            print(f"{signature}: already built", file=out)
+        else:
+            generate(signature, tablebases, out)
+        done.add(signature)
+
+    for signature in signatures:
+        visit(signature)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or probe endgame tablebases.")
+    parser.add_argument("--dir", default=TB_PATH, help="table directory (default: tb)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="generate tables")
+    build_parser.add_argument("signatures", nargs="+", help="material signatures such as KQK or KRKP")
+    probe_parser = commands.add_parser("probe", help="look up a position")
+    probe_parser.add_argument("--fen", required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build(args.signatures, args.dir)
+        return 0
+
+    tablebases = Tablebases(args.dir)
+    position = Position(args.fen)
+    result = tablebases.probe(position)
+    if result is None:
+        print("no table for this position")
+        return 1
+    outcome, dtm = result
+    print({1: f"win, mate in {dtm} plies", 0: "draw", -1: f"loss, mated in {dtm} plies"}[outcome])
+    best = tablebases.best_move(position)
+    if best:
+        move = best[0]
+        print(f"best move {square_name(move[0])}{square_name(move[1])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+
+def test_alpha_and_opaque_images_are_cached_apart(tmp_path, monkeypatch):
+    from assets import AssetCache
+
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    try:
+        pygame.display.set_mode((8, 8))
+        path = os.path.join(tmp_path, "tile.png")
+        pygame.image.save(pygame.Surface((4, 4), pygame.SRCALPHA), path)
+        cache = AssetCache()
+        with_alpha = cache.image(path)
+        opaque = cache.image(path, alpha=False)
+        assert with_alpha.get_flags() & pygame.SRCALPHA
+        assert not opaque.get_flags() & pygame.SRCALPHA
+        assert cache.image(path) is with_alpha
+        assert cache.scaled(path, (2, 2), alpha=False).get_flags() & pygame.SRCALPHA == 0
+        assert cache.scaled(path, (2, 2)).get_flags() & pygame.SRCALPHA
+    finally:
+        pygame.display.quit()
@@ -0,0 +1,30 @@
+import io
+import random
+
+from batch import run
+from rules import Position
+
+
+def _fens(count, seed=1):
+    # Successive positions of random games, which share table entries
+    rng = random.Random(seed)
+    fens = []
+    while len(fens) < count:
+        position = Position()
+        for _ in range(40):
+            moves = position.legal_moves()
+            if not moves or len(fens) == count:
+                break
+            position.play_move(*rng.choice(moves))
+            fens.append(position.to_fen())
+    return fens
+
+
+def test_scores_do_not_depend_on_worker_count():
+    fens = _fens(24)
+    outputs = []
+    for workers, chunk_size in ((1, 64), (3, 5)):
+        out = io.StringIO()
+        assert run(fens, out, workers=workers, chunk_size=chunk_size, depth=2, progress=None) == len(fens)
+        outputs.append(out.getvalue())
+    assert outputs[0] == outputs[1]
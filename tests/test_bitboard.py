@@ -0,0 +1,43 @@
+import random
+
+from bitboard import BitboardPosition
+from perft import PERFT_SUITE
+from rules import Position
+
+
+def _same_moves(position, bitboard):
+    assert sorted(bitboard.legal_moves()) == sorted(position.legal_moves())
+
+
+def test_random_games_match_position():
+    rng = random.Random(11)
+    for _ in range(30):
+        position = Position()
+        bitboard = BitboardPosition.from_position(position)
+        for _ in range(120):
+            _same_moves(position, bitboard)
+            moves = bitboard.generate_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            position.play_move(divmod(move & 63, 8), divmod(move >> 6, 8))
+            bitboard.make_move(move)
+
+
+def test_suite_positions_match_position_two_plies_deep():
+    for _, fen, _ in PERFT_SUITE:
+        position = Position(fen)
+        bitboard = BitboardPosition.from_position(position)
+        _same_moves(position, bitboard)
+        for move in bitboard.generate_moves():
+            undo = bitboard.make_move(move)
+            position_undo = position.make_move(divmod(move & 63, 8), divmod(move >> 6, 8))
+            _same_moves(position, bitboard)
+            for reply in bitboard.generate_moves():
+                reply_undo = bitboard.make_move(reply)
+                reply_position_undo = position.make_move(divmod(reply & 63, 8), divmod(reply >> 6, 8))
+                _same_moves(position, bitboard)
+                position.unmake_move(reply_position_undo)
+                bitboard.unmake_move(reply_undo)
+            position.unmake_move(position_undo)
+            bitboard.unmake_move(undo)
@@ -0,0 +1,68 @@
+import io
+import os
+import random
+
+from book import build_book, load_book
+from notation import parse_san, read_pgn
+from rules import Position
+
+PGN = """[Event "One"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 {the main line} 3. Bb5 a6 4. Ba4 Nf6 1-0
+
+[Event "Two"]
+[Result "1/2-1/2"]
+
+1. e4 e5 2. Nf3 (2. Bc4 Nf6) 2... Nf6 3. Nxe5 d6 1/2-1/2
+
+[Event "Three"]
+[Result "0-1"]
+
+1. d4 d5 2. c4 e6 3. Nc3 Nf6 0-1
+"""
+MAX_PLY = 6
+
+
+def _played():
+    # Book moves from each position the first MAX_PLY plies reach: key -> {move: games}
+    played = {}
+    for game in read_pgn(io.StringIO(PGN)):
+        position = Position()
+        for san in game.moves[:MAX_PLY]:
+            move = parse_san(position, san)
+            moves = played.setdefault(position.key, {})
+            moves[move] = moves.get(move, 0) + 1
+            position.make_move(*move)
+    return played
+
+
+def test_probed_moves_are_legal_and_from_the_book(tmp_path):
+    path = os.path.join(tmp_path, "book.bin")
+    assert build_book(read_pgn(io.StringIO(PGN)), path, max_ply=MAX_PLY) == (3, 15)
+    played = _played()
+    rng = random.Random(1)
+    book = load_book(path)
+    try:
+        for game in read_pgn(io.StringIO(PGN)):
+            position = Position()
+            for san in game.moves[:MAX_PLY]:
+                entries = book.lookup(position.key)
+                assert dict(entries) == played[position.key]
+                legal = position.legal_moves()
+                assert all(move in legal for move, _ in entries)
+                for _ in range(5):
+                    assert book.choose(position, rng) in played[position.key]
+                position.make_move(*parse_san(position, san))
+            assert book.choose(position, rng) is None
+    finally:
+        book.close()
+
+
+def test_min_games_drops_rare_moves(tmp_path):
+    path = os.path.join(tmp_path, "book.bin")
+    build_book(read_pgn(io.StringIO(PGN)), path, max_ply=MAX_PLY, min_games=2)
+    with load_book(path) as book:
+        position = Position()
+        assert book.lookup(position.key) == [(parse_san(position, "e4"), 2)]
+        assert load_book(os.path.join(tmp_path, "missing.bin")) is None
@@ -0,0 +1,31 @@
+import random
+
+from engine import Engine
+from rules import Position
+
+
+def _state(position):
+    return (bytes(position.squares), position.turn, position.key, list(position.history),
+            list(position.white_captured), list(position.black_captured), position.castling_flags())
+
+
+def test_stopped_search_leaves_position_unchanged():
+    position = Position()
+    fen = position.to_fen()
+    Engine().search(position, 64, node_limit=300)
+    assert position.to_fen() == fen
+    assert position.history == []
+
+
+def test_stopped_search_unwinds_midgame_positions():
+    rng = random.Random(3)
+    for _ in range(20):
+        position = Position()
+        for _ in range(rng.randrange(40)):
+            moves = position.legal_moves()
+            if not moves:
+                break
+            position.play_move(*rng.choice(moves))
+        before = _state(position)
+        Engine().search(position, 64, node_limit=rng.choice([100, 700, 1500, 4000]))
+        assert _state(position) == before
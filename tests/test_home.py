@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+
+@pytest.fixture
+def main(monkeypatch):
+    monkeypatch.setenv("SDL_VIDEODRIVER", "dummy")
+    import main
+    from assets import AssetCache
+
+    monkeypatch.setattr(main, "ASSETS", AssetCache())
+    return main
+
+
+def test_home_screen_without_logo_uses_a_plain_fill(main, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scene = main.HomeScene()
+    assert scene.background.get_size() == (main.WIDTH, main.HEIGHT)
+    assert scene.background.get_at((0, 0))[:3] == main.BOARD_WHITE
+
+
+def test_home_screen_loads_logo_relative_to_the_game(main, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("img")
+    logo = pygame.Surface((10, 10))
+    logo.fill((200, 0, 0))
+    pygame.image.save(logo, main.LOGO_PATH)
+    scene = main.HomeScene()
+    assert scene.background.get_size() == (main.WIDTH, main.HEIGHT)
+    assert scene.background.get_at((0, 0))[:3] != main.BOARD_WHITE
@@ -0,0 +1,17 @@
+from instrument import Profiler
+from rules import Position
+
+
+def test_watching_twice_restores_the_original():
+    original = Position.copy
+    profiler = Profiler()
+    probe = profiler.watch(Position, "copy")
+    assert profiler.watch(Position, "copy", "again") is probe
+    profiler.enable()
+    try:
+        profiler.watch(Position, "copy")
+        Position().copy()
+        assert probe.calls == 1
+    finally:
+        profiler.disable()
+    assert Position.copy is original
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from movelog import MoveLog
+from rules import Position
+
+
+def _replay(moves):
+    position = Position()
+    for move in moves:
+        position.play_move(*move)
+    return position
+
+
+def _state(position):
+    return (position.to_fen(), position.key, list(position.history), list(position.white_captured),
+            list(position.black_captured))
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_mixed_operations_match_a_fresh_replay(seed, monkeypatch):
+    restored = []
+    restore = MoveLog._restore
+
+    def spy(log, index):
+        restored.append(index)
+        restore(log, index)
+
+    monkeypatch.setattr(MoveLog, "_restore", spy)
+    rng = random.Random(seed)
+    log = MoveLog(Position())
+    for _ in range(600):
+        action = rng.random()
+        if action < 0.8:
+            moves = log.position.legal_moves()
+            if moves and not log.position.repetition:
+                log.play(*rng.choice(moves))
+        elif action < 0.87:
+            log.undo()
+        elif action < 0.94:
+            log.redo()
+        else:
+            log.seek(rng.randrange(len(log) + 1))
+        assert _state(log.position) == _state(_replay(log.moves()[:log.cursor]))
+    # Some seeks rebuilt from a snapshot past the start
+    assert max(restored) > 0
@@ -0,0 +1,43 @@
+import random
+
+import pytest
+
+from notation import move_to_san, parse_san
+from rules import Position
+
+
+def _after(sans):
+    position = Position()
+    for san in sans:
+        position.play_move(*parse_san(position, san))
+    return position
+
+
+def test_san_round_trips_through_random_games():
+    rng = random.Random(7)
+    for _ in range(20):
+        position = Position()
+        for _ in range(80):
+            moves = position.legal_moves()
+            if not moves:
+                break
+            move = rng.choice(moves)
+            assert parse_san(position, move_to_san(position, move, moves)) == move
+            position.play_move(*move)
+
+
+def test_capture_needs_x_and_from_file():
+    position = _after(["d4", "e5"])
+    assert parse_san(position, "dxe5") == ((4, 3), (3, 4))
+    for san in ("e5", "de5", "xe5"):
+        with pytest.raises(ValueError):
+            parse_san(position, san)
+
+
+def test_non_capture_onto_occupied_square_is_illegal():
+    position = _after(["e4", "d5", "Nc3", "Nf6"])
+    assert parse_san(position, "Nxd5") == ((5, 2), (3, 3))
+    with pytest.raises(ValueError):
+        parse_san(position, "Nd5")
+    with pytest.raises(ValueError):
+        parse_san(position, "Nxe2")
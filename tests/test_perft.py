@@ -0,0 +1,12 @@
+import io
+
+import pytest
+
+from perft import BACKENDS, run_suite
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_suite_to_depth_3(backend):
+    out = io.StringIO()
+    assert run_suite(3, backend, out) is True, out.getvalue()
+    assert "FAIL" not in out.getvalue()
@@ -0,0 +1,18 @@
+from notation import format_pgn
+from rules import Position
+from selfplay import RESULTS, run
+
+
+def test_node_limited_match_plays_only_legal_moves():
+    games = []
+    summary = run(["depth:1", "nodes:300"], 4, workers=1, max_plies=60, tb_path=None, on_game=games.append,
+                  progress=None)
+    assert summary["games"] == 4
+    for _, _, result, reason, moves in games:
+        position = Position()
+        for move in moves:
+            assert move in position.legal_moves()
+            position.play_move(*move)
+        if reason == "stalemate":
+            assert not position.legal_moves() and not position.check
+        format_pgn(moves, {}, RESULTS[result])
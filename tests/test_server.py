@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+from server import GameServer, encode
+
+FOOLS_MATE = ["f2f3", "e7e5", "g2g4", "d8h4"]
+
+
+async def _request(reader, writer, message):
+    writer.write(encode(message))
+    while True:
+        reply = json.loads(await reader.readline())
+        if "event" not in reply:
+            return reply
+
+
+async def _finished_game_is_removed():
+    server = GameServer()
+    listener = await server.start("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    white = await asyncio.open_connection("127.0.0.1", port)
+    black = await asyncio.open_connection("127.0.0.1", port)
+    game_id = (await _request(*white, {"op": "new"}))["game"]
+    await _request(*black, {"op": "join", "game": game_id})
+    for index, move in enumerate(FOOLS_MATE):
+        reply = await _request(*(white, black)[index % 2], {"op": "move", "game": game_id, "move": move})
+        assert reply["ok"]
+    assert server.games == {} and game_id not in server.hot
+    reply = await _request(*white, {"op": "state", "game": game_id})
+    assert reply == {"ok": False, "error": "no such game"}
+    for _, writer in (white, black):
+        writer.close()
+    listener.close()
+    await listener.wait_closed()
+
+
+async def _abandoned_game_is_removed():
+    server = GameServer()
+    listener = await server.start("127.0.0.1", 0)
+    port = listener.sockets[0].getsockname()[1]
+    white = await asyncio.open_connection("127.0.0.1", port)
+    watcher = await asyncio.open_connection("127.0.0.1", port)
+    game_id = (await _request(*white, {"op": "new"}))["game"]
+    await _request(*watcher, {"op": "watch", "game": game_id})
+    await _request(*white, {"op": "move", "game": game_id, "move": "e2e4"})
+
+    white[1].close()
+    await white[1].wait_closed()
+    # The spectator still holds the game open
+    assert (await _request(*watcher, {"op": "state", "game": game_id}))["ok"]
+    watcher[1].close()
+    await watcher[1].wait_closed()
+    for _ in range(100):
+        if not server.games:
+            break
+        await asyncio.sleep(0.01)
+    assert server.games == {} and not server.hot
+    listener.close()
+    await listener.wait_closed()
+
+
+def test_finished_game_is_removed():
+    asyncio.run(_finished_game_is_removed())
+
+
+def test_abandoned_game_is_removed():
+    asyncio.run(_abandoned_game_is_removed())
+
+
+def test_only_evicted_games_count_as_rebuilt():
+    server = GameServer(hot_games=2)
+    games = [server.create() for _ in range(3)]
+    for game in games[:2]:
+        server.play(game, "e2e4")
+    assert server.rebuilds == 0
+    # The third game takes the first one's Position
+    server.play(games[2], "e2e4")
+    assert server.rebuilds == 0
+    server.describe(games[1])
+    assert server.rebuilds == 0
+    server.play(games[0], "e7e5")
+    assert server.rebuilds == 1
+    assert server.describe(games[0])["fen"].startswith("rnbqkbnr/pppp1ppp/8/4p3/4P3/")
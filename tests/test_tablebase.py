@@ -0,0 +1,49 @@
+import io
+import random
+
+import pytest
+
+from rules import Position, COLOR_MASK, WHITE, BLACK, KING, QUEEN, ROOK
+from tablebase import ALL_TRANSFORMS, Tablebases, build
+
+
+@pytest.fixture(scope="module")
+def tablebases(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("tb"))
+    build(["KQK", "KRK"], directory, out=io.StringIO())
+    return Tablebases(directory)
+
+
+@pytest.mark.parametrize("signature, longest", [("KQK", 20), ("KRK", 32)])
+def test_longest_mates(tablebases, signature, longest):
+    with open(tablebases.path(signature), "rb") as file:
+        assert max(file.read()) - 1 == longest
+
+
+@pytest.mark.parametrize("piece", [QUEEN, ROOK])
+def test_probe_pieces_is_symmetric(tablebases, piece):
+    rng = random.Random(piece)
+    decided = 0
+    for _ in range(300):
+        squares = rng.sample(range(64), 3)
+        stm = rng.randrange(2)
+        pieces = list(zip((WHITE | KING, WHITE | piece, BLACK | KING), squares))
+        value = tablebases.probe_pieces(pieces, stm)
+        decided += value != 0
+        for transform in ALL_TRANSFORMS:
+            assert tablebases.probe_pieces([(code, transform[sq]) for code, sq in pieces], stm) == value
+        # The same position with the colours swapped and the board turned over
+        flipped = [(code ^ COLOR_MASK, sq ^ 56) for code, sq in pieces]
+        assert tablebases.probe_pieces(flipped, 1 - stm) == value
+    assert decided > 100
+
+
+def test_probe_matches_flipped_position(tablebases):
+    assert tablebases.probe(Position("8/8/8/8/8/2k5/8/KQ6 w - - 0 1")) == (1, 11)
+    assert tablebases.probe(Position("kq6/8/2K5/8/8/8/8/8 b - - 0 1")) == (1, 11)
+
+
+def test_probe_needs_castling_rights_gone(tablebases):
+    assert tablebases.probe(Position("4k3/8/8/8/8/8/8/R3K3 w Q - 0 1")) is None
+    assert tablebases.probe(Position("4k3/8/8/8/8/8/8/R3K3 w - - 0 1")) == (1, 23)
+    assert tablebases.probe(Position("r3k3/8/8/8/8/8/8/4K3 b q - 0 1")) is None
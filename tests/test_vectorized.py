@@ -0,0 +1,36 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from rules import WHITE, PAWN  # noqa: E402
+from vectorized import _loop, _positions, evaluate, material, placement, scan, stack_boards  # noqa: E402
+
+
+def test_batched_matches_loop_on_random_boards():
+    positions = _positions(300, seed=7)
+    codes = stack_boards(positions)
+    scores = evaluate(codes)
+    mobility, attacks = scan(codes)
+    assert list(scores) == list(material(codes) + placement(codes))
+    for index, (score, moves, hits) in enumerate(_loop(positions)):
+        assert scores[index] == score
+        assert list(mobility[index]) == moves
+        assert list(attacks[index]) == hits
+
+
+def test_any_integer_codes_are_accepted():
+    codes = stack_boards(_positions(20, seed=3))
+    wide = codes.astype(np.int64)
+    assert list(evaluate(wide)) == list(evaluate(codes))
+    assert np.array_equal(scan(wide)[0], scan(codes)[0])
+    assert list(evaluate(codes.tolist())) == list(evaluate(codes))
+
+
+@pytest.mark.parametrize("bad", [7, WHITE, WHITE | 7, WHITE | 16 | PAWN, 32 | WHITE | PAWN, 300, -1])
+def test_bad_codes_raise(bad):
+    codes = stack_boards(_positions(4, seed=5)).astype(np.int64)
+    codes[2, 4, 4] = bad
+    with pytest.raises(ValueError):
+        evaluate(codes)
+    with pytest.raises(ValueError):
+        scan(codes)
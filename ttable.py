@@ -0,0 +1,95 @@
+"""Fixed-size transposition table keyed by ``Position.key``.
+
+The table is a flat list of slots split into buckets of ``BUCKET_SIZE``.  A
+key always maps to the same bucket; within it an entry for the same key is
+overwritten, then an empty slot is used, and otherwise the victim is the
+entry from the oldest search generation with the smallest depth.
+
+Entries hold ``(depth, value, bound, move)``.  What ``value`` means is up to
+the caller: the search stores scores with an ``EXACT`` / ``LOWER`` /
+``UPPER`` bound, while ``Position.move_cache`` stores legal-move lists.
+"""
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+BUCKET_SIZE = 4
+
+
+class TranspositionTable:
+    def __init__(self, entries=1 << 16):
+        buckets = 1
+        while buckets * BUCKET_SIZE < entries:
+            buckets *= 2
+        self.bucket_mask = buckets - 1
+        self.slots = [None] * (buckets * BUCKET_SIZE)
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+        self.generation = 0
+        self.reset_stats()
+
+    def new_search(self):
+        """Age the current entries so they are replaced before fresh ones."""
+        self.generation += 1
+
+    def probe(self, key):
+        """Return ``(depth, value, bound, move)`` stored for ``key``, or None."""
+        self.probes += 1
+        base = (key & self.bucket_mask) * BUCKET_SIZE
+        slots = self.slots
+        for index in range(base, base + BUCKET_SIZE):
+            entry = slots[index]
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry[1:5]
+        return None
+
+    def store(self, key, depth, value, bound=EXACT, move=None):
+        self.stores += 1
+        base = (key & self.bucket_mask) * BUCKET_SIZE
+        slots = self.slots
+        generation = self.generation
+        victim = None
+        victim_rank = None
+        for index in range(base, base + BUCKET_SIZE):
+            entry = slots[index]
+            if entry is None:
+                rank = (-1, 0)
+            elif entry[0] == key:
+                # Keep a known best move when the new result has none
+                if move is None:
+                    move = entry[4]
+                slots[index] = (key, depth, value, bound, move, generation)
+                return
+            else:
+                rank = (entry[5] == generation, entry[1])
+            if victim is None or rank < victim_rank:
+                victim, victim_rank = index, rank
+        if slots[victim] is not None:
+            self.replacements += 1
+        slots[victim] = (key, depth, value, bound, move, generation)
+
+    def __len__(self):
+        return sum(1 for entry in self.slots if entry is not None)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+    def stats(self):
+        return {
+            "slots": len(self.slots),
+            "filled": len(self),
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": round(self.hit_rate(), 4),
+            "stores": self.stores,
+            "replacements": self.replacements,
+        }
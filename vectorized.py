@@ -0,0 +1,337 @@
+"""Batched evaluation over many positions at once with NumPy.
+
+Positions are stacked into an ``(N, 8, 8)`` array of ``rules`` piece codes,
+row 0 being rank 8 as in ``Position.squares``.  Every function then works
+on the whole stack at once instead of looping over pieces in Python:
+
+* ``material`` and ``placement`` are the two halves of ``engine.evaluate``
+  (white's point of view), and ``evaluate`` is their sum;
+* ``scan`` counts each side's raw moves (what ``get_raw_moves`` lists,
+  without castling or king safety) and attacks (the sum of
+  ``Position.control_counts``).
+
+``scan`` turns the stack into one 64-bit board per colour and piece type
+and moves whole arrays of them with shifts, so a ray costs a few array
+operations whatever N is.  Any array of integers will do for the codes,
+but anything other than 0 or a ``rules`` piece code raises ValueError.
+NumPy is only needed by this module.
+
+Measured with the usage below over ten runs on a shared machine: the loop
+takes 30-48 us a position and the batch 0.6-0.9 us, 41-79x faster, or
+34-65x once ``stack_boards`` is counted.  That is below 50x in about half
+the runs.
+
+Usage:
+    python vectorized.py --positions 20000
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from engine import PIECE_VALUES, SQUARE_VALUES, evaluate as evaluate_position
+from rules import (Position, BoardView, COLOR_MASK, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN,
+                   KING, KNIGHT_OFFSETS, KING_OFFSETS, ROOK_DIRECTIONS, BISHOP_DIRECTIONS, PAWN_START_ROW,
+                   PIECE_NAMES, SQUARE_POS, encode_board)
+
+
+BAD_PAIR = np.iinfo(np.int16).min
+
+
+def _pair_table():
+    # PAIR_TABLE[pair << 16 | low | high << 8]: engine.SQUARE_VALUES for code
+    # low on square 2 * pair plus code high on the next square, positive for
+    # white.  Pairs holding anything but 0 or a piece code read BAD_PAIR,
+    # far below any real pair value.
+    values = np.array(SQUARE_VALUES, dtype=np.int16)
+    codes = np.zeros(256, dtype=bool)
+    codes[[code for code, name in enumerate(PIECE_NAMES) if name] + [0]] = True
+    low = np.arange(1 << 16) & 0xFF
+    high = np.arange(1 << 16) >> 8
+    valid = codes[low] & codes[high]
+    table = np.full((32, 1 << 16), BAD_PAIR, dtype=np.int16)
+    for pair in range(32):
+        table[pair, valid] = values[low[valid], 2 * pair] + values[high[valid], 2 * pair + 1]
+    return table.reshape(-1)
+
+
+PAIR_TABLE = _pair_table()
+PAIR_OFFSETS = np.arange(32, dtype=np.uint32) << 16
+# White moves towards row 0, black towards row 7
+SIDES = ((WHITE, -1), (BLACK, 1))
+
+if hasattr(np, "bitwise_count"):
+    popcount = np.bitwise_count
+else:
+    _POPCOUNT8 = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+    def popcount(boards):
+        return _POPCOUNT8[boards.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+def _shifter(dr, dc):
+    # (amount, towards higher squares, columns that can be landed on, 2x and 4x amounts)
+    amount = dr * 8 + dc
+    columns = sum(1 << (row * 8 + col) for row in range(8) for col in range(8) if 0 <= col - dc < 8)
+    return (np.uint64(abs(amount)), amount > 0, np.uint64(columns),
+            np.uint64(abs(amount) * 2), np.uint64(abs(amount) * 4))
+
+
+def _shift(boards, shifter):
+    amount, up, columns = shifter[:3]
+    return ((boards << amount) if up else (boards >> amount)) & columns
+
+
+def _fills(empty, shifter):
+    """What ``_slide`` fills through in one direction: the empty squares a
+    ray can go on across for 1, 2 and 4 more steps without wrapping around
+    the board edge."""
+    amount, up, columns, double, _ = shifter
+    shift = np.left_shift if up else np.right_shift
+    first = empty & columns
+    second = first & shift(first, amount)
+    return first, second, second & shift(second, double)
+
+
+def _slide(pieces, fills, shifter, scratch):
+    """Every square a slider in ``pieces`` attacks in one direction.
+
+    A Kogge-Stone fill: the ray doubles in length three times, over the
+    squares ``fills`` allows.  Works in place on ``scratch`` to save
+    allocating temporaries.
+    """
+    amount, up, columns, double, quadruple = shifter
+    shift = np.left_shift if up else np.right_shift
+    first, second, third = fills
+    shift(pieces, amount, out=scratch)
+    scratch &= first
+    ray = pieces | scratch
+    for step, through in ((double, second), (quadruple, third)):
+        shift(ray, step, out=scratch)
+        scratch &= through
+        ray |= scratch
+    shift(ray, amount, out=ray)
+    ray &= columns
+    return ray
+
+
+KNIGHT_SHIFTS = [_shifter(dr, dc) for dr, dc in KNIGHT_OFFSETS]
+KING_SHIFTS = [_shifter(dr, dc) for dr, dc in KING_OFFSETS]
+ROOK_SHIFTS = [_shifter(dr, dc) for dr, dc in ROOK_DIRECTIONS]
+BISHOP_SHIFTS = [_shifter(dr, dc) for dr, dc in BISHOP_DIRECTIONS]
+PAWN_SHIFTS = {color: (_shifter(step, 0), [_shifter(step, -1), _shifter(step, 1)]) for color, step in SIDES}
+# Where a pawn's first single step lands, so it may step again
+PAWN_DOUBLE_ROWS = {color: np.uint64(0xFF << 8 * (PAWN_START_ROW[color] + step)) for color, step in SIDES}
+
+
+def as_codes(codes):
+    """``codes`` as a contiguous uint8 array, the form every function here reads."""
+    array = np.asarray(codes)
+    if array.dtype != np.uint8 and array.size and (array.min() < 0 or array.max() > 0xFF):
+        raise ValueError("piece codes must be 0 or rules piece codes")
+    return np.ascontiguousarray(array, dtype=np.uint8)
+
+
+def stack_boards(boards):
+    """``(N, 8, 8)`` uint8 codes from positions, board views or lists of piece names."""
+    boards = list(boards)
+    try:
+        rows = [board.squares for board in boards]
+    except AttributeError:
+        rows = [board.position.squares if isinstance(board, BoardView) else encode_board(board) for board in boards]
+    return np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(-1, 8, 8)
+
+
+def bitboards(codes):
+    """``{WHITE, BLACK, PAWN..KING: (N,) uint64}`` with bit ``row * 8 + col`` set
+    where that colour or piece type stands."""
+    flat = as_codes(codes).reshape(len(codes), 64)
+    # One board per bit of the piece codes; packbits takes any nonzero byte as set
+    bits = [np.packbits(flat & (1 << bit), axis=1, bitorder="little").view("<u8")[:, 0] for bit in range(5)]
+    typed = bits[0] | bits[1] | bits[2]
+    # Piece codes are one colour bit and a type 1-6, or nothing at all
+    if (flat.max(initial=0) >= 32 or (bits[3] & bits[4]).any() or (typed != bits[3] | bits[4]).any()
+            or (bits[0] & bits[1] & bits[2]).any()):
+        raise ValueError("piece codes must be 0 or rules piece codes")
+    boards = {WHITE: bits[3], BLACK: bits[4]}
+    for piece_type in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+        board = bits[0] if piece_type & 1 else ~bits[0]
+        for bit in (1, 2):
+            board = board & (bits[bit] if piece_type >> bit & 1 else ~bits[bit])
+        boards[piece_type] = board
+    return boards
+
+
+def material(codes, boards=None):
+    """``(N,)`` white's material minus black's, in centipawns."""
+    boards = boards or bitboards(codes)
+    total = np.zeros(len(codes), dtype=np.int32)
+    for piece_type, value in PIECE_VALUES.items():
+        if value:
+            total += value * (popcount(boards[piece_type] & boards[WHITE]).astype(np.int32) -
+                              popcount(boards[piece_type] & boards[BLACK]))
+    return total
+
+
+def evaluate(codes):
+    """``(N,)`` ``engine.evaluate`` scores from white's point of view."""
+    codes = as_codes(codes)
+    # One lookup per two squares, their codes read as one little-endian uint16
+    values = np.take(PAIR_TABLE, codes.reshape(len(codes), 64).view("<u2") + PAIR_OFFSETS)
+    if values.min(initial=0) == BAD_PAIR:
+        raise ValueError("piece codes must be 0 or rules piece codes")
+    return values.sum(axis=1, dtype=np.int32)
+
+
+def placement(codes, boards=None):
+    """``(N,)`` piece-square part of ``evaluate``."""
+    return evaluate(codes) - material(codes, boards)
+
+
+def scan(codes, boards=None):
+    """``(mobility, attacks)``, both ``(N, 2)`` with white's count first.
+
+    ``mobility`` counts raw moves and ``attacks`` counts attacked squares
+    once per attacking piece, i.e. the sum of ``Position.control_counts``.
+    Within one direction no two slider rays share a square, so each
+    direction needs a single count however many pieces slide along it.
+    """
+    boards = boards or bitboards(codes)
+    occupied = boards[WHITE] | boards[BLACK]
+    empty = ~occupied
+    mobility = []
+    attacks = []
+    # Rook movers, then bishop movers, per side; None where a side has none
+    sliders = []
+    scratch = np.empty_like(empty)
+
+    for color, _ in SIDES:
+        own = boards[color]
+        free = ~own
+        enemy = boards[color ^ COLOR_MASK]
+        moves = np.zeros(len(codes), dtype=np.int32)
+        hits = np.zeros(len(codes), dtype=np.int32)
+        mobility.append(moves)
+        attacks.append(hits)
+
+        knights = boards[KNIGHT] & own
+        if knights.any():
+            for shifter in KNIGHT_SHIFTS:
+                targets = _shift(knights, shifter)
+                hits += popcount(targets)
+                moves += popcount(targets & free)
+        # One king per side, so its targets never overlap
+        king = boards[KING] & own
+        targets = _shift(king, KING_SHIFTS[0])
+        for shifter in KING_SHIFTS[1:]:
+            targets |= _shift(king, shifter)
+        hits += popcount(targets)
+        moves += popcount(targets & free)
+
+        queens = boards[QUEEN] & own
+        for piece_type in (ROOK, BISHOP):
+            pieces = (boards[piece_type] & own) | queens
+            sliders.append((pieces, free, moves, hits) if pieces.any() else None)
+
+        pawns = boards[PAWN] & own
+        push, captures = PAWN_SHIFTS[color]
+        single = _shift(pawns, push) & empty
+        double = _shift(single & PAWN_DOUBLE_ROWS[color], push) & empty
+        moves += popcount(single)
+        moves += popcount(double)
+        for shifter in captures:
+            targets = _shift(pawns, shifter)
+            hits += popcount(targets)
+            moves += popcount(targets & enemy)
+
+    # Direction by direction, so what a ray may cross is found once for both sides
+    for group, shifts in enumerate((ROOK_SHIFTS, BISHOP_SHIFTS)):
+        sides = [side for side in sliders[group::2] if side is not None]
+        if not sides:
+            continue
+        for shifter in shifts:
+            fills = _fills(empty, shifter)
+            for pieces, free, moves, hits in sides:
+                seen = _slide(pieces, fills, shifter, scratch)
+                hits += popcount(seen)
+                moves += popcount(seen & free)
+    return np.stack(mobility, axis=1), np.stack(attacks, axis=1)
+
+
+def _positions(count, seed):
+    # Positions from random games, so the benchmark sees varied material
+    rng = random.Random(seed)
+    found = []
+    while len(found) < count:
+        position = Position()
+        for _ in range(rng.randrange(0, 80)):
+            moves = position.legal_moves()
+            if not moves:
+                break
+            position.make_move(*rng.choice(moves))
+        found.append(position)
+    return found
+
+
+def _loop(positions):
+    # The per-position equivalent of one evaluate() and scan()
+    results = []
+    for position in positions:
+        moves = [0, 0]
+        for sq, code in enumerate(position.squares):
+            if code:
+                moves[0 if code & WHITE else 1] += len(position.get_raw_moves(PIECE_NAMES[code], SQUARE_POS[sq]))
+        score = evaluate_position(position)
+        attacks = [sum(position.control_counts[WHITE]), sum(position.control_counts[BLACK])]
+        results.append((score if position.turn == "white" else -score, moves, attacks))
+    return results
+
+
+def _batched(codes):
+    mobility, attacks = scan(codes)
+    return evaluate(codes), mobility, attacks
+
+
+def _best_time(function, argument, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare batched NumPy evaluation with a per-position loop.")
+    parser.add_argument("--positions", type=int, default=20000, help="batch size")
+    parser.add_argument("--distinct", type=int, default=2000, help="random positions repeated to fill the batch")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each side; the fastest counts")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    distinct = _positions(min(args.distinct, args.positions), args.seed)
+    positions = [distinct[index % len(distinct)] for index in range(args.positions)]
+
+    looped, loop_time = _best_time(_loop, positions, args.repeat)
+    codes, stack_time = _best_time(stack_boards, positions, args.repeat)
+    (scores, mobility, attacks), batch_time = _best_time(_batched, codes, args.repeat)
+
+    for index, (score, moves, hits) in enumerate(looped):
+        if scores[index] != score or list(mobility[index]) != moves or list(attacks[index]) != hits:
+            print(f"mismatch at position {index}: {positions[index].to_fen()}")
+            return 1
+    count = len(positions)
+    print(f"{count} positions, all scores, move and attack counts match")
+    print(f"loop:     {loop_time / count * 1e6:8.2f} us/position")
+    print(f"batched:  {batch_time / count * 1e6:8.2f} us/position, {loop_time / batch_time:.0f}x faster")
+    print(f"stacking: {stack_time / count * 1e6:8.2f} us/position, "
+          f"{loop_time / (stack_time + batch_time):.0f}x faster with it")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())